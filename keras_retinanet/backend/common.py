@@ -83,3 +83,21 @@ def shift(shape, stride, anchors):
     shifted_anchors = keras.backend.reshape(shifted_anchors, [k * number_of_anchors, 4])
 
     return shifted_anchors
+
+
+def upsample_nearest(images, factor):
+    """ Upsample images by integer factors by repeating every pixel, without a resize op.
+
+    This gives the same result as nearest neighbour resizing to a size that is exactly factor times larger,
+    but only consists of a reshape, tile and reshape, which are cheap and easy to optimize for static shapes.
+
+    Args
+        images : Tensor of shape (batch, height, width, channels) with a static height, width and channels.
+        factor : Tuple (factor_y, factor_x) of integer upsampling factors.
+    """
+    _, height, width, channels = keras.backend.int_shape(images)
+    factor_y, factor_x         = factor
+
+    images = keras.backend.reshape(images, [-1, height, 1, width, 1, channels])
+    images = keras.backend.tile(images, [1, 1, factor_y, 1, factor_x, 1])
+    return keras.backend.reshape(images, [-1, height * factor_y, width * factor_x, channels])
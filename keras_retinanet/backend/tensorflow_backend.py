@@ -68,12 +68,48 @@ def resize_images(images, size, method='bilinear', align_corners=False):
     return tensorflow.compat.v1.image.resize_images(images, size, methods[method], align_corners)
 
 
+def resize_nearest(images, size):
+    """ Nearest neighbour resizing of images with gathers, which gives the same result as resize_images(images, size, method='nearest').
+
+    Unlike the resize op, the gradient of a gather is supported by XLA on every device.
+
+    Args
+        images : Tensor of shape (batch, height, width, channels).
+        size   : Tuple (height, width) of the output size, integers or scalar tensors.
+    """
+    shape = tensorflow.shape(images)
+    for axis, output_size in zip((1, 2), size):
+        # use the same float32 scale as the resize op, so that both round to the same pixels
+        scale   = tensorflow.cast(shape[axis], tensorflow.float32) / tensorflow.cast(output_size, tensorflow.float32)
+        indices = tensorflow.cast(tensorflow.floor(tensorflow.cast(tensorflow.range(output_size), tensorflow.float32) * scale), tensorflow.int32)
+        images  = tensorflow.gather(images, tensorflow.minimum(indices, shape[axis] - 1), axis=axis)
+    return images
+
+
 def non_max_suppression(*args, **kwargs):
     """ See https://www.tensorflow.org/api_docs/python/tf/image/non_max_suppression .
     """
     return tensorflow.image.non_max_suppression(*args, **kwargs)
 
 
+def non_max_suppression_with_scores(*args, **kwargs):
+    """ See https://www.tensorflow.org/api_docs/python/tf/image/non_max_suppression_with_scores .
+    """
+    return tensorflow.image.non_max_suppression_with_scores(*args, **kwargs)
+
+
+def numpy_function(*args, **kwargs):
+    """ See https://www.tensorflow.org/api_docs/python/tf/numpy_function .
+    """
+    return tensorflow.numpy_function(*args, **kwargs)
+
+
+def combined_non_max_suppression(*args, **kwargs):
+    """ See https://www.tensorflow.org/api_docs/python/tf/image/combined_non_max_suppression .
+    """
+    return tensorflow.image.combined_non_max_suppression(*args, **kwargs)
+
+
 def range(*args, **kwargs):
     """ See https://www.tensorflow.org/api_docs/python/tf/range .
     """
@@ -104,6 +140,18 @@ def where(*args, **kwargs):
     return tensorflow.where(*args, **kwargs)
 
 
+def split(*args, **kwargs):
+    """ See https://www.tensorflow.org/api_docs/python/tf/split .
+    """
+    return tensorflow.split(*args, **kwargs)
+
+
+def unsorted_segment_min(*args, **kwargs):
+    """ See https://www.tensorflow.org/api_docs/python/tf/math/unsorted_segment_min .
+    """
+    return tensorflow.math.unsorted_segment_min(*args, **kwargs)
+
+
 def unstack(*args, **kwargs):
     """ See https://www.tensorflow.org/api_docs/python/tf/unstack .
     """
@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2017-2018 Fizyr (https://fizyr.com)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+    http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import argparse
+import collections
+import json
+import os
+import resource
+import sys
+import time
+
+import keras
+import numpy as np
+
+# Allow relative imports when being executed as script.
+if __name__ == "__main__" and __package__ is None:
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+    import keras_retinanet.bin  # noqa: F401
+    __package__ = "keras_retinanet.bin"
+
+# Change these to absolute imports if you copy this script outside the keras_retinanet package.
+from .. import models
+from ..preprocessing.generator import STAGES
+from ..utils.config import read_config_file
+from .train import create_generators
+
+
+def check_args(parsed_args):
+    """ Function to check for inherent contradictions within parsed arguments.
+
+    Args
+        parsed_args: parser.parse_args()
+
+    Returns
+        parsed_args
+    """
+    if parsed_args.tf_data and (parsed_args.multiprocessing or parsed_args.shared_memory):
+        raise ValueError("The tf.data pipeline (--tf-data) computes batches in threads and can't be combined with --multiprocessing or --shared-memory.")
+
+    if parsed_args.shared_memory and not parsed_args.multiprocessing:
+        raise ValueError("Shared memory batch transport (--shared-memory) requires --multiprocessing.")
+
+    if parsed_args.batches < 1:
+        raise ValueError("The number of batches to benchmark ({}) must be at least 1.".format(parsed_args.batches))
+
+    return parsed_args
+
+
+def parse_args(args):
+    """ Parse the arguments.
+    """
+    parser     = argparse.ArgumentParser(description='Benchmark the input pipeline of the training script, without training.')
+    subparsers = parser.add_subparsers(help='Arguments for specific dataset types.', dest='dataset_type')
+    subparsers.required = True
+
+    coco_parser = subparsers.add_parser('coco')
+    coco_parser.add_argument('coco_path', help='Path to dataset directory (ie. /tmp/COCO).')
+
+    pascal_parser = subparsers.add_parser('pascal')
+    pascal_parser.add_argument('pascal_path', help='Path to dataset directory (ie. /tmp/VOCdevkit).')
+
+    kitti_parser = subparsers.add_parser('kitti')
+    kitti_parser.add_argument('kitti_path', help='Path to dataset directory (ie. /tmp/kitti).')
+
+    def csv_list(string):
+        return string.split(',')
+
+    oid_parser = subparsers.add_parser('oid')
+    oid_parser.add_argument('main_dir', help='Path to dataset directory.')
+    oid_parser.add_argument('--version',  help='The current dataset version is v4.', default='v4')
+    oid_parser.add_argument('--labels-filter',  help='A list of labels to filter.', type=csv_list, default=None)
+    oid_parser.add_argument('--annotation-cache-dir', help='Path to store annotation cache.', default='.')
+    oid_parser.add_argument('--parent-label', help='Use the hierarchy children of this label.', default=None)
+
+    csv_parser = subparsers.add_parser('csv')
+    csv_parser.add_argument('annotations', help='Path to CSV file containing annotations for training.')
+    csv_parser.add_argument('classes', help='Path to a CSV file containing class label mapping.')
+    csv_parser.set_defaults(val_annotations=None)
+
+    # Generator arguments, the same as for the training script
+    parser.add_argument('--backbone',         help='Backbone model used by retinanet, determines the image preprocessing.', default='resnet50', type=str)
+    parser.add_argument('--batch-size',       help='Size of the batches.', default=1, type=int)
+    parser.add_argument('--random-transform', help='Randomly transform image and annotations.', action='store_true')
+    parser.add_argument('--image-min-side',   help='Rescale the image so the smallest side is min_side.', type=int, default=800)
+    parser.add_argument('--image-max-side',   help='Rescale the image if the largest side is larger than max_side.', type=int, default=1333)
+    parser.add_argument('--no-resize',        help='Don''t rescale the image.', action='store_true')
+    parser.add_argument('--reduced-decoding', help='Decode JPEG images at a reduced resolution when they are downscaled anyway.', action='store_true')
+    parser.add_argument('--prune-overlaps',   help='Only compute the overlaps of anchors near each annotation when computing the anchor targets.', action='store_true')
+    parser.add_argument('--batched-anchor-targets', help='Compute the anchor targets for all images of a batch at once.', action='store_true')
+    parser.add_argument('--config',           help='Path to a configuration parameters .ini file.')
+
+    # Pipeline arguments, the same as for the training script
+    parser.add_argument('--multiprocessing',  help='Compute batches in worker processes instead of threads.', action='store_true')
+    parser.add_argument('--workers',          help='Number of generator workers (0 computes the batches on the main thread).', type=int, default=1)
+    parser.add_argument('--max-queue-size',   help='Queue length for the generator workers.', type=int, default=10)
+    parser.add_argument('--shared-memory',    help='Transfer batches from multiprocessing workers through shared memory slots instead of pickling them.', action='store_true')
+    parser.add_argument('--tf-data',                 help='Compute batches in a tf.data pipeline instead of generator workers.', action='store_true')
+    parser.add_argument('--tf-data-parallel-calls',  help='Number of batches computed in parallel by the tf.data pipeline (defaults to autotune).', type=int, default=-1)
+    parser.add_argument('--tf-data-prefetch',        help='Number of batches prefetched by the tf.data pipeline (defaults to autotune, 0 disables prefetching).', type=int, default=-1)
+    parser.add_argument('--tf-data-interleave',      help='Number of interleaved shards of groups in the tf.data pipeline (0 disables interleaving).', type=int, default=0)
+    parser.add_argument('--tf-data-cache',           help='Cache batches of the tf.data pipeline in a file with this prefix (use \'\' for an in-memory cache).', default=None)
+
+    # Benchmark arguments
+    parser.add_argument('--batches',          help='Number of batches to benchmark.', type=int, default=100)
+    parser.add_argument('--warmup',           help='Number of batches to compute before benchmarking, ie. to fill the queues.', type=int, default=5)
+    parser.add_argument('--output',           help='Write the results to this JSON file.')
+
+    return check_args(parser.parse_args(args))
+
+
+def create_pipeline(generator, args):
+    """ Create an iterator over the batches of a generator, computed like the training script computes them.
+
+    Args
+        generator : The generator to iterate over.
+        args      : parseargs args object.
+
+    Returns
+        A tuple (iterator, queue, stop). The queue holds the batches that are computed ahead (None if unknown)
+        and stop is a function that stops the workers.
+    """
+    if args.tf_data:
+        from ..preprocessing.tf_data import generator_to_dataset
+        dataset = generator_to_dataset(
+            generator,
+            num_parallel_calls = args.tf_data_parallel_calls,
+            prefetch           = args.tf_data_prefetch,
+            interleave         = args.tf_data_interleave,
+            cache              = args.tf_data_cache,
+        )
+        return iter(dataset), None, lambda: None
+
+    if args.shared_memory:
+        from ..preprocessing.shared_memory import SharedMemoryEnqueuer
+        enqueuer = SharedMemoryEnqueuer(generator, workers=args.workers, slots=args.max_queue_size)
+        enqueuer.start()
+        return enqueuer.get(), enqueuer.results, enqueuer.stop
+
+    if args.workers > 0:
+        enqueuer = keras.utils.OrderedEnqueuer(generator, use_multiprocessing=args.multiprocessing, shuffle=True)
+        enqueuer.start(workers=args.workers, max_queue_size=args.max_queue_size)
+        return enqueuer.get(), enqueuer.queue, enqueuer.stop
+
+    def batches():
+        while True:
+            for index in range(len(generator)):
+                yield generator[index]
+            generator.on_epoch_end()
+
+    return batches(), None, lambda: None
+
+
+def percentiles(values):
+    """ The 50th, 90th and 99th percentile and the mean of a list of durations, in milliseconds.
+    """
+    values = np.asarray(values) * 1000
+    return {
+        'p50'  : float(np.percentile(values, 50)),
+        'p90'  : float(np.percentile(values, 90)),
+        'p99'  : float(np.percentile(values, 99)),
+        'mean' : float(np.mean(values)),
+    }
+
+
+def peak_rss():
+    """ The peak resident set size in MB of this process and of its (terminated) child processes.
+    """
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale,
+    )
+
+
+def benchmark(iterator, num_batches, batch_size, warmup=0, queue=None, generator=None):
+    """ Measure how fast batches can be taken from an iterator.
+
+    Args
+        iterator    : The iterator over the batches.
+        num_batches : The number of batches to measure.
+        batch_size  : The number of images in a batch.
+        warmup      : The number of batches to take before measuring.
+        queue       : The queue of batches computed ahead, to record its depth (anything with a qsize method).
+        generator   : The Generator computing the batches, to record the time spent in every stage (only batches computed in this process are recorded).
+
+    Returns
+        A dictionary with the throughput, the percentiles of the time waited for a batch and of every stage, and the mean queue depth.
+    """
+    for _ in range(warmup):
+        next(iterator)
+
+    if generator is not None:
+        generator.stage_timings = collections.deque()
+
+    waits       = []
+    queue_sizes = []
+    start       = time.perf_counter()
+    for _ in range(num_batches):
+        if queue is not None:
+            queue_sizes.append(queue.qsize())
+        batch_start = time.perf_counter()
+        next(iterator)
+        waits.append(time.perf_counter() - batch_start)
+    duration = time.perf_counter() - start
+
+    results = {
+        'batches'            : num_batches,
+        'duration'           : duration,
+        'batches_per_second' : num_batches / duration,
+        'images_per_second'  : num_batches * batch_size / duration,
+        'wait_ms'            : percentiles(waits),
+        'queue_size'         : float(np.mean(queue_sizes)) if queue_sizes else None,
+        'stages_ms'          : {},
+    }
+
+    if generator is not None:
+        timings                 = list(generator.stage_timings)
+        generator.stage_timings = None
+        if timings:
+            results['stages_ms'] = {stage: percentiles([timing[stage] for timing in timings]) for stage in STAGES}
+
+    return results
+
+
+def main(args=None):
+    # parse arguments
+    if args is None:
+        args = sys.argv[1:]
+    args = parse_args(args)
+
+    # optionally load config parameters
+    if args.config:
+        args.config = read_config_file(args.config)
+
+    # create the training generator like the training script does
+    backbone           = models.backbone(args.backbone)
+    train_generator, _ = create_generators(args, backbone.preprocess_image)
+
+    iterator, queue, stop = create_pipeline(train_generator, args)
+    try:
+        results = benchmark(iterator, args.batches, args.batch_size, warmup=args.warmup, queue=queue, generator=train_generator)
+    finally:
+        stop()
+    results['peak_rss_mb'], results['peak_rss_children_mb'] = peak_rss()
+
+    print('Benchmarked {} batches of {} images in {:.2f} seconds.'.format(args.batches, args.batch_size, results['duration']))
+    print('{:>24}: {:.2f} images/s ({:.2f} batches/s)'.format('Throughput', results['images_per_second'], results['batches_per_second']))
+    print('{:>24}  {:>8} {:>8} {:>8} {:>8}'.format('', 'p50', 'p90', 'p99', 'mean'))
+    for name, timing in [('batch wait (ms)', results['wait_ms'])] + [(stage + ' (ms)', results['stages_ms'][stage]) for stage in results['stages_ms']]:
+        print('{:>24}: {p50:8.2f} {p90:8.2f} {p99:8.2f} {mean:8.2f}'.format(name, **timing))
+    if not results['stages_ms']:
+        print('Stage timings are only recorded when batches are computed in this process (not with --multiprocessing).')
+    if results['queue_size'] is not None:
+        print('{:>24}: {:.1f}'.format('Mean queue size', results['queue_size']))
+    print('{:>24}: {:.1f} MB (child processes {:.1f} MB)'.format('Peak RSS', results['peak_rss_mb'], results['peak_rss_children_mb']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2017-2018 Fizyr (https://fizyr.com)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+    http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+
+import keras
+import numpy as np
+import tensorflow as tf
+
+# Allow relative imports when being executed as script.
+if __name__ == "__main__" and __package__ is None:
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+    import keras_retinanet.bin  # noqa: F401
+    __package__ = "keras_retinanet.bin"
+
+# Change these to absolute imports if you copy this script outside the keras_retinanet package.
+from .. import models
+from ..layers import NMS_METHODS
+from ..models.retinanet import retinanet_bbox
+from ..utils.gpu import setup_gpu
+from ..utils.keras_version import check_keras_version
+from ..utils.tf_version import check_tf_version
+
+DEFAULT_BACKBONES = 'resnet50,mobilenet224_1.0,vgg16,densenet121,EfficientNetB0,seresnet50'
+
+
+def parse_args(args):
+    """ Parse the arguments.
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the inference time of RetinaNet networks on the CPU, with random weights.')
+
+    def csv_list(string):
+        return string.split(',')
+
+    def image_shapes(string):
+        return [tuple(int(side) for side in shape.split('x')) for shape in string.split(',')]
+
+    def batch_sizes(string):
+        return [int(batch_size) for batch_size in string.split(',')]
+
+    parser.add_argument('--backbones',        help='Comma separated list of backbones to benchmark.', type=csv_list, default=DEFAULT_BACKBONES)
+    parser.add_argument('--image-shapes',     help='Comma separated list of HEIGHTxWIDTH input shapes (defaults to 500x500 tiles, 800x1333 and full 3000x4000 images).', type=image_shapes, default='500x500,800x1333,3000x4000')
+    parser.add_argument('--batch-sizes',      help='Comma separated list of batch sizes.', type=batch_sizes, default='1,4')
+    parser.add_argument('--num-classes',      help='Number of classes of the models.', type=int, default=80)
+    parser.add_argument('--runs',             help='Number of warm inference runs per configuration.', type=int, default=5)
+    parser.add_argument('--nms-method',       help='How to perform NMS.', choices=NMS_METHODS, default='standard')
+    parser.add_argument('--pre-nms-top-k',    help='Only decode and filter the k highest scoring anchors of every pyramid level.', type=int)
+    parser.add_argument('--threads',          help='Number of threads used by the operations (defaults to all cores).', type=int)
+    parser.add_argument('--seed',             help='Seed for the random weights and images.', type=int, default=0)
+    parser.add_argument('--output',           help='Write the results to this JSON file.', default='bench_model.json')
+
+    return parser.parse_args(args)
+
+
+def benchmark_model(model, image_shape, batch_size, runs, seed=0):
+    """ Measure the inference time of a model.
+
+    The first (cold) run includes tracing the prediction function for the input shape, the other (warm) runs don't.
+
+    Args
+        model       : The inference model to benchmark.
+        image_shape : The (height, width) of the images.
+        batch_size  : The number of images per batch.
+        runs        : The number of warm runs.
+        seed        : Seed for the random images.
+
+    Returns
+        A dictionary with the cold time and the percentiles of the warm times in milliseconds, and the warm images per second.
+    """
+    images = np.random.RandomState(seed).uniform(-128, 128, (batch_size,) + tuple(image_shape) + (3,)).astype(keras.backend.floatx())
+
+    start = time.perf_counter()
+    model.predict_on_batch(images)
+    cold = time.perf_counter() - start
+
+    warm = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        model.predict_on_batch(images)
+        warm.append(time.perf_counter() - start)
+    warm = np.array(warm) * 1000
+
+    return {
+        'cold_ms'           : cold * 1000,
+        'warm_ms'           : {
+            'min'  : float(warm.min()),
+            'p50'  : float(np.percentile(warm, 50)),
+            'p90'  : float(np.percentile(warm, 90)),
+            'mean' : float(warm.mean()),
+        },
+        'images_per_second' : batch_size * 1000 / float(np.percentile(warm, 50)),
+    }
+
+
+def environment():
+    """ A description of the environment the benchmark runs in, to compare results with.
+    """
+    return {
+        'date'       : datetime.datetime.now().isoformat(),
+        'platform'   : platform.platform(),
+        'processor'  : platform.processor(),
+        'cpu_count'  : os.cpu_count(),
+        'python'     : platform.python_version(),
+        'tensorflow' : tf.version.VERSION,
+        'keras'      : keras.__version__,
+    }
+
+
+def main(args=None):
+    # parse arguments
+    if args is None:
+        args = sys.argv[1:]
+    args = parse_args(args)
+
+    # make sure keras and tensorflow are the minimum required version
+    check_keras_version()
+    check_tf_version()
+
+    # the benchmark measures inference on the CPU
+    setup_gpu('cpu')
+    if args.threads:
+        tf.config.threading.set_intra_op_parallelism_threads(args.threads)
+
+    results = []
+    for backbone_name in args.backbones:
+        for image_shape in args.image_shapes:
+            for batch_size in args.batch_sizes:
+                result = {
+                    'backbone'    : backbone_name,
+                    'image_shape' : list(image_shape),
+                    'batch_size'  : batch_size,
+                }
+
+                # build a new model for every configuration, so that the cold run includes tracing for that input shape
+                keras.backend.clear_session()
+                keras.utils.set_random_seed(args.seed)
+                try:
+                    start = time.perf_counter()
+                    model = retinanet_bbox(
+                        model=models.backbone(backbone_name).retinanet(args.num_classes),
+                        nms_method=args.nms_method,
+                        pre_nms_top_k=args.pre_nms_top_k
+                    )
+                    result['build_ms'] = (time.perf_counter() - start) * 1000
+                    result.update(benchmark_model(model, image_shape, batch_size, args.runs, seed=args.seed))
+                except Exception as e:
+                    # ie. backbones of which the optional dependencies aren't installed
+                    result['error'] = '{}: {}'.format(type(e).__name__, e)
+                    print('{:>20} {:>11} {:>5}: {}'.format(backbone_name, 'x'.join(map(str, image_shape)), batch_size, result['error']))
+                    results.append(result)
+                    continue
+
+                print('{:>20} {:>11} {:>5}: cold {:10.1f} ms, warm p50 {:10.1f} ms, {:8.2f} images/s'.format(
+                    backbone_name,
+                    'x'.join(map(str, image_shape)),
+                    batch_size,
+                    result['cold_ms'],
+                    result['warm_ms']['p50'],
+                    result['images_per_second'],
+                ))
+                results.append(result)
+
+    output = {
+        'environment' : environment(),
+        'settings'    : {
+            'num_classes'   : args.num_classes,
+            'runs'          : args.runs,
+            'nms_method'    : args.nms_method,
+            'pre_nms_top_k' : args.pre_nms_top_k,
+            'threads'       : args.threads,
+        },
+        'results'     : results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+        print('Saved the results to {}.'.format(args.output))
+
+    return output
+
+
+if __name__ == '__main__':
+    main()
@@ -28,8 +28,11 @@ if __name__ == "__main__" and __package__ is None:
 
 # Change these to absolute imports if you copy this script outside the keras_retinanet package.
 from .. import models
+from ..layers import NMS_METHODS
+from ..utils import export
 from ..utils.config import read_config_file, parse_anchor_parameters
 from ..utils.gpu import setup_gpu
+from ..utils.image import read_image_bgr
 from ..utils.keras_version import check_keras_version
 from ..utils.tf_version import check_tf_version
 
@@ -42,9 +45,42 @@ def parse_args(args):
     parser.add_argument('--backbone', help='The backbone of the model to convert.', default='resnet50')
     parser.add_argument('--no-nms', help='Disables non maximum suppression.', dest='nms', action='store_false')
     parser.add_argument('--no-class-specific-filter', help='Disables class specific filtering.', dest='class_specific_filter', action='store_false')
+    parser.add_argument('--nms-method', help='How to perform NMS (soft_linear and wbf can only be saved as a Keras model).', choices=NMS_METHODS, default='standard')
+    parser.add_argument('--soft-nms-sigma', help='Sigma for --nms-method soft_gaussian.', type=float, default=0.5)
+    parser.add_argument('--pre-nms-top-k', help='Only decode and filter the k highest scoring anchors of every pyramid level (for example 1000).', type=int)
+    parser.add_argument('--image-shape', help='Build a model for images of a fixed height and width (for example 500 500), with constant anchors.', type=int, nargs=2, metavar=('HEIGHT', 'WIDTH'))
     parser.add_argument('--config', help='Path to a configuration parameters .ini file.')
 
-    return parser.parse_args(args)
+    export_group = parser.add_argument_group('export', 'Additional export targets, which take raw uint8 BGR images and include the preprocessing.')
+    export_group.add_argument('--saved-model', help='Directory to export a SavedModel to.')
+    export_group.add_argument('--frozen-graph', help='Path to export a frozen and optimized graph (.pb) to.')
+    export_group.add_argument('--tflite', help='Path to export a TFLite model to (requires --image-shape and --nms-method combined).')
+    export_group.add_argument('--tflite-quantization', help='Post-training quantization of the TFLite model (int8 is calibrated on --sample-images).', choices=export.TFLITE_QUANTIZATIONS, default='none')
+    export_group.add_argument('--preprocess-mode', help='Preprocessing of the exported models (defaults to the preprocessing of the backbone).', choices=export.PREPROCESS_MODES)
+    export_group.add_argument('--image-min-side', help='Rescale the image so the smallest side is min_side.', type=int, default=800)
+    export_group.add_argument('--image-max-side', help='Rescale the image if the largest side is larger than max_side.', type=int, default=1333)
+    export_group.add_argument('--sample-images', help='Images to check the exported models against the Keras model with.', nargs='+', default=[])
+
+    return check_args(parser.parse_args(args))
+
+
+def check_args(parsed_args):
+    """ Function to check for inherent contradictions within parsed arguments.
+    Intended to raise errors before spending time on loading and converting the model.
+
+    Args
+        parsed_args: parser.parse_args()
+
+    Returns
+        parsed_args
+    """
+    if parsed_args.tflite and (parsed_args.image_shape is None or parsed_args.nms_method != 'combined' or not parsed_args.nms or not parsed_args.class_specific_filter):
+        raise ValueError('TFLite export requires --image-shape, --nms-method combined and class specific NMS.')
+
+    if parsed_args.tflite and parsed_args.tflite_quantization == 'int8' and not parsed_args.sample_images:
+        raise ValueError('int8 quantization requires --sample-images to calibrate with.')
+
+    return parsed_args
 
 
 def main(args=None):
@@ -68,17 +104,55 @@ def main(args=None):
             anchor_parameters = parse_anchor_parameters(args.config)
 
     # load the model
-    model = models.load_model(args.model_in, backbone_name=args.backbone)
+    model = models.load_model(args.model_in, backbone_name=args.backbone, rebuild=True)
 
     # check if this is indeed a training model
     models.check_training_model(model)
 
     # convert the model
-    model = models.convert_model(model, nms=args.nms, class_specific_filter=args.class_specific_filter, anchor_params=anchor_parameters)
+    model = models.convert_model(
+        model,
+        nms=args.nms,
+        class_specific_filter=args.class_specific_filter,
+        anchor_params=anchor_parameters,
+        nms_method=args.nms_method,
+        pre_nms_top_k=args.pre_nms_top_k,
+        soft_nms_sigma=args.soft_nms_sigma,
+        image_shape=args.image_shape
+    )
 
     # save model
     model.save(args.model_out)
 
+    if not (args.saved_model or args.frozen_graph or args.tflite):
+        return
+
+    # export to other formats and check them against the keras model
+    export_args = {
+        'preprocess_mode' : args.preprocess_mode or export.backbone_preprocess_mode(args.backbone),
+        'image_min_side'  : args.image_min_side,
+        'image_max_side'  : args.image_max_side,
+    }
+    sample_images = [read_image_bgr(path) for path in args.sample_images]
+    exports       = []
+
+    if args.saved_model:
+        export.export_saved_model(model, args.saved_model, **export_args)
+        exports.append(('SavedModel', lambda: export.load_saved_model(args.saved_model)))
+    if args.frozen_graph:
+        export.export_frozen_graph(model, args.frozen_graph, **export_args)
+        exports.append(('frozen graph', lambda: export.load_frozen_graph(args.frozen_graph)))
+    if args.tflite:
+        export.export_tflite(model, args.tflite, quantization=args.tflite_quantization, representative_images=sample_images, **export_args)
+        exports.append(('TFLite', lambda: export.load_tflite(args.tflite)))
+
+    if sample_images:
+        for name, load in exports:
+            parity = export.check_parity(model, load(), sample_images, **export_args)
+            print('{}: matched {}/{} detections on {} images, max score difference {:.6f}, max box difference {:.3f} pixels.'.format(
+                name, parity['matched'], parity['detections'], parity['images'], parity['max_score_difference'], parity['max_box_difference']
+            ))
+
 
 if __name__ == '__main__':
     main()
@@ -42,7 +42,7 @@ from ..preprocessing.csv_generator import CSVGenerator
 from ..preprocessing.kitti import KittiGenerator
 from ..preprocessing.open_images import OpenImagesGenerator
 from ..utils.anchors import anchors_for_shape, compute_gt_annotations
-from ..utils.config import read_config_file, parse_anchor_parameters
+from ..utils.config import read_config_file, parse_anchor_parameters, parse_pyramid_levels
 from ..utils.image import random_visual_effect_generator
 from ..utils.keras_version import check_keras_version
 from ..utils.tf_version import check_tf_version
@@ -189,7 +189,7 @@ def parse_args(args):
     return parser.parse_args(args)
 
 
-def run(generator, args, anchor_params):
+def run(generator, args, anchor_params, pyramid_levels=None):
     """ Main loop.
 
     Args
@@ -213,7 +213,7 @@ def run(generator, args, anchor_params):
                 image, image_scale = generator.resize_image(image)
                 annotations['bboxes'] *= image_scale
 
-            anchors = anchors_for_shape(image.shape, anchor_params=anchor_params)
+            anchors = anchors_for_shape(image.shape, pyramid_levels=pyramid_levels, anchor_params=anchor_params)
             positive_indices, _, max_indices = compute_gt_annotations(anchors, annotations['bboxes'])
 
             # draw anchors on the image
@@ -313,7 +313,7 @@ def main(args=None):
     if not args.no_gui:
         cv2.namedWindow('Image', cv2.WINDOW_NORMAL)
 
-    run(generator, args, anchor_params=anchor_params)
+    run(generator, args, anchor_params=anchor_params, pyramid_levels=parse_pyramid_levels(args.config))
 
 
 if __name__ == '__main__':
@@ -102,6 +102,7 @@ def parse_args(args):
     parser.add_argument('--image-min-side',   help='Rescale the image so the smallest side is min_side.', type=int, default=800)
     parser.add_argument('--image-max-side',   help='Rescale the image if the largest side is larger than max_side.', type=int, default=1333)
     parser.add_argument('--config',           help='Path to a configuration parameters .ini file (only used with --convert-model).')
+    parser.add_argument('--pre-nms-top-k',    help='Only decode and filter the k highest scoring anchors of every pyramid level (only used with --convert-model).', type=int)
 
     return parser.parse_args(args)
 
@@ -138,11 +139,11 @@ def main(args=None):
 
     # load the model
     print('Loading model, this may take a second...')
-    model = models.load_model(args.model, backbone_name=args.backbone)
+    model = models.load_model(args.model, backbone_name=args.backbone, rebuild=True)
 
     # optionally convert the model
     if args.convert_model:
-        model = models.convert_model(model, anchor_params=anchor_params)
+        model = models.convert_model(model, anchor_params=anchor_params, pre_nms_top_k=args.pre_nms_top_k)
 
     # print model summary
     # print(model.summary())
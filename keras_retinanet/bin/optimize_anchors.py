@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2017-2018 Fizyr (https://fizyr.com)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import argparse
+import os
+import sys
+
+# Allow relative imports when being executed as script.
+if __name__ == "__main__" and __package__ is None:
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+    import keras_retinanet.bin  # noqa: F401
+    __package__ = "keras_retinanet.bin"
+
+# Change these to absolute imports if you copy this script outside the keras_retinanet package.
+from ..preprocessing.csv_generator import CSVGenerator
+from ..preprocessing.kitti import KittiGenerator
+from ..preprocessing.open_images import OpenImagesGenerator
+from ..preprocessing.pascal_voc import PascalVocGenerator
+from ..utils.anchor_optimization import (
+    DEFAULT_RATIOS,
+    DEFAULT_SCALES,
+    DEFAULT_SIZE_FACTORS,
+    anchor_coverage,
+    collect_image_boxes,
+    format_values,
+    optimize_anchor_parameters,
+    write_anchor_config,
+)
+from ..utils.anchors import DEFAULT_PYRAMID_LEVELS, anchor_parameters_for_levels
+from ..utils.config import read_config_file, parse_anchor_parameters, parse_pyramid_levels
+
+
+def create_generator(args):
+    """ Create the generator to read the annotations from.
+    """
+    common_args = {
+        'image_min_side' : args.image_min_side,
+        'image_max_side' : args.image_max_side,
+        'no_resize'      : args.no_resize,
+        'shuffle_groups' : False,
+    }
+
+    if args.dataset_type == 'coco':
+        # import here to prevent unnecessary dependency on cocoapi
+        from ..preprocessing.coco import CocoGenerator
+
+        generator = CocoGenerator(args.coco_path, args.coco_set, **common_args)
+    elif args.dataset_type == 'pascal':
+        generator = PascalVocGenerator(args.pascal_path, args.pascal_set, **common_args)
+    elif args.dataset_type == 'csv':
+        generator = CSVGenerator(args.annotations, args.classes, **common_args)
+    elif args.dataset_type == 'kitti':
+        generator = KittiGenerator(args.kitti_path, subset=args.kitti_set, **common_args)
+    elif args.dataset_type == 'oid':
+        generator = OpenImagesGenerator(
+            args.main_dir,
+            subset=args.oid_set,
+            version=args.version,
+            labels_filter=args.labels_filter,
+            annotation_cache_dir=args.annotation_cache_dir,
+            parent_label=args.parent_label,
+            **common_args
+        )
+    else:
+        raise ValueError('Invalid data type received: {}'.format(args.dataset_type))
+
+    return generator
+
+
+def parse_values(values, type=float):
+    return [type(value) for value in values.split(' ') if value]
+
+
+def parse_args(args):
+    """ Parse the arguments.
+    """
+    parser     = argparse.ArgumentParser(description='Search anchor parameters that cover the annotations of a dataset with few anchors.')
+    subparsers = parser.add_subparsers(help='Arguments for specific dataset types.', dest='dataset_type')
+    subparsers.required = True
+
+    coco_parser = subparsers.add_parser('coco')
+    coco_parser.add_argument('coco_path', help='Path to dataset directory (ie. /tmp/COCO).')
+    coco_parser.add_argument('--coco-set', help='Name of the set to read the annotations from (defaults to train2017).', default='train2017')
+
+    pascal_parser = subparsers.add_parser('pascal')
+    pascal_parser.add_argument('pascal_path', help='Path to dataset directory (ie. /tmp/VOCdevkit).')
+    pascal_parser.add_argument('--pascal-set', help='Name of the set to read the annotations from (defaults to trainval).', default='trainval')
+
+    kitti_parser = subparsers.add_parser('kitti')
+    kitti_parser.add_argument('kitti_path', help='Path to dataset directory (ie. /tmp/kitti).')
+    kitti_parser.add_argument('--kitti-set', help='Name of the set to read the annotations from (defaults to train).', default='train')
+
+    def csv_list(string):
+        return string.split(',')
+
+    oid_parser = subparsers.add_parser('oid')
+    oid_parser.add_argument('main_dir', help='Path to dataset directory.')
+    oid_parser.add_argument('--oid-set', help='Name of the set to read the annotations from (defaults to train).', default='train')
+    oid_parser.add_argument('--version',  help='The current dataset version is v4.', default='v4')
+    oid_parser.add_argument('--labels-filter',  help='A list of labels to filter.', type=csv_list, default=None)
+    oid_parser.add_argument('--annotation-cache-dir', help='Path to store annotation cache.', default='.')
+    oid_parser.add_argument('--parent-label', help='Use the hierarchy children of this label.', default=None)
+
+    csv_parser = subparsers.add_parser('csv')
+    csv_parser.add_argument('annotations', help='Path to CSV file containing annotations.')
+    csv_parser.add_argument('classes', help='Path to a CSV file containing class label mapping.')
+
+    parser.add_argument('--output',           help='Path of the config file to write the anchor parameters to.', default='anchors.ini')
+    parser.add_argument('--config',           help='Path to a configuration parameters .ini file to compare with and to take the base sizes, strides and pyramid levels from.')
+    parser.add_argument('--max-anchors',      help='Maximum number of anchors per location.', type=int, default=9)
+    parser.add_argument('--ratios',           help='Candidate ratios (height / width), separated by spaces.', default=format_values(DEFAULT_RATIOS))
+    parser.add_argument('--scales',           help='Candidate scales, separated by spaces.', default=format_values(DEFAULT_SCALES))
+    parser.add_argument('--size-factors',     help='Candidate factors for the anchor sizes, separated by spaces.', default=format_values(DEFAULT_SIZE_FACTORS))
+    parser.add_argument('--max-images',       help='Use a random subset of at most this many images (0 uses all images).', type=int, default=500)
+    parser.add_argument('--seed',             help='Random seed used to select the subset of images.', type=int, default=0)
+    parser.add_argument('--positive-overlap', help='IoU overlap for positive anchors.', type=float, default=0.5)
+    parser.add_argument('--negative-overlap', help='IoU overlap for negative anchors.', type=float, default=0.4)
+    parser.add_argument('--min-gain',         help='Minimum increase in coverage to add a ratio or scale.', type=float, default=0.001)
+    parser.add_argument('--image-min-side',   help='Rescale the image so the smallest side is min_side.', type=int, default=800)
+    parser.add_argument('--image-max-side',   help='Rescale the image if the largest side is larger than max_side.', type=int, default=1333)
+    parser.add_argument('--no-resize',        help='Don''t rescale the image.', action='store_true')
+
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    # parse arguments
+    if args is None:
+        args = sys.argv[1:]
+    args = parse_args(args)
+
+    # optionally load config parameters
+    reference_params = None
+    pyramid_levels   = None
+    if args.config:
+        config = read_config_file(args.config)
+        if 'anchor_parameters' in config:
+            reference_params = parse_anchor_parameters(config)
+        pyramid_levels = parse_pyramid_levels(config)
+    reference_params = anchor_parameters_for_levels(pyramid_levels or DEFAULT_PYRAMID_LEVELS, reference_params)
+
+    generator   = create_generator(args)
+    image_boxes = collect_image_boxes(generator, max_images=args.max_images or None, seed=args.seed)
+    if not image_boxes:
+        raise ValueError('No annotations found in the dataset.')
+    print('Collected {} boxes from {} images.'.format(sum(len(boxes) for _, boxes in image_boxes), len(image_boxes)))
+
+    coverage, positives = anchor_coverage(image_boxes, reference_params, args.negative_overlap, args.positive_overlap, pyramid_levels)
+    print('Reference: coverage {:.4f}, {:.2f} positive anchors per box, {} anchors per location.'.format(coverage, positives, reference_params.num_anchors()))
+
+    anchor_params, (coverage, positives) = optimize_anchor_parameters(
+        image_boxes,
+        max_anchors      = args.max_anchors,
+        ratios           = parse_values(args.ratios),
+        scales           = parse_values(args.scales),
+        size_factors     = parse_values(args.size_factors),
+        base_sizes       = reference_params.sizes,
+        strides          = reference_params.strides,
+        negative_overlap = args.negative_overlap,
+        positive_overlap = args.positive_overlap,
+        pyramid_levels   = pyramid_levels,
+        min_gain         = args.min_gain,
+        verbose          = True,
+    )
+    print('Optimized: coverage {:.4f}, {:.2f} positive anchors per box, {} anchors per location.'.format(coverage, positives, anchor_params.num_anchors()))
+    print('sizes   = {}'.format(format_values(anchor_params.sizes)))
+    print('strides = {}'.format(format_values(anchor_params.strides)))
+    print('ratios  = {}'.format(format_values(anchor_params.ratios)))
+    print('scales  = {}'.format(format_values(anchor_params.scales)))
+
+    write_anchor_config(args.output, anchor_params, pyramid_levels)
+    print('Wrote anchor parameters to {}.'.format(args.output))
+
+
+if __name__ == '__main__':
+    main()
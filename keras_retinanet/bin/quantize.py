@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2017-2018 Fizyr (https://fizyr.com)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+    http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import argparse
+import os
+import sys
+
+# Allow relative imports when being executed as script.
+if __name__ == "__main__" and __package__ is None:
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+    import keras_retinanet.bin  # noqa: F401
+    __package__ = "keras_retinanet.bin"
+
+# Change these to absolute imports if you copy this script outside the keras_retinanet package.
+from .. import models
+from ..utils import quantization
+from ..utils.config import read_config_file, parse_anchor_parameters
+from ..utils.eval import evaluate
+from ..utils.gpu import setup_gpu
+from ..utils.keras_version import check_keras_version
+from ..utils.tf_version import check_tf_version
+from .train import create_generators
+
+
+def parse_args(args):
+    """ Parse the arguments.
+    """
+    parser     = argparse.ArgumentParser(description='Post-training quantization script for a RetinaNet network.')
+    subparsers = parser.add_subparsers(help='Arguments for specific dataset types.', dest='dataset_type')
+    subparsers.required = True
+
+    # the datasets are read like the training script reads them, calibrating on the training set and evaluating on the validation set
+    coco_parser = subparsers.add_parser('coco')
+    coco_parser.add_argument('coco_path', help='Path to dataset directory (ie. /tmp/COCO).')
+
+    pascal_parser = subparsers.add_parser('pascal')
+    pascal_parser.add_argument('pascal_path', help='Path to dataset directory (ie. /tmp/VOCdevkit).')
+
+    kitti_parser = subparsers.add_parser('kitti')
+    kitti_parser.add_argument('kitti_path', help='Path to dataset directory (ie. /tmp/kitti).')
+
+    def csv_list(string):
+        return string.split(',')
+
+    oid_parser = subparsers.add_parser('oid')
+    oid_parser.add_argument('main_dir', help='Path to dataset directory.')
+    oid_parser.add_argument('--version',  help='The current dataset version is v4.', default='v4')
+    oid_parser.add_argument('--labels-filter',  help='A list of labels to filter.', type=csv_list, default=None)
+    oid_parser.add_argument('--annotation-cache-dir', help='Path to store annotation cache.', default='.')
+    oid_parser.add_argument('--parent-label', help='Use the hierarchy children of this label.', default=None)
+
+    csv_parser = subparsers.add_parser('csv')
+    csv_parser.add_argument('annotations', help='Path to CSV file containing annotations of the images to calibrate with.')
+    csv_parser.add_argument('classes', help='Path to a CSV file containing class label mapping.')
+    csv_parser.add_argument('--val-annotations', help='Path to CSV file containing annotations for evaluation (defaults to the calibration annotations).')
+
+    parser.add_argument('model',                  help='Path to RetinaNet model.')
+    parser.add_argument('output',                 help='Path to save the quantized TFLite model to.')
+    parser.add_argument('--convert-model',        help='Convert the model to an inference model (ie. the input is a training model).', action='store_true')
+    parser.add_argument('--backbone',             help='The backbone of the model.', default='resnet50')
+    parser.add_argument('--quantization',         help='Quantize the weights and activations (int8) or only the weights (dynamic).', choices=quantization.QUANTIZATIONS, default='int8')
+    parser.add_argument('--calibration-images',   help='Number of images to calibrate the activation ranges with.', type=int, default=100)
+    parser.add_argument('--seed',                 help='Seed for sampling the calibration images.', type=int, default=0)
+    parser.add_argument('--latency-images',       help='Number of evaluation images to measure the latency on.', type=int, default=20)
+    parser.add_argument('--num-threads',          help='Number of threads of the TFLite interpreter (defaults to all cores).', type=int)
+    parser.add_argument('--score-threshold',      help='Threshold on score to filter detections with (defaults to 0.05).', default=0.05, type=float)
+    parser.add_argument('--iou-threshold',        help='IoU Threshold to count for a positive detection (defaults to 0.5).', default=0.5, type=float)
+    parser.add_argument('--max-detections',       help='Max Detections per image (defaults to 100).', default=100, type=int)
+    parser.add_argument('--image-min-side',       help='Rescale the image so the smallest side is min_side.', type=int, default=800)
+    parser.add_argument('--image-max-side',       help='Rescale the image if the largest side is larger than max_side.', type=int, default=1333)
+    parser.add_argument('--no-resize',            help='Don''t rescale the image.', action='store_true')
+    parser.add_argument('--config',               help='Path to a configuration parameters .ini file (only used with --convert-model).')
+    parser.add_argument('--pre-nms-top-k',        help='Only decode and filter the k highest scoring anchors of every pyramid level (only used with --convert-model).', type=int)
+
+    # the generator arguments of the training script that don't apply to quantization
+    parser.set_defaults(batch_size=1, random_transform=False, reduced_decoding=False, prune_overlaps=False, batched_anchor_targets=False)
+
+    return parser.parse_args(args)
+
+
+def mean_average_precision(average_precisions):
+    """ Returns the mean of the average precisions of the classes with annotations, or None if there are none.
+    """
+    precisions = [average_precision for average_precision, num_annotations in average_precisions.values() if num_annotations > 0]
+    if not precisions:
+        return None
+    return sum(precisions) / len(precisions)
+
+
+def main(args=None):
+    # parse arguments
+    if args is None:
+        args = sys.argv[1:]
+    args = parse_args(args)
+
+    # make sure keras and tensorflow are the minimum required version
+    check_keras_version()
+    check_tf_version()
+
+    # quantized models are meant for CPU inference, so compare against the keras model on the CPU
+    setup_gpu('cpu')
+
+    # optionally load config parameters
+    if args.config:
+        args.config = read_config_file(args.config)
+
+    # create the generators, evaluating on the calibration images if there is no validation set
+    backbone = models.backbone(args.backbone)
+    calibration_generator, evaluation_generator = create_generators(args, backbone.preprocess_image)
+    if evaluation_generator is None:
+        evaluation_generator = calibration_generator
+
+    # optionally load anchor parameters
+    anchor_params = None
+    if args.config and 'anchor_parameters' in args.config:
+        anchor_params = parse_anchor_parameters(args.config)
+
+    # load the model
+    print('Loading model, this may take a second...')
+    model = models.load_model(args.model, backbone_name=args.backbone, rebuild=True)
+
+    # optionally convert the model
+    if args.convert_model:
+        model = models.convert_model(model, anchor_params=anchor_params, nms_method='combined', pre_nms_top_k=args.pre_nms_top_k)
+
+    # quantize the model, the returned model uses the same NMS as the quantized model
+    print('Quantizing model, calibrating on {} images...'.format(min(args.calibration_images, calibration_generator.size())))
+    model = quantization.quantize_model(
+        model,
+        args.output,
+        calibration_generator,
+        quantization=args.quantization,
+        num_calibration_images=args.calibration_images,
+        seed=args.seed
+    )
+    quantized_model = quantization.TFLiteModel(args.output, num_threads=args.num_threads)
+
+    # evaluate both models
+    evaluate_args = {
+        'iou_threshold'   : args.iou_threshold,
+        'score_threshold' : args.score_threshold,
+        'max_detections'  : args.max_detections,
+    }
+    average_precisions           = evaluate(evaluation_generator, model, **evaluate_args)
+    quantized_average_precisions = evaluate(evaluation_generator, quantized_model, **evaluate_args)
+
+    # measure the latency of both models
+    latency_images    = list(quantization.generator_images(evaluation_generator, args.latency_images, seed=args.seed))
+    latency           = quantization.measure_latency(model, latency_images).mean()
+    quantized_latency = quantization.measure_latency(quantized_model, latency_images).mean()
+
+    # print the comparison
+    print('{:>30} {:>10} {:>10} {:>10}'.format('', 'float', args.quantization, 'delta'))
+    for label, (average_precision, num_annotations) in average_precisions.items():
+        quantized_average_precision = quantized_average_precisions[label][0]
+        print('{:>30} {:>10.4f} {:>10.4f} {:>+10.4f}'.format(
+            '{} ({:.0f})'.format(evaluation_generator.label_to_name(label), num_annotations),
+            average_precision,
+            quantized_average_precision,
+            quantized_average_precision - average_precision
+        ))
+
+    mean_ap           = mean_average_precision(average_precisions)
+    quantized_mean_ap = mean_average_precision(quantized_average_precisions)
+    if mean_ap is None:
+        print('No test instances found.')
+    else:
+        print('{:>30} {:>10.4f} {:>10.4f} {:>+10.4f}'.format('mAP', mean_ap, quantized_mean_ap, quantized_mean_ap - mean_ap))
+
+    print('{:>30} {:>10.1f} {:>10.1f} {:>+10.1f}'.format('latency (ms)', latency * 1000, quantized_latency * 1000, (quantized_latency - latency) * 1000))
+    print('Saved the {} model to {} ({:.1f}x speedup).'.format(args.quantization, args.output, latency / quantized_latency))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2017-2018 Fizyr (https://fizyr.com)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+    http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import argparse
+import os
+import sys
+
+# Allow relative imports when being executed as script.
+if __name__ == "__main__" and __package__ is None:
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+    import keras_retinanet.bin  # noqa: F401
+    __package__ = "keras_retinanet.bin"
+
+# Change these to absolute imports if you copy this script outside the keras_retinanet package.
+from .. import models
+from ..utils.config import read_config_file, parse_anchor_parameters
+from ..utils.gpu import setup_gpu
+from ..utils.keras_version import check_keras_version
+from ..utils.server import BatchPredictor, HTTPServer, UnixHTTPServer
+from ..utils.tf_version import check_tf_version
+
+
+def parse_args(args):
+    """ Parse the arguments.
+    """
+    parser = argparse.ArgumentParser(description='Local prediction server for a RetinaNet network, batching concurrent requests.')
+
+    parser.add_argument('model',                  help='Path to RetinaNet model.')
+    parser.add_argument('--convert-model',        help='Convert the model to an inference model (ie. the input is a training model).', action='store_true')
+    parser.add_argument('--backbone',             help='The backbone of the model.', default='resnet50')
+    parser.add_argument('--config',               help='Path to a configuration parameters .ini file (only used with --convert-model).')
+
+    listen_group = parser.add_mutually_exclusive_group()
+    listen_group.add_argument('--port',           help='Port to listen on for HTTP requests.', type=int, default=8080)
+    listen_group.add_argument('--unix-socket',    help='Path of a Unix socket to listen on instead of a port.')
+    parser.add_argument('--host',                 help='Host to listen on for HTTP requests.', default='127.0.0.1')
+
+    parser.add_argument('--max-batch-size',       help='Maximum number of images predicted in one batch.', type=int, default=8)
+    parser.add_argument('--max-latency',          help='Maximum time in milliseconds a request waits for a batch to fill up.', type=float, default=10.0)
+    parser.add_argument('--preprocess-threads',   help='Number of threads to decode and preprocess images with.', type=int, default=4)
+    parser.add_argument('--timeout',              help='Time in seconds after which a request fails.', type=float, default=60.0)
+    parser.add_argument('--score-threshold',      help='Threshold on score to filter detections with (defaults to 0.05).', default=0.05, type=float)
+    parser.add_argument('--max-detections',       help='Max Detections per image (defaults to 100).', default=100, type=int)
+    parser.add_argument('--image-min-side',       help='Rescale the image so the smallest side is min_side.', type=int, default=800)
+    parser.add_argument('--image-max-side',       help='Rescale the image if the largest side is larger than max_side.', type=int, default=1333)
+    parser.add_argument('--quiet',                help='Don\'t log every request.', action='store_true')
+
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    # parse arguments
+    if args is None:
+        args = sys.argv[1:]
+    args = parse_args(args)
+
+    # make sure keras and tensorflow are the minimum required version
+    check_keras_version()
+    check_tf_version()
+
+    # the server runs on the CPU only
+    setup_gpu('cpu')
+
+    # optionally load config parameters
+    anchor_params = None
+    if args.config:
+        args.config = read_config_file(args.config)
+        if 'anchor_parameters' in args.config:
+            anchor_params = parse_anchor_parameters(args.config)
+
+    # load the model
+    print('Loading model, this may take a second...')
+    backbone = models.backbone(args.backbone)
+    model    = models.load_model(args.model, backbone_name=args.backbone, rebuild=True)
+
+    # optionally convert the model
+    if args.convert_model:
+        model = models.convert_model(model, anchor_params=anchor_params)
+
+    predictor = BatchPredictor(
+        model,
+        preprocess=backbone.preprocess_image,
+        max_batch_size=args.max_batch_size,
+        max_latency=args.max_latency / 1000,
+        preprocess_threads=args.preprocess_threads,
+        image_min_side=args.image_min_side,
+        image_max_side=args.image_max_side,
+        score_threshold=args.score_threshold,
+        max_detections=args.max_detections,
+    ).start()
+
+    if args.unix_socket:
+        server = UnixHTTPServer(args.unix_socket, predictor, timeout=args.timeout, quiet=args.quiet)
+        print('Serving on unix socket {} (POST /predict, GET /metrics).'.format(args.unix_socket))
+    else:
+        server = HTTPServer((args.host, args.port), predictor, timeout=args.timeout, quiet=args.quiet)
+        print('Serving on http://{}:{} (POST /predict, GET /metrics).'.format(*server.server_address[:2]))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        predictor.stop()
+        if args.unix_socket and os.path.exists(args.unix_socket):
+            os.remove(args.unix_socket)
+
+
+if __name__ == '__main__':
+    main()
@@ -17,6 +17,7 @@ limitations under the License.
 """
 
 import argparse
+import contextlib
 import os
 import sys
 import warnings
@@ -42,12 +43,13 @@ from ..preprocessing.csv_generator import CSVGenerator
 from ..preprocessing.kitti import KittiGenerator
 from ..preprocessing.open_images import OpenImagesGenerator
 from ..preprocessing.pascal_voc import PascalVocGenerator
-from ..utils.anchors import make_shapes_callback
-from ..utils.config import read_config_file, parse_anchor_parameters
+from ..utils.anchors import anchor_targets_bbox, anchor_targets_bbox_batched, make_shapes_callback
+from ..utils import distribute
+from ..utils.config import read_config_file, parse_anchor_parameters, parse_pyramid_levels
 from ..utils.gpu import setup_gpu
 from ..utils.image import random_visual_effect_generator
 from ..utils.keras_version import check_keras_version
-from ..utils.model import freeze as freeze_model
+from ..utils.model import freeze as freeze_model, GradientAccumulationModel
 from ..utils.tf_version import check_tf_version
 from ..utils.transform import random_transform_generator
 
@@ -77,20 +79,27 @@ def model_with_weights(model, weights, skip_mismatch):
 
 
 def create_models(backbone_retinanet, num_classes, weights, multi_gpu=0,
-                  freeze_backbone=False, lr=1e-5, config=None):
+                  freeze_backbone=False, lr=1e-5, config=None, jit_compile=False,
+                  gradient_accumulation_steps=1, distribution_strategy=None):
     """ Creates three models (model, training_model, prediction_model).
 
     Args
-        backbone_retinanet : A function to call to create a retinanet model with a given backbone.
-        num_classes        : The number of classes to train.
-        weights            : The weights to load into the model.
-        multi_gpu          : The number of GPUs to use for training.
-        freeze_backbone    : If True, disables learning for the backbone.
-        config             : Config parameters, None indicates the default configuration.
+        backbone_retinanet          : A function to call to create a retinanet model with a given backbone.
+        num_classes                 : The number of classes to train.
+        weights                     : The weights to load into the model.
+        multi_gpu                   : The number of GPUs to use for training.
+        freeze_backbone             : If True, disables learning for the backbone.
+        config                      : Config parameters, None indicates the default configuration.
+        jit_compile                 : If True, compile the training step with XLA.
+        gradient_accumulation_steps : Number of batches to sum the gradients of before every optimizer step (can't be combined with distribution_strategy).
+        distribution_strategy       : If not None, create and compile the training model in the scope of this tf.distribute strategy.
+
+    The models use the global mixed precision policy (see keras.mixed_precision.set_global_policy),
+    except for the outputs, the losses and the layers computing the detections which always use float32.
 
     Returns
         model            : The base model. This is also the model that is saved in snapshots.
-        training_model   : The training model. If multi_gpu=0, this is identical to model.
+        training_model   : The training model. If multi_gpu=0 and gradient_accumulation_steps=1, this is identical to model.
         prediction_model : The model wrapped with utility functions to perform object detection (applies regression values and performs NMS).
     """
 
@@ -103,28 +112,45 @@ def create_models(backbone_retinanet, num_classes, weights, multi_gpu=0,
         anchor_params = parse_anchor_parameters(config)
         num_anchors   = anchor_params.num_anchors()
 
-    # Keras recommends initialising a multi-gpu model on the CPU to ease weight sharing, and to prevent OOM errors.
-    # optionally wrap in a parallel model
-    if multi_gpu > 1:
-        from keras.utils import multi_gpu_model
-        with tf.device('/cpu:0'):
-            model = model_with_weights(backbone_retinanet(num_classes, num_anchors=num_anchors, modifier=modifier), weights=weights, skip_mismatch=True)
-        training_model = multi_gpu_model(model, gpus=multi_gpu)
-    else:
-        model          = model_with_weights(backbone_retinanet(num_classes, num_anchors=num_anchors, modifier=modifier), weights=weights, skip_mismatch=True)
-        training_model = model
-
-    # make prediction model
-    prediction_model = retinanet_bbox(model=model, anchor_params=anchor_params)
-
-    # compile model
-    training_model.compile(
-        loss={
-            'regression'    : losses.smooth_l1(),
-            'classification': losses.focal()
-        },
-        optimizer=keras.optimizers.adam(lr=lr, clipnorm=0.001)
-    )
+    # load the pyramid levels, or pass None (so that all levels are used)
+    pyramid_levels = parse_pyramid_levels(config)
+
+    # the variables of the model and the optimizer are mirrored on every worker of a distribution strategy
+    scope = distribution_strategy.scope() if distribution_strategy is not None else contextlib.nullcontext()
+
+    with scope:
+        # Keras recommends initialising a multi-gpu model on the CPU to ease weight sharing, and to prevent OOM errors.
+        # optionally wrap in a parallel model
+        if multi_gpu > 1:
+            from keras.utils import multi_gpu_model
+            with tf.device('/cpu:0'):
+                model = model_with_weights(backbone_retinanet(num_classes, num_anchors=num_anchors, modifier=modifier, pyramid_levels=pyramid_levels), weights=weights, skip_mismatch=True)
+            training_model = multi_gpu_model(model, gpus=multi_gpu)
+        else:
+            model          = model_with_weights(backbone_retinanet(num_classes, num_anchors=num_anchors, modifier=modifier, pyramid_levels=pyramid_levels), weights=weights, skip_mismatch=True)
+            training_model = model
+
+        # optionally sum the gradients of several batches before every optimizer step
+        if gradient_accumulation_steps > 1:
+            training_model = GradientAccumulationModel(training_model, gradient_accumulation_steps)
+
+        optimizer = keras.optimizers.Adam(learning_rate=lr, clipnorm=0.001)
+        if keras.mixed_precision.global_policy().compute_dtype == 'float16':
+            # scale the loss to prevent float16 gradients from underflowing
+            optimizer = keras.mixed_precision.LossScaleOptimizer(optimizer)
+
+        # compile model
+        training_model.compile(
+            loss={
+                'regression'    : losses.smooth_l1(),
+                'classification': losses.focal()
+            },
+            optimizer=optimizer,
+            jit_compile=jit_compile
+        )
+
+    # make prediction model, outside of the strategy scope so that evaluating it on the chief doesn't wait for the other workers
+    prediction_model = retinanet_bbox(model=model, anchor_params=anchor_params, pyramid_levels=pyramid_levels)
 
     return model, training_model, prediction_model
 
@@ -146,7 +172,10 @@ def create_callbacks(model, training_model, prediction_model, validation_generat
 
     tensorboard_callback = None
 
-    if args.tensorboard_dir:
+    # with multiple workers, only the chief writes logs and snapshots and evaluates the model
+    chief = args.worker_index == 0
+
+    if args.tensorboard_dir and chief:
         tensorboard_callback = keras.callbacks.TensorBoard(
             log_dir                = args.tensorboard_dir,
             histogram_freq         = 0,
@@ -159,7 +188,7 @@ def create_callbacks(model, training_model, prediction_model, validation_generat
             embeddings_metadata    = None
         )
 
-    if args.evaluation and validation_generator:
+    if args.evaluation and validation_generator and chief:
         if args.dataset_type == 'coco':
             from ..callbacks.coco import CocoEval
 
@@ -171,7 +200,7 @@ def create_callbacks(model, training_model, prediction_model, validation_generat
         callbacks.append(evaluation)
 
     # save the model
-    if args.snapshots:
+    if args.snapshots and chief:
         # ensure directory created first; otherwise h5py will error after epoch.
         makedirs(args.snapshot_path)
         checkpoint = keras.callbacks.ModelCheckpoint(
@@ -198,26 +227,31 @@ def create_callbacks(model, training_model, prediction_model, validation_generat
         min_lr     = 0
     ))
 
-    if args.tensorboard_dir:
+    if tensorboard_callback:
         callbacks.append(tensorboard_callback)
 
     return callbacks
 
 
-def create_generators(args, preprocess_image):
+def create_generators(args, preprocess_image, num_shards=1, shard_index=0):
     """ Create generators for training and validation.
 
     Args
         args             : parseargs object containing configuration for generators.
         preprocess_image : Function that preprocesses an image for the network.
+        num_shards       : Number of disjoint shards to split the training images into, one per training worker.
+        shard_index      : Index of the shard of training images of this worker.
     """
     common_args = {
-        'batch_size'       : args.batch_size,
-        'config'           : args.config,
-        'image_min_side'   : args.image_min_side,
-        'image_max_side'   : args.image_max_side,
-        'no_resize'        : args.no_resize,
-        'preprocess_image' : preprocess_image,
+        'batch_size'             : args.batch_size,
+        'config'                 : args.config,
+        'image_min_side'         : args.image_min_side,
+        'image_max_side'         : args.image_max_side,
+        'no_resize'              : args.no_resize,
+        'reduced_decoding'       : args.reduced_decoding,
+        'prune_overlaps'         : args.prune_overlaps,
+        'compute_anchor_targets' : anchor_targets_bbox_batched if args.batched_anchor_targets else anchor_targets_bbox,
+        'preprocess_image'       : preprocess_image,
     }
 
     # create random transform generator for augmenting training data
@@ -253,6 +287,8 @@ def create_generators(args, preprocess_image):
             'train2017',
             transform_generator=transform_generator,
             visual_effect_generator=visual_effect_generator,
+            num_shards=num_shards,
+            shard_index=shard_index,
             **common_args
         )
 
@@ -268,6 +304,8 @@ def create_generators(args, preprocess_image):
             'trainval',
             transform_generator=transform_generator,
             visual_effect_generator=visual_effect_generator,
+            num_shards=num_shards,
+            shard_index=shard_index,
             **common_args
         )
 
@@ -283,6 +321,8 @@ def create_generators(args, preprocess_image):
             args.classes,
             transform_generator=transform_generator,
             visual_effect_generator=visual_effect_generator,
+            num_shards=num_shards,
+            shard_index=shard_index,
             **common_args
         )
 
@@ -305,6 +345,8 @@ def create_generators(args, preprocess_image):
             parent_label=args.parent_label,
             transform_generator=transform_generator,
             visual_effect_generator=visual_effect_generator,
+            num_shards=num_shards,
+            shard_index=shard_index,
             **common_args
         )
 
@@ -324,6 +366,8 @@ def create_generators(args, preprocess_image):
             subset='train',
             transform_generator=transform_generator,
             visual_effect_generator=visual_effect_generator,
+            num_shards=num_shards,
+            shard_index=shard_index,
             **common_args
         )
 
@@ -339,6 +383,39 @@ def create_generators(args, preprocess_image):
     return train_generator, validation_generator
 
 
+def launch_local_workers(args, argv):
+    """ Run this script in a cluster of worker processes on this machine.
+
+    Args
+        args : parseargs args object.
+        argv : The command line arguments of this script.
+    """
+    threads = args.worker_threads or max(1, (os.cpu_count() or 1) // args.local_workers)
+
+    # every worker gets the same arguments, except for the description of the cluster
+    worker_argv = []
+    skip        = False
+    for arg in argv:
+        if skip:
+            skip = False
+        elif arg == '--local-workers':
+            skip = True
+        elif not arg.startswith('--local-workers='):
+            worker_argv.append(arg)
+
+    def command(worker_hosts, worker_index):
+        return [
+            sys.executable, os.path.abspath(__file__),
+            '--worker-hosts', ','.join(worker_hosts),
+            '--worker-index', str(worker_index),
+            '--worker-threads', str(threads),
+        ] + worker_argv
+
+    exit_codes = distribute.launch_local_workers(command, args.local_workers)
+    if any(exit_codes):
+        raise RuntimeError('Training failed on workers {}.'.format([index for index, code in enumerate(exit_codes) if code]))
+
+
 def check_args(parsed_args):
     """ Function to check for inherent contradictions within parsed arguments.
     For example, batch_size < num_gpus
@@ -364,6 +441,46 @@ def check_args(parsed_args):
     if parsed_args.multi_gpu > 1 and not parsed_args.multi_gpu_force:
         raise ValueError("Multi-GPU support is experimental, use at own risk! Run with --multi-gpu-force if you wish to continue.")
 
+    if parsed_args.tf_data and parsed_args.multiprocessing:
+        raise ValueError("The tf.data pipeline (--tf-data) computes batches in threads and can't be combined with --multiprocessing.")
+
+    if parsed_args.shared_memory and not parsed_args.multiprocessing:
+        raise ValueError("Shared memory batch transport (--shared-memory) requires --multiprocessing.")
+
+    if parsed_args.shared_memory and parsed_args.tf_data:
+        raise ValueError("Shared memory batch transport (--shared-memory) can't be combined with --tf-data.")
+
+    if parsed_args.gradient_accumulation_steps < 1:
+        raise ValueError("The number of gradient accumulation steps ({}) must be at least 1.".format(parsed_args.gradient_accumulation_steps))
+
+    if parsed_args.gradient_accumulation_steps > 1 and parsed_args.snapshot:
+        raise ValueError("Gradient accumulation (--gradient-accumulation-steps) and resuming from snapshots ({}) is not supported.".format(parsed_args.snapshot))
+
+    if (parsed_args.mixed_precision or parsed_args.xla) and parsed_args.snapshot:
+        raise ValueError("Mixed precision (--mixed-precision) and XLA (--xla) are set when creating a model and can't be combined with --snapshot.")
+
+    if parsed_args.throughput_csv and not parsed_args.monitor_throughput:
+        raise ValueError("Writing the throughput to a CSV file (--throughput-csv) requires --monitor-throughput.")
+
+    if parsed_args.local_workers and parsed_args.worker_hosts:
+        raise ValueError("Launch local workers (--local-workers) or describe the cluster of workers (--worker-hosts), not both.")
+
+    if parsed_args.local_workers or parsed_args.worker_hosts:
+        if parsed_args.multi_gpu > 1:
+            raise ValueError("Multi-worker training can't be combined with multi-GPU training (--multi-gpu).")
+
+        if parsed_args.snapshot:
+            raise ValueError("Multi-worker training and resuming from snapshots ({}) is not supported.".format(parsed_args.snapshot))
+
+        if parsed_args.multiprocessing or parsed_args.shared_memory:
+            raise ValueError("Multi-worker training feeds every worker through a tf.data pipeline and can't be combined with --multiprocessing or --shared-memory.")
+
+        if parsed_args.gradient_accumulation_steps > 1:
+            raise ValueError("Multi-worker training can't be combined with gradient accumulation (--gradient-accumulation-steps), tf.distribute strategies don't support its conditional optimizer step.")
+
+    if parsed_args.worker_hosts and not 0 <= parsed_args.worker_index < len(parsed_args.worker_hosts):
+        raise ValueError("Invalid worker index ({}) for {} workers.".format(parsed_args.worker_index, len(parsed_args.worker_hosts)))
+
     if 'resnet' not in parsed_args.backbone:
         warnings.warn('Using experimental backbone {}. Only resnet50 has been properly tested.'.format(parsed_args.backbone))
 
@@ -409,6 +526,7 @@ def parse_args(args):
 
     parser.add_argument('--backbone',         help='Backbone model used by retinanet.', default='resnet50', type=str)
     parser.add_argument('--batch-size',       help='Size of the batches.', default=1, type=int)
+    parser.add_argument('--gradient-accumulation-steps', help='Sum the gradients of this many batches before every optimizer step, for an effective batch size of batch-size * steps (--steps counts single batches).', default=1, type=int)
     parser.add_argument('--gpu',              help='Id of the GPU to use (as reported by nvidia-smi).')
     parser.add_argument('--multi-gpu',        help='Number of GPUs to use for parallel processing.', type=int, default=0)
     parser.add_argument('--multi-gpu-force',  help='Extra flag needed to enable (experimental) multi-gpu support.', action='store_true')
@@ -424,14 +542,37 @@ def parse_args(args):
     parser.add_argument('--image-min-side',   help='Rescale the image so the smallest side is min_side.', type=int, default=800)
     parser.add_argument('--image-max-side',   help='Rescale the image if the largest side is larger than max_side.', type=int, default=1333)
     parser.add_argument('--no-resize',        help='Don''t rescale the image.', action='store_true')
+    parser.add_argument('--reduced-decoding', help='Decode JPEG images at a reduced resolution when they are downscaled anyway.', action='store_true')
+    parser.add_argument('--prune-overlaps',   help='Only compute the overlaps of anchors near each annotation when computing the anchor targets.', action='store_true')
+    parser.add_argument('--batched-anchor-targets', help='Compute the anchor targets for all images of a batch at once.', action='store_true')
     parser.add_argument('--config',           help='Path to a configuration parameters .ini file.')
     parser.add_argument('--weighted-average', help='Compute the mAP using the weighted average of precisions among classes.', action='store_true')
     parser.add_argument('--compute-val-loss', help='Compute validation loss during training', dest='compute_val_loss', action='store_true')
+    parser.add_argument('--mixed-precision',  help='Train with a mixed precision policy (mixed_bfloat16 for CPUs that support bfloat16, mixed_float16 for GPUs).', choices=['mixed_float16', 'mixed_bfloat16'])
+    parser.add_argument('--xla',              help='Compile the training step with XLA (every new image size triggers a recompilation).', action='store_true')
+
+    # Throughput monitoring arguments
+    parser.add_argument('--monitor-throughput', help='Record the time per batch, the time spent waiting for data and in every stage of the generator, and the images per second.', action='store_true')
+    parser.add_argument('--throughput-csv',     help='Write the throughput of every batch to this CSV file (requires --monitor-throughput).')
+
+    # Multi-worker training arguments
+    parser.add_argument('--local-workers',    help='Train synchronously on this many worker processes on this machine, every worker trains on a shard of the training images.', type=int, default=0)
+    parser.add_argument('--worker-hosts',     help='Comma separated list of host:port addresses of all workers, to train synchronously on a cluster of workers.', type=csv_list)
+    parser.add_argument('--worker-index',     help='Index of this worker in --worker-hosts, worker 0 writes logs and snapshots and evaluates the model.', type=int, default=0)
+    parser.add_argument('--worker-threads',   help='Number of threads every worker uses for its operations (defaults to the number of cores divided by the number of local workers).', type=int)
 
     # Fit generator arguments
     parser.add_argument('--multiprocessing',  help='Use multiprocessing in fit_generator.', action='store_true')
     parser.add_argument('--workers',          help='Number of generator workers.', type=int, default=1)
     parser.add_argument('--max-queue-size',   help='Queue length for multiprocessing workers in fit_generator.', type=int, default=10)
+    parser.add_argument('--shared-memory',    help='Transfer batches from multiprocessing workers through shared memory slots instead of pickling them.', action='store_true')
+
+    # tf.data pipeline arguments
+    parser.add_argument('--tf-data',                 help='Feed the training generator through a tf.data pipeline instead of fit_generator workers.', action='store_true')
+    parser.add_argument('--tf-data-parallel-calls',  help='Number of batches computed in parallel by the tf.data pipeline (defaults to autotune).', type=int, default=-1)
+    parser.add_argument('--tf-data-prefetch',        help='Number of batches prefetched by the tf.data pipeline (defaults to autotune, 0 disables prefetching).', type=int, default=-1)
+    parser.add_argument('--tf-data-interleave',      help='Number of interleaved shards of groups in the tf.data pipeline (0 disables interleaving).', type=int, default=0)
+    parser.add_argument('--tf-data-cache',           help='Cache batches of the tf.data pipeline in a file with this prefix (use \'\' for an in-memory cache).', default=None)
 
     return check_args(parser.parse_args(args))
 
@@ -440,8 +581,13 @@ def main(args=None):
     # parse arguments
     if args is None:
         args = sys.argv[1:]
+    argv = args
     args = parse_args(args)
 
+    # optionally run this script in a cluster of local workers instead
+    if args.local_workers:
+        return launch_local_workers(args, argv)
+
     # create object that stores backbone information
     backbone = models.backbone(args.backbone)
 
@@ -453,12 +599,31 @@ def main(args=None):
     if args.gpu:
         setup_gpu(args.gpu)
 
+    # optionally train synchronously with the other workers of a cluster, on a shard of the training images
+    strategy = None
+    if args.worker_hosts:
+        if args.worker_threads:
+            tf.config.threading.set_intra_op_parallelism_threads(args.worker_threads)
+        strategy = distribute.multi_worker_strategy(args.worker_hosts, args.worker_index)
+
     # optionally load config parameters
     if args.config:
         args.config = read_config_file(args.config)
 
+    # optionally use mixed precision for the models created below
+    if args.mixed_precision:
+        keras.mixed_precision.set_global_policy(args.mixed_precision)
+
     # create the generators
-    train_generator, validation_generator = create_generators(args, backbone.preprocess_image)
+    if strategy is not None:
+        train_generator, validation_generator = create_generators(
+            args,
+            backbone.preprocess_image,
+            num_shards=distribute.num_workers(strategy),
+            shard_index=distribute.worker_index(strategy)
+        )
+    else:
+        train_generator, validation_generator = create_generators(args, backbone.preprocess_image)
 
     # create the model
     if args.snapshot is not None:
@@ -468,7 +633,7 @@ def main(args=None):
         anchor_params    = None
         if args.config and 'anchor_parameters' in args.config:
             anchor_params = parse_anchor_parameters(args.config)
-        prediction_model = retinanet_bbox(model=model, anchor_params=anchor_params)
+        prediction_model = retinanet_bbox(model=model, anchor_params=anchor_params, pyramid_levels=parse_pyramid_levels(args.config))
     else:
         weights = args.weights
         # default to imagenet if nothing else is specified
@@ -483,7 +648,10 @@ def main(args=None):
             multi_gpu=args.multi_gpu,
             freeze_backbone=args.freeze_backbone,
             lr=args.lr,
-            config=args.config
+            config=args.config,
+            jit_compile=args.xla,
+            gradient_accumulation_steps=args.gradient_accumulation_steps,
+            distribution_strategy=strategy
         )
 
     # print model summary
@@ -507,18 +675,81 @@ def main(args=None):
     if not args.compute_val_loss:
         validation_generator = None
 
+    # the generator computing the training batches, even if they are fed through a tf.data pipeline or enqueuer
+    generator = train_generator
+
+    # optionally replace the keras.utils.Sequence by a tf.data pipeline, workers of a cluster always use one
+    if args.tf_data or strategy is not None:
+        from ..preprocessing.tf_data import generator_to_dataset
+        train_generator = generator_to_dataset(
+            train_generator,
+            num_parallel_calls = args.tf_data_parallel_calls,
+            prefetch           = args.tf_data_prefetch,
+            interleave         = args.tf_data_interleave,
+            cache              = args.tf_data_cache,
+        )
+
+        # the training generator of every worker is already sharded, feed its batches to the worker as they are
+        if strategy is not None:
+            train_generator = distribute.distribute_dataset(strategy, train_generator)
+
+    # optionally compute batches in worker processes that share their batches through shared memory
+    enqueuer = None
+    workers  = args.workers
+    if args.shared_memory:
+        from ..preprocessing.shared_memory import SharedMemoryEnqueuer
+        enqueuer = SharedMemoryEnqueuer(train_generator, workers=args.workers, slots=args.max_queue_size)
+        enqueuer.start()
+        train_generator = enqueuer.get()
+
+        # the enqueuer replaces the keras workers, consume its batches on the main thread
+        workers = 0
+
+    # optionally record the training throughput and how long every batch is waited for
+    if args.monitor_throughput:
+        from ..callbacks.throughput import MonitoredIterator, Throughput
+
+        monitor = None
+        if enqueuer is not None:
+            monitor = MonitoredIterator(train_generator, queue=enqueuer.results)
+        elif args.tf_data and strategy is None:
+            monitor = MonitoredIterator(train_generator)
+        elif strategy is None:
+            # compute the batches in our own enqueuer, so that the training loop fetches them from its queue
+            enqueuer = keras.utils.OrderedEnqueuer(train_generator, use_multiprocessing=args.multiprocessing, shuffle=True)
+            enqueuer.start(workers=max(1, args.workers), max_queue_size=args.max_queue_size)
+            monitor = MonitoredIterator(enqueuer.get(), queue=enqueuer.queue)
+
+        # every training step fetches its own batch, so the time it waits for the batch is the time it stalls
+        if monitor is not None:
+            train_generator = monitor.dataset()
+            workers         = 0
+
+        chief = args.worker_index == 0
+        callbacks.insert(0, Throughput(
+            args.batch_size,
+            generator=generator,
+            monitor=monitor,
+            csv_path=args.throughput_csv if chief else None,
+            log_dir=args.tensorboard_dir if chief else None,
+        ))
+
     # start training
-    return training_model.fit_generator(
-        generator=train_generator,
-        steps_per_epoch=args.steps,
-        epochs=args.epochs,
-        verbose=1,
-        callbacks=callbacks,
-        workers=args.workers,
-        use_multiprocessing=args.multiprocessing,
-        max_queue_size=args.max_queue_size,
-        validation_data=validation_generator
-    )
+    try:
+        return training_model.fit_generator(
+            generator=train_generator,
+            steps_per_epoch=args.steps,
+            epochs=args.epochs,
+            verbose=1,
+            callbacks=callbacks,
+            workers=workers,
+            use_multiprocessing=args.multiprocessing and enqueuer is None,
+            max_queue_size=args.max_queue_size,
+            validation_data=validation_generator
+        )
+    finally:
+        if enqueuer is not None:
+            enqueuer.stop()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,265 @@
+"""
+Copyright 2017-2018 Fizyr (https://fizyr.com)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import collections
+import csv
+import itertools
+import os
+import time
+
+import keras
+import numpy as np
+import tensorflow as tf
+
+from ..preprocessing.generator import STAGES
+
+
+class MonitoredIterator(object):
+    """ Iterate over batches, recording how long every batch is waited for and the depth of the queue it comes from.
+
+    Train on MonitoredIterator.dataset(), so that every batch is fetched by the training step that uses it.
+    """
+
+    def __init__(self, iterable, queue=None):
+        """ Initialize a MonitoredIterator.
+
+        Args
+            iterable : The batches to iterate over, for example the output of an enqueuer.
+            queue    : The queue the batches are taken from (anything with a qsize method), to record its depth.
+        """
+        self.iterator = iter(iterable)
+        self.queue    = queue
+        self.records  = collections.deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        queue_size = self.queue.qsize() if self.queue is not None else None
+
+        start = time.perf_counter()
+        batch = next(self.iterator)
+        self.records.append((time.perf_counter() - start, queue_size))
+
+        return batch
+
+    def dataset(self):
+        """ A tf.data.Dataset of the batches, without prefetching.
+
+        Without prefetching, the time a batch is waited for is the time the training step that uses it stalls.
+        """
+        # tf.data expects tuples instead of lists, ie. for the targets of the Generator
+        def to_tuples(structure):
+            if isinstance(structure, (list, tuple)):
+                return tuple(to_tuples(element) for element in structure)
+            return structure
+
+        # inspect the first batch for the structure of the batches
+        peek          = next(self.iterator)
+        self.iterator = itertools.chain([peek], self.iterator)
+        signature     = tf.nest.map_structure(lambda x: tf.TensorSpec([None] * len(x.shape), tf.as_dtype(x.dtype)), to_tuples(peek))
+
+        options = tf.data.Options()
+        options.autotune.enabled                          = False
+        options.experimental_optimization.inject_prefetch = False
+
+        dataset = tf.data.Dataset.from_generator(lambda: (to_tuples(batch) for batch in self), output_signature=signature)
+        return dataset.with_options(options)
+
+
+class Throughput(keras.callbacks.Callback):
+    """ Record the training throughput and how much of it is spent waiting for data.
+
+    For every batch this records the wall time, the time spent waiting for data and computing, the images per second,
+    the depth of the queue of batches and the time spent in every stage of Generator.compute_input_output.
+    """
+
+    def __init__(
+        self,
+        batch_size,
+        generator=None,
+        monitor=None,
+        csv_path=None,
+        log_dir=None,
+        verbose=1
+    ):
+        """ Initialize the callback.
+
+        # Arguments
+            batch_size : The number of images in a batch.
+            generator  : The Generator computing the batches, to record the time spent in every stage (only batches computed in this process are recorded, ie. not with multiprocessing).
+            monitor    : The MonitoredIterator that is trained on, to record the time spent waiting for data and the queue depth.
+            csv_path   : If not None, write the timings of every batch to this CSV file.
+            log_dir    : If not None, write the timings to TensorBoard in this directory.
+            verbose    : If 1, print a summary at the end of every epoch.
+        """
+        self.batch_size = batch_size
+        self.generator  = generator
+        self.monitor    = monitor
+        self.csv_path   = csv_path
+        self.log_dir    = log_dir
+        self.verbose    = verbose
+
+        self.fields     = ['epoch', 'batch', 'batch_time', 'data_wait', 'compute', 'images_per_second', 'queue_size'] + ['stage_' + stage for stage in STAGES]
+        self.rows       = []
+        self.epoch      = 0
+        self.step       = 0
+
+        self._csv_file       = None
+        self._csv_writer     = None
+        self._summary_writer = None
+        self._stage_timings  = None
+        self._last_time      = None
+
+        super(Throughput, self).__init__()
+
+    def on_train_begin(self, logs=None):
+        self.step = 0
+
+        if self.generator is not None and self.generator.stage_timings is None:
+            self._stage_timings = self.generator.stage_timings = collections.deque()
+
+        # the batches fetched before training started (ie. to inspect the shapes) weren't waited for by a training step
+        if self.monitor is not None:
+            self.monitor.records.clear()
+
+        if self.csv_path:
+            self._csv_file   = open(self.csv_path, 'w', newline='')
+            self._csv_writer = csv.DictWriter(self._csv_file, fieldnames=self.fields)
+            self._csv_writer.writeheader()
+
+        if self.log_dir:
+            self._summary_writer = tf.summary.create_file_writer(os.path.join(self.log_dir, 'throughput'))
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch      = epoch
+        self.rows       = []
+        self._last_time = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        now             = time.perf_counter()
+        batch_time      = now - self._last_time
+        self._last_time = now
+
+        row = {
+            'epoch'             : self.epoch,
+            'batch'             : batch,
+            'batch_time'        : batch_time,
+            'images_per_second' : self.batch_size / batch_time,
+        }
+
+        # the time waited for the batches fetched since the previous batch
+        if self.monitor is not None:
+            records           = [self.monitor.records.popleft() for _ in range(len(self.monitor.records))]
+            queue_sizes       = [queue_size for _, queue_size in records if queue_size is not None]
+            row['data_wait']  = sum(wait for wait, _ in records)
+            row['compute']    = max(0.0, batch_time - row['data_wait'])
+            row['queue_size'] = queue_sizes[-1] if queue_sizes else None
+
+        # the mean time per stage of the batches computed since the previous batch
+        if self.generator is not None and self.generator.stage_timings:
+            timings = [self.generator.stage_timings.popleft() for _ in range(len(self.generator.stage_timings))]
+            for stage in STAGES:
+                row['stage_' + stage] = float(np.mean([timing[stage] for timing in timings]))
+
+        self.rows.append(row)
+
+        if self._csv_writer is not None:
+            self._csv_writer.writerow(row)
+
+        if self._summary_writer is not None:
+            with self._summary_writer.as_default():
+                for field in self.fields[2:]:
+                    if row.get(field) is not None:
+                        tf.summary.scalar('throughput/' + field, row[field], step=self.step)
+
+        self.step += 1
+
+    def summary(self, rows=None):
+        """ Summarize the timings of a list of batches (defaults to the batches of the current epoch).
+
+        Returns
+            A dictionary with the throughput in images per second, the fraction of the time spent waiting for data,
+            the 50th and 90th percentile of the batch time, the mean queue size and the mean time of every stage.
+        """
+        rows = self.rows if rows is None else rows
+        if not rows:
+            return {}
+
+        def mean(field):
+            values = [row[field] for row in rows if row.get(field) is not None]
+            return float(np.mean(values)) if values else None
+
+        batch_times = np.array([row['batch_time'] for row in rows])
+        summary     = {
+            'images_per_second' : self.batch_size * len(rows) / batch_times.sum(),
+            'batch_time_p50'    : float(np.percentile(batch_times, 50)),
+            'batch_time_p90'    : float(np.percentile(batch_times, 90)),
+            'queue_size'        : mean('queue_size'),
+        }
+        if self.monitor is not None:
+            summary['data_wait_fraction'] = sum(row['data_wait'] for row in rows) / batch_times.sum()
+        for stage in STAGES:
+            summary['stage_' + stage] = mean('stage_' + stage)
+
+        return summary
+
+    def on_epoch_end(self, epoch, logs=None):
+        logs    = logs if logs is not None else {}
+        summary = self.summary()
+        if not summary:
+            return
+
+        logs['images_per_second'] = summary['images_per_second']
+        if 'data_wait_fraction' in summary:
+            logs['data_wait_fraction'] = summary['data_wait_fraction']
+
+        if self._summary_writer is not None:
+            with self._summary_writer.as_default():
+                for name, value in summary.items():
+                    if value is not None:
+                        tf.summary.scalar('throughput/epoch_' + name, value, step=epoch)
+            self._summary_writer.flush()
+
+        if self.verbose == 1:
+            print('{:.2f} images/s, batch time p50 {:.1f} ms, p90 {:.1f} ms'.format(
+                summary['images_per_second'],
+                summary['batch_time_p50'] * 1000,
+                summary['batch_time_p90'] * 1000,
+            ))
+            if 'data_wait_fraction' in summary:
+                print('{:.1%} of the time waiting for data (mean queue size {})'.format(
+                    summary['data_wait_fraction'],
+                    '{:.1f}'.format(summary['queue_size']) if summary['queue_size'] is not None else 'unknown'
+                ))
+            stages = [(stage, summary['stage_' + stage]) for stage in STAGES if summary['stage_' + stage] is not None]
+            if stages:
+                print('Generator stages (ms/batch): ' + ', '.join('{} {:.1f}'.format(stage, value * 1000) for stage, value in stages))
+
+    def on_train_end(self, logs=None):
+        if self._csv_file is not None:
+            self._csv_file.close()
+            self._csv_file   = None
+            self._csv_writer = None
+
+        if self._summary_writer is not None:
+            self._summary_writer.close()
+            self._summary_writer = None
+
+        # stop recording the stages if recording was started by this callback
+        if self._stage_timings is not None and self.generator.stage_timings is self._stage_timings:
+            self.generator.stage_timings = None
+        self._stage_timings = None
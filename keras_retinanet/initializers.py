@@ -33,6 +33,9 @@ class PriorProbability(keras.initializers.Initializer):
         }
 
     def __call__(self, shape, dtype=None):
+        # newer keras versions pass a tf.DType, which numpy doesn't understand
+        dtype = getattr(dtype, 'as_numpy_dtype', dtype)
+
         # set bias to -log((1 - p)/p) for foreground
         result = np.ones(shape, dtype=dtype) * -math.log((1 - self.probability) / self.probability)
 
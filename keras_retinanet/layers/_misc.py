@@ -61,8 +61,16 @@ class Anchors(keras.layers.Layer):
         features = inputs
         features_shape = keras.backend.shape(features)
 
-        # generate proposals from bbox deltas and shifted anchors
         if keras.backend.image_data_format() == 'channels_first':
+            static_shape = keras.backend.int_shape(features)[2:4]
+        else:
+            static_shape = keras.backend.int_shape(features)[1:3]
+
+        # generate proposals from bbox deltas and shifted anchors
+        if None not in static_shape:
+            # the shape of the features is known, so the anchors are a constant
+            anchors = keras.backend.constant(utils_anchors.shift(static_shape, self.stride, keras.backend.get_value(self.anchors)))
+        elif keras.backend.image_data_format() == 'channels_first':
             anchors = backend.shift(features_shape[2:4], self.stride, self.anchors)
         else:
             anchors = backend.shift(features_shape[1:3], self.stride, self.anchors)
@@ -95,6 +103,10 @@ class Anchors(keras.layers.Layer):
 
 class UpsampleLike(keras.layers.Layer):
     """ Keras layer for upsampling a Tensor to be the same shape as another Tensor.
+
+    If the spatial shapes of both Tensors are static and the target is an integer multiple of the source,
+    the source is upsampled by repeating its pixels instead of resizing it. Otherwise it is resized with gathers
+    instead of the resize op, whose gradient is not supported by XLA on CPUs.
     """
 
     def call(self, inputs, **kwargs):
@@ -102,11 +114,20 @@ class UpsampleLike(keras.layers.Layer):
         target_shape = keras.backend.shape(target)
         if keras.backend.image_data_format() == 'channels_first':
             source = backend.transpose(source, (0, 2, 3, 1))
-            output = backend.resize_images(source, (target_shape[2], target_shape[3]), method='nearest')
+            output = self._upsample(source, keras.backend.int_shape(target)[2:4], (target_shape[2], target_shape[3]))
             output = backend.transpose(output, (0, 3, 1, 2))
             return output
         else:
-            return backend.resize_images(source, (target_shape[1], target_shape[2]), method='nearest')
+            return self._upsample(source, keras.backend.int_shape(target)[1:3], (target_shape[1], target_shape[2]))
+
+    def _upsample(self, source, static_size, dynamic_size):
+        source_size = keras.backend.int_shape(source)[1:3]
+        if None in source_size or None in static_size:
+            return backend.resize_nearest(source, dynamic_size)
+
+        if all(t % s == 0 for s, t in zip(source_size, static_size)) and keras.backend.int_shape(source)[3] is not None:
+            return backend.upsample_nearest(source, (static_size[0] // source_size[0], static_size[1] // source_size[1]))
+        return backend.resize_nearest(source, static_size)
 
     def compute_output_shape(self, input_shape):
         if keras.backend.image_data_format() == 'channels_first':
@@ -183,3 +204,69 @@ class ClipBoxes(keras.layers.Layer):
 
     def compute_output_shape(self, input_shape):
         return input_shape[1]
+
+
+class TopKPerLevel(keras.layers.Layer):
+    """ Keras layer that keeps the k highest scoring anchors of every pyramid level.
+
+    Selecting candidates before decoding the boxes and performing NMS means that only a fraction of the anchors
+    has to be processed by RegressBoxes, ClipBoxes and FilterDetections.
+    """
+
+    def __init__(self, k=1000, num_levels=5, *args, **kwargs):
+        """ Initializer for a TopKPerLevel layer.
+
+        Args
+            k          : Number of anchors to keep per pyramid level (all anchors are kept for levels with fewer anchors).
+            num_levels : Number of pyramid levels.
+        """
+        self.k          = k
+        self.num_levels = num_levels
+        super(TopKPerLevel, self).__init__(*args, **kwargs)
+
+    def call(self, inputs, **kwargs):
+        """ Select the top k anchors per level.
+
+        Args
+            inputs : List of [anchors[0], ..., anchors[num_levels - 1], regression, classification, other[0], other[1], ...],
+                     where anchors[i] are the anchors of pyramid level i and the other tensors contain the values of all levels.
+
+        Returns
+            List of [anchors, regression, classification, other[0], other[1], ...] for the selected anchors.
+        """
+        level_anchors = inputs[:self.num_levels]
+        values        = inputs[self.num_levels:]
+
+        # split the values of all levels into the values per level
+        level_sizes  = [keras.backend.shape(anchors)[1] for anchors in level_anchors]
+        level_values = [backend.split(v, level_sizes, axis=1) for v in values]
+
+        outputs = [[] for _ in range(len(values) + 1)]
+        for level, anchors in enumerate(level_anchors):
+            regression, classification = level_values[0][level], level_values[1][level]
+
+            # select the anchors based on the score of their best class
+            scores     = keras.backend.max(classification, axis=2)
+            _, indices = backend.top_k(scores, k=keras.backend.minimum(self.k, level_sizes[level]))
+            indices    = keras.backend.expand_dims(indices, axis=2)
+
+            outputs[0].append(backend.gather_nd(anchors, indices, batch_dims=1))
+            for i, v in enumerate(level_values):
+                outputs[i + 1].append(backend.gather_nd(v[level], indices, batch_dims=1))
+
+        return [keras.backend.concatenate(o, axis=1) for o in outputs]
+
+    def compute_output_shape(self, input_shape):
+        return [(shape[0], None) + tuple(shape[2:]) for shape in input_shape[:1] + input_shape[self.num_levels:]]
+
+    def compute_mask(self, inputs, mask=None):
+        return (len(inputs) - self.num_levels + 1) * [None]
+
+    def get_config(self):
+        config = super(TopKPerLevel, self).get_config()
+        config.update({
+            'k'          : self.k,
+            'num_levels' : self.num_levels,
+        })
+
+        return config
@@ -16,6 +16,41 @@ limitations under the License.
 
 import keras
 from .. import backend
+from ..utils.nms import soft_nms, weighted_boxes_fusion
+
+"""
+The supported NMS methods in FilterDetections.
+"""
+NMS_METHODS = ['standard', 'combined', 'soft_linear', 'soft_gaussian', 'wbf']
+
+
+def _numpy_filter(boxes, scores, nms_method, score_threshold, max_detections, nms_threshold, soft_nms_sigma):
+    """ Filter the boxes of a single class with one of the NumPy post-processors in utils.nms.
+
+    Returns
+        The indices of the selected boxes and their (rescored) scores and (fused) boxes.
+    """
+    def _filter(boxes, scores):
+        if nms_method == 'wbf':
+            return weighted_boxes_fusion(boxes, scores, iou_threshold=nms_threshold, score_threshold=score_threshold, max_detections=max_detections)
+
+        indices, new_scores = soft_nms(
+            boxes,
+            scores,
+            method          = 'linear',
+            iou_threshold   = nms_threshold,
+            sigma           = soft_nms_sigma,
+            score_threshold = score_threshold,
+            max_detections  = max_detections,
+        )
+        return indices, new_scores, boxes[indices]
+
+    indices, scores, boxes = backend.numpy_function(_filter, [boxes, scores], ['int32', scores.dtype, boxes.dtype])
+    indices.set_shape([None])
+    scores.set_shape([None])
+    boxes.set_shape([None, 4])
+
+    return indices, scores, boxes
 
 
 def filter_detections(
@@ -26,7 +61,9 @@ def filter_detections(
     nms                   = True,
     score_threshold       = 0.05,
     max_detections        = 300,
-    nms_threshold         = 0.5
+    nms_threshold         = 0.5,
+    nms_method            = 'standard',
+    soft_nms_sigma        = 0.5
 ):
     """ Filter detections using the boxes and classification values.
 
@@ -38,7 +75,9 @@ def filter_detections(
         nms                   : Flag to enable/disable non maximum suppression.
         score_threshold       : Threshold used to prefilter the boxes with.
         max_detections        : Maximum number of detections to keep.
-        nms_threshold         : Threshold for the IoU value to determine when a box should be suppressed.
+        nms_threshold         : Threshold for the IoU value to determine when a box should be suppressed (or fused, for 'wbf').
+        nms_method            : One of 'standard', 'soft_linear', 'soft_gaussian' or 'wbf' (see FilterDetections).
+        soft_nms_sigma        : Sigma for 'soft_gaussian', overlapping scores are multiplied by exp(-0.5 * IoU ** 2 / sigma).
 
     Returns
         A list of [boxes, scores, labels, other[0], other[1], ...].
@@ -50,14 +89,31 @@ def filter_detections(
     """
     def _filter_detections(scores, labels):
         # threshold based on score
-        indices = backend.where(keras.backend.greater(scores, score_threshold))
+        indices         = backend.where(keras.backend.greater(scores, score_threshold))
+        filtered_boxes  = backend.gather_nd(boxes, indices)
+        filtered_scores = keras.backend.gather(scores, indices)[:, 0]
 
         if nms:
-            filtered_boxes  = backend.gather_nd(boxes, indices)
-            filtered_scores = keras.backend.gather(scores, indices)[:, 0]
-
             # perform NMS
-            nms_indices = backend.non_max_suppression(filtered_boxes, filtered_scores, max_output_size=max_detections, iou_threshold=nms_threshold)
+            if nms_method == 'soft_gaussian':
+                # boxes are only suppressed by their decayed scores, not by an IoU threshold
+                nms_indices, filtered_scores = backend.non_max_suppression_with_scores(
+                    filtered_boxes,
+                    filtered_scores,
+                    max_output_size = max_detections,
+                    iou_threshold   = 1.0,
+                    score_threshold = score_threshold,
+                    soft_nms_sigma  = soft_nms_sigma,
+                )
+                filtered_boxes = keras.backend.gather(filtered_boxes, nms_indices)
+            elif nms_method in ('soft_linear', 'wbf'):
+                nms_indices, filtered_scores, filtered_boxes = _numpy_filter(
+                    filtered_boxes, filtered_scores, nms_method, score_threshold, max_detections, nms_threshold, soft_nms_sigma
+                )
+            else:
+                nms_indices     = backend.non_max_suppression(filtered_boxes, filtered_scores, max_output_size=max_detections, iou_threshold=nms_threshold)
+                filtered_boxes  = keras.backend.gather(filtered_boxes, nms_indices)
+                filtered_scores = keras.backend.gather(filtered_scores, nms_indices)
 
             # filter indices based on NMS
             indices = keras.backend.gather(indices, nms_indices)
@@ -66,31 +122,37 @@ def filter_detections(
         labels = backend.gather_nd(labels, indices)
         indices = keras.backend.stack([indices[:, 0], labels], axis=1)
 
-        return indices
+        return indices, filtered_scores, filtered_boxes
 
     if class_specific_filter:
         all_indices = []
+        all_scores  = []
+        all_boxes   = []
         # perform per class filtering
         for c in range(int(classification.shape[1])):
             scores = classification[:, c]
             labels = c * backend.ones((keras.backend.shape(scores)[0],), dtype='int64')
-            all_indices.append(_filter_detections(scores, labels))
+            indices, scores, filtered_boxes = _filter_detections(scores, labels)
+            all_indices.append(indices)
+            all_scores.append(scores)
+            all_boxes.append(filtered_boxes)
 
         # concatenate indices to single tensor
-        indices = keras.backend.concatenate(all_indices, axis=0)
+        indices        = keras.backend.concatenate(all_indices, axis=0)
+        scores         = keras.backend.concatenate(all_scores, axis=0)
+        filtered_boxes = keras.backend.concatenate(all_boxes, axis=0)
     else:
         scores  = keras.backend.max(classification, axis    = 1)
         labels  = keras.backend.argmax(classification, axis = 1)
-        indices = _filter_detections(scores, labels)
+        indices, scores, filtered_boxes = _filter_detections(scores, labels)
 
-    # select top k
-    scores              = backend.gather_nd(classification, indices)
+    # select top k, the scores and boxes may have been changed by soft NMS or WBF
     labels              = indices[:, 1]
     scores, top_indices = backend.top_k(scores, k=keras.backend.minimum(max_detections, keras.backend.shape(scores)[0]))
 
     # filter input using the final set of indices
     indices             = keras.backend.gather(indices[:, 0], top_indices)
-    boxes               = keras.backend.gather(boxes, indices)
+    boxes               = keras.backend.gather(filtered_boxes, top_indices)
     labels              = keras.backend.gather(labels, top_indices)
     other_              = [keras.backend.gather(o, indices) for o in other]
 
@@ -112,6 +174,98 @@ def filter_detections(
     return [boxes, scores, labels] + other_
 
 
+def _selected_indices(boxes, classification, nms_boxes, nms_scores, nms_labels):
+    """ Find the indices of the boxes selected by combined_non_max_suppression, which only returns their coordinates.
+
+    A selected box is matched with the (first) box that has the same coordinates and the same score for the selected label.
+    """
+    batch_size     = keras.backend.shape(nms_boxes)[0]
+    max_detections = keras.backend.shape(nms_boxes)[1]
+    num_boxes      = keras.backend.shape(boxes)[1]
+    boxes          = keras.backend.cast(boxes, 'float32')
+
+    # candidates have the same x1, which are few, so the remaining checks are done on the candidates only
+    candidates = backend.where(keras.backend.equal(nms_boxes[:, :, None, 0], boxes[:, None, :, 0]))
+    candidates = keras.backend.cast(candidates, 'int32')
+    batch, detection, index = candidates[:, 0], candidates[:, 1], candidates[:, 2]
+
+    detection_indices = keras.backend.stack([batch, detection], axis=1)
+    labels            = backend.gather_nd(nms_labels, detection_indices)
+    same_box          = keras.backend.all(keras.backend.equal(
+        backend.gather_nd(nms_boxes, detection_indices),
+        backend.gather_nd(boxes, keras.backend.stack([batch, index], axis=1))
+    ), axis=1)
+    same_score        = keras.backend.equal(
+        backend.gather_nd(nms_scores, detection_indices),
+        keras.backend.cast(backend.gather_nd(classification, keras.backend.stack([batch, index, labels], axis=1)), 'float32')
+    )
+
+    # take the lowest matching index for every detection, detections without a match (padding) get index 0
+    index   = backend.where(same_box & same_score, index, num_boxes * keras.backend.ones_like(index))
+    indices = backend.unsorted_segment_min(index, batch * max_detections + detection, batch_size * max_detections)
+    indices = backend.where(keras.backend.less(indices, num_boxes), indices, keras.backend.zeros_like(indices))
+
+    return keras.backend.reshape(indices, [batch_size, max_detections])
+
+
+def combined_filter_detections(
+    boxes,
+    classification,
+    other           = [],
+    score_threshold = 0.05,
+    max_detections  = 300,
+    nms_threshold   = 0.5
+):
+    """ Filter detections of a whole batch with class specific NMS in a single combined_non_max_suppression op.
+
+    This gives the same result as filter_detections with class_specific_filter=True and nms=True on every batch item,
+    except that boxes with a score equal to score_threshold are kept. Since combined_non_max_suppression doesn't return
+    the indices of the selected boxes, other is filtered by looking up the boxes by their coordinates and score.
+
+    Args
+        boxes           : Tensor of shape (batch_size, num_boxes, 4) containing the boxes in (x1, y1, x2, y2) format.
+        classification  : Tensor of shape (batch_size, num_boxes, num_classes) containing the classification scores.
+        other           : List of tensors of shape (batch_size, num_boxes, ...) to filter along with the boxes and classification scores.
+        score_threshold : Threshold used to prefilter the boxes with.
+        max_detections  : Maximum number of detections to keep.
+        nms_threshold   : Threshold for the IoU value to determine when a box should be suppressed.
+
+    Returns
+        A list of [boxes, scores, labels, other[0], other[1], ...], shaped like the outputs of FilterDetections.
+    """
+    nms_boxes, nms_scores, nms_labels, num_valid = backend.combined_non_max_suppression(
+        keras.backend.expand_dims(keras.backend.cast(boxes, 'float32'), axis=2),
+        keras.backend.cast(classification, 'float32'),
+        max_output_size_per_class = max_detections,
+        max_total_size            = max_detections,
+        iou_threshold             = nms_threshold,
+        score_threshold           = score_threshold,
+        clip_boxes                = False,
+    )
+    nms_labels = keras.backend.cast(nms_labels, 'int32')
+
+    if other:
+        indices = _selected_indices(boxes, classification, nms_boxes, nms_scores, nms_labels)
+
+    # combined_non_max_suppression pads with zeros, pad with -1's instead
+    valid = keras.backend.less(backend.range(max_detections)[None, :], keras.backend.cast(num_valid, 'int32')[:, None])
+
+    def _pad(x):
+        mask = keras.backend.reshape(valid, [-1, max_detections] + [1] * (len(x.shape) - 2))
+        return backend.where(mask, x, -keras.backend.ones_like(x))
+
+    outputs = [
+        _pad(keras.backend.cast(nms_boxes, keras.backend.floatx())),
+        _pad(keras.backend.cast(nms_scores, keras.backend.floatx())),
+        _pad(nms_labels),
+    ]
+
+    if other:
+        outputs += [_pad(backend.gather_nd(o, keras.backend.expand_dims(indices, axis=2), batch_dims=1)) for o in other]
+
+    return outputs
+
+
 class FilterDetections(keras.layers.Layer):
     """ Keras layer for filtering detections using score threshold and NMS.
     """
@@ -124,6 +278,8 @@ class FilterDetections(keras.layers.Layer):
         score_threshold       = 0.05,
         max_detections        = 300,
         parallel_iterations   = 32,
+        nms_method            = 'standard',
+        soft_nms_sigma        = 0.5,
         **kwargs
     ):
         """ Filters detections using score threshold, NMS and selecting the top-k detections.
@@ -135,13 +291,27 @@ class FilterDetections(keras.layers.Layer):
             score_threshold       : Threshold used to prefilter the boxes with.
             max_detections        : Maximum number of detections to keep.
             parallel_iterations   : Number of batch items to process in parallel.
+            nms_method            : How to perform NMS, one of
+                                    'standard' (NMS per class, per batch item),
+                                    'combined' (a single combined_non_max_suppression op for all classes and batch items,
+                                    only with class_specific_filter=True, otherwise 'standard' is used),
+                                    'soft_linear' (Soft-NMS, scores of boxes overlapping more than nms_threshold are multiplied by 1 - IoU),
+                                    'soft_gaussian' (Soft-NMS, scores of overlapping boxes are multiplied by exp(-0.5 * IoU ** 2 / soft_nms_sigma)) or
+                                    'wbf' (weighted boxes fusion, boxes overlapping more than nms_threshold are averaged weighted by their scores).
+                                    'soft_linear' and 'wbf' run in NumPy (see utils.nms), so models using them can't be exported to graph only formats.
+            soft_nms_sigma        : Sigma for 'soft_gaussian'.
         """
+        if nms_method not in NMS_METHODS:
+            raise ValueError('Invalid nms_method {}, expected one of {}.'.format(nms_method, NMS_METHODS))
+
         self.nms                   = nms
         self.class_specific_filter = class_specific_filter
         self.nms_threshold         = nms_threshold
         self.score_threshold       = score_threshold
         self.max_detections        = max_detections
         self.parallel_iterations   = parallel_iterations
+        self.nms_method            = nms_method
+        self.soft_nms_sigma        = soft_nms_sigma
         super(FilterDetections, self).__init__(**kwargs)
 
     def call(self, inputs, **kwargs):
@@ -154,6 +324,16 @@ class FilterDetections(keras.layers.Layer):
         classification = inputs[1]
         other          = inputs[2:]
 
+        if self.nms_method == 'combined' and self.nms and self.class_specific_filter:
+            return combined_filter_detections(
+                boxes,
+                classification,
+                other,
+                score_threshold = self.score_threshold,
+                max_detections  = self.max_detections,
+                nms_threshold   = self.nms_threshold,
+            )
+
         # wrap nms with our parameters
         def _filter_detections(args):
             boxes          = args[0]
@@ -169,6 +349,8 @@ class FilterDetections(keras.layers.Layer):
                 score_threshold       = self.score_threshold,
                 max_detections        = self.max_detections,
                 nms_threshold         = self.nms_threshold,
+                nms_method            = self.nms_method,
+                soft_nms_sigma        = self.soft_nms_sigma,
             )
 
         # call filter_detections on each batch
@@ -218,6 +400,8 @@ class FilterDetections(keras.layers.Layer):
             'score_threshold'       : self.score_threshold,
             'max_detections'        : self.max_detections,
             'parallel_iterations'   : self.parallel_iterations,
+            'nms_method'            : self.nms_method,
+            'soft_nms_sigma'        : self.soft_nms_sigma,
         })
 
         return config
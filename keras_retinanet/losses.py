@@ -40,6 +40,10 @@ def focal(alpha=0.25, gamma=2.0):
         Returns
             The focal loss of y_pred w.r.t. y_true.
         """
+        # compute the loss in float32, also when the model uses a mixed precision policy
+        y_true = keras.backend.cast(y_true, 'float32')
+        y_pred = keras.backend.cast(y_pred, 'float32')
+
         labels         = y_true[:, :, :-1]
         anchor_state   = y_true[:, :, -1]  # -1 for ignore, 0 for background, 1 for object
         classification = y_pred
@@ -59,8 +63,8 @@ def focal(alpha=0.25, gamma=2.0):
 
         # compute the normalizer: the number of positive anchors
         normalizer = backend.where(keras.backend.equal(anchor_state, 1))
-        normalizer = keras.backend.cast(keras.backend.shape(normalizer)[0], keras.backend.floatx())
-        normalizer = keras.backend.maximum(keras.backend.cast_to_floatx(1.0), normalizer)
+        normalizer = keras.backend.cast(keras.backend.shape(normalizer)[0], 'float32')
+        normalizer = keras.backend.maximum(1.0, normalizer)
 
         return keras.backend.sum(cls_loss) / normalizer
 
@@ -88,6 +92,10 @@ def smooth_l1(sigma=3.0):
         Returns
             The smooth L1 loss of y_pred w.r.t. y_true.
         """
+        # compute the loss in float32, also when the model uses a mixed precision policy
+        y_true = keras.backend.cast(y_true, 'float32')
+        y_pred = keras.backend.cast(y_pred, 'float32')
+
         # separate target and state
         regression        = y_pred
         regression_target = y_true[:, :, :-1]
@@ -111,7 +119,7 @@ def smooth_l1(sigma=3.0):
 
         # compute the normalizer: the number of positive anchors
         normalizer = keras.backend.maximum(1, keras.backend.shape(indices)[0])
-        normalizer = keras.backend.cast(normalizer, dtype=keras.backend.floatx())
+        normalizer = keras.backend.cast(normalizer, dtype='float32')
         return keras.backend.sum(regression_loss) / normalizer
 
     return _smooth_l1
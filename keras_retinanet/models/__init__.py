@@ -1,5 +1,6 @@
 from __future__ import print_function
 import sys
+import warnings
 
 
 class Backbone(object):
@@ -17,6 +18,7 @@ class Backbone(object):
             'FilterDetections' : layers.FilterDetections,
             'Anchors'          : layers.Anchors,
             'ClipBoxes'        : layers.ClipBoxes,
+            'TopKPerLevel'     : layers.TopKPerLevel,
             '_smooth_l1'       : losses.smooth_l1(),
             '_focal'           : losses.focal(),
         }
@@ -67,7 +69,11 @@ def backbone(backbone_name):
     return b(backbone_name)
 
 
-def load_model(filepath, backbone_name='resnet50'):
+# in-process cache of loaded models, see load_model
+_model_cache = {}
+
+
+def load_model(filepath, backbone_name='resnet50', rebuild=False, mmap=False, cache=False):
     """ Loads a retinanet model using the correct custom objects.
 
     Args
@@ -75,6 +81,12 @@ def load_model(filepath, backbone_name='resnet50'):
             - string, path to the saved model, or
             - h5py.File object from which to load the model
         backbone_name         : Backbone with which the model was trained.
+        rebuild               : Rebuild the architecture from the backbone and load only the weights (see utils.model.rebuild_model),
+                                which is faster than deserializing the saved model. If the architecture can't be rebuilt,
+                                the full model is loaded instead.
+        mmap                  : When rebuilding, read the weights through a memory map of the file.
+        cache                 : Return the model loaded before from a file with the same contents, if any.
+                                The cached model is shared, so it shouldn't be modified.
 
     Returns
         A keras.models.Model object.
@@ -84,10 +96,32 @@ def load_model(filepath, backbone_name='resnet50'):
         ValueError: In case of an invalid savefile.
     """
     import keras.models
-    return keras.models.load_model(filepath, custom_objects=backbone(backbone_name).custom_objects)
+    from ..utils.model import file_hash, rebuild_model
+
+    key = None
+    if cache and isinstance(filepath, str):
+        key = (file_hash(filepath), backbone_name, rebuild)
+        if key in _model_cache:
+            return _model_cache[key]
+
+    model = None
+    if rebuild and isinstance(filepath, str):
+        try:
+            model = rebuild_model(filepath, backbone_name=backbone_name, mmap=mmap)
+        except Exception as e:
+            # rebuilding is only an optimization, any model that keras can load should still load
+            warnings.warn('Could not rebuild the model from {} ({}), loading the full model instead.'.format(filepath, e))
+
+    if model is None:
+        model = keras.models.load_model(filepath, custom_objects=backbone(backbone_name).custom_objects)
+
+    if key is not None:
+        _model_cache[key] = model
+
+    return model
 
 
-def convert_model(model, nms=True, class_specific_filter=True, anchor_params=None):
+def convert_model(model, nms=True, class_specific_filter=True, anchor_params=None, nms_method='standard', pre_nms_top_k=None, soft_nms_sigma=0.5, image_shape=None):
     """ Converts a training model to an inference model.
 
     Args
@@ -95,6 +129,10 @@ def convert_model(model, nms=True, class_specific_filter=True, anchor_params=Non
         nms                   : Boolean, whether to add NMS filtering to the converted model.
         class_specific_filter : Whether to use class specific filtering or filter for the best scoring class only.
         anchor_params         : Anchor parameters object. If omitted, default values are used.
+        nms_method            : How to perform NMS, one of 'standard', 'combined', 'soft_linear', 'soft_gaussian' or 'wbf' (see FilterDetections).
+        pre_nms_top_k         : If not None, only the pre_nms_top_k highest scoring anchors of every pyramid level are decoded and filtered.
+        soft_nms_sigma        : Sigma for nms_method='soft_gaussian'.
+        image_shape           : If not None, (height, width) of the images to build a static shape model for (see retinanet_bbox).
 
     Returns
         A keras.models.Model object.
@@ -104,7 +142,7 @@ def convert_model(model, nms=True, class_specific_filter=True, anchor_params=Non
         ValueError: In case of an invalid savefile.
     """
     from .retinanet import retinanet_bbox
-    return retinanet_bbox(model=model, nms=nms, class_specific_filter=class_specific_filter, anchor_params=anchor_params)
+    return retinanet_bbox(model=model, nms=nms, class_specific_filter=class_specific_filter, anchor_params=anchor_params, nms_method=nms_method, pre_nms_top_k=pre_nms_top_k, soft_nms_sigma=soft_nms_sigma, image_shape=image_shape)
 
 
 def assert_training_model(model):
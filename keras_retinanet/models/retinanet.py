@@ -17,7 +17,7 @@ limitations under the License.
 import keras
 from .. import initializers
 from .. import layers
-from ..utils.anchors import AnchorParameters
+from ..utils.anchors import AnchorParameters, DEFAULT_PYRAMID_LEVELS, anchor_parameters_for_levels
 from . import assert_training_model
 
 
@@ -74,7 +74,7 @@ def default_classification_model(
     if keras.backend.image_data_format() == 'channels_first':
         outputs = keras.layers.Permute((2, 3, 1), name='pyramid_classification_permute')(outputs)
     outputs = keras.layers.Reshape((-1, num_classes), name='pyramid_classification_reshape')(outputs)
-    outputs = keras.layers.Activation('sigmoid', name='pyramid_classification_sigmoid')(outputs)
+    outputs = keras.layers.Activation('sigmoid', dtype='float32', name='pyramid_classification_sigmoid')(outputs)
 
     return keras.models.Model(inputs=inputs, outputs=outputs, name=name)
 
@@ -124,18 +124,27 @@ def default_regression_model(num_values, num_anchors, pyramid_feature_size=256,
     return keras.models.Model(inputs=inputs, outputs=outputs, name=name)
 
 
-def __create_pyramid_features(C3, C4, C5, feature_size=256):
+def __create_pyramid_features(C3, C4, C5, feature_size=256, pyramid_levels=None):
     """ Creates the FPN layers on top of the backbone features.
 
     Args
-        C3           : Feature stage C3 from the backbone.
-        C4           : Feature stage C4 from the backbone.
-        C5           : Feature stage C5 from the backbone.
-        feature_size : The feature size to use for the resulting feature levels.
+        C3             : Feature stage C3 from the backbone.
+        C4             : Feature stage C4 from the backbone.
+        C5             : Feature stage C5 from the backbone.
+        feature_size   : The feature size to use for the resulting feature levels.
+        pyramid_levels : List of pyramid levels to return, a subset of [3, 4, 5, 6, 7] (defaults to all of them).
 
     Returns
-        A list of feature levels [P3, P4, P5, P6, P7].
+        A list of feature levels, for example [P3, P4, P5, P6, P7].
     """
+    if pyramid_levels is None:
+        pyramid_levels = DEFAULT_PYRAMID_LEVELS
+
+    if not set(pyramid_levels) <= set(DEFAULT_PYRAMID_LEVELS):
+        raise ValueError('Invalid pyramid levels {}, expected a subset of {}.'.format(pyramid_levels, DEFAULT_PYRAMID_LEVELS))
+    if 7 in pyramid_levels and 6 not in pyramid_levels:
+        raise ValueError('Pyramid level 7 is computed from level 6, so level 6 should be used as well.')
+
     # upsample C5 to get P5 from the FPN paper
     P5           = keras.layers.Conv2D(feature_size, kernel_size=1, strides=1, padding='same', name='C5_reduced')(C5)
     P5_upsampled = layers.UpsampleLike(name='P5_upsampled')([P5, C4])
@@ -159,7 +168,9 @@ def __create_pyramid_features(C3, C4, C5, feature_size=256):
     P7 = keras.layers.Activation('relu', name='C6_relu')(P6)
     P7 = keras.layers.Conv2D(feature_size, kernel_size=3, strides=2, padding='same', name='P7')(P7)
 
-    return [P3, P4, P5, P6, P7]
+    # layers of levels that are not returned are not part of the model, so they cost nothing
+    features = {3: P3, 4: P4, 5: P5, 6: P6, 7: P7}
+    return [features[level] for level in pyramid_levels]
 
 
 def default_submodels(num_classes, num_anchors):
@@ -191,7 +202,8 @@ def __build_model_pyramid(name, model, features):
     Returns
         A tensor containing the response from the submodel on the FPN features.
     """
-    return keras.layers.Concatenate(axis=1, name=name)([model(f) for f in features])
+    # the outputs are float32 also when the submodels use a mixed precision policy, so the losses are computed in float32
+    return keras.layers.Concatenate(axis=1, dtype='float32', name=name)([model(f) for f in features])
 
 
 def __build_pyramid(models, features):
@@ -207,12 +219,13 @@ def __build_pyramid(models, features):
     return [__build_model_pyramid(n, m, features) for n, m in models]
 
 
-def __build_anchors(anchor_parameters, features):
+def __build_anchors(anchor_parameters, features, concatenate=True):
     """ Builds anchors for the shape of the features from FPN.
 
     Args
         anchor_parameters : Parameteres that determine how anchors are generated.
         features          : The FPN features.
+        concatenate       : If False, return a list with the anchors of every feature level instead.
 
     Returns
         A tensor containing the anchors for the FPN features.
@@ -228,11 +241,15 @@ def __build_anchors(anchor_parameters, features):
             stride=anchor_parameters.strides[i],
             ratios=anchor_parameters.ratios,
             scales=anchor_parameters.scales,
+            dtype='float32',
             name='anchors_{}'.format(i)
         )(f) for i, f in enumerate(features)
     ]
 
-    return keras.layers.Concatenate(axis=1, name='anchors')(anchors)
+    if not concatenate:
+        return anchors
+
+    return keras.layers.Concatenate(axis=1, dtype='float32', name='anchors')(anchors)
 
 
 def retinanet(
@@ -242,6 +259,7 @@ def retinanet(
     num_anchors             = None,
     create_pyramid_features = __create_pyramid_features,
     submodels               = None,
+    pyramid_levels          = None,
     name                    = 'retinanet'
 ):
     """ Construct a RetinaNet model on top of a backbone.
@@ -254,6 +272,7 @@ def retinanet(
         num_anchors             : Number of base anchors.
         create_pyramid_features : Functor for creating pyramid features given the features C3, C4, C5 from the backbone.
         submodels               : Submodels to run on each feature map (default is regression and classification submodels).
+        pyramid_levels          : List of pyramid levels to run the submodels on (defaults to [3, 4, 5, 6, 7]).
         name                    : Name of the model.
 
     Returns
@@ -276,7 +295,10 @@ def retinanet(
     C3, C4, C5 = backbone_layers
 
     # compute pyramid features as per https://arxiv.org/abs/1708.02002
-    features = create_pyramid_features(C3, C4, C5)
+    if pyramid_levels is None:
+        features = create_pyramid_features(C3, C4, C5)
+    else:
+        features = create_pyramid_features(C3, C4, C5, pyramid_levels=pyramid_levels)
 
     # for all pyramid levels, run available submodels
     pyramids = __build_pyramid(submodels, features)
@@ -290,6 +312,11 @@ def retinanet_bbox(
     class_specific_filter = True,
     name                  = 'retinanet-bbox',
     anchor_params         = None,
+    pyramid_levels        = None,
+    nms_method            = 'standard',
+    pre_nms_top_k         = None,
+    soft_nms_sigma        = 0.5,
+    image_shape           = None,
     **kwargs
 ):
     """ Construct a RetinaNet model on top of a backbone and adds convenience functions to output boxes directly.
@@ -303,6 +330,12 @@ def retinanet_bbox(
         class_specific_filter : Whether to use class specific filtering or filter for the best scoring class only.
         name                  : Name of the model.
         anchor_params         : Struct containing anchor parameters. If None, default values are used.
+        pyramid_levels        : List of pyramid levels used by the model. If None, the levels are taken from the model (or [3, 4, 5, 6, 7] if model is None).
+        nms_method            : How to perform NMS, see FilterDetections.
+        pre_nms_top_k         : If not None, only the pre_nms_top_k highest scoring anchors of every pyramid level are decoded and filtered.
+        soft_nms_sigma        : Sigma for nms_method='soft_gaussian'.
+        image_shape           : If not None, (height, width) of the images the model is used for. The model then only accepts images
+                                of this shape, but its anchors are constants and the feature upsampling uses fixed factors.
         *kwargs               : Additional kwargs to pass to the minimal retinanet model.
 
     Returns
@@ -316,37 +349,68 @@ def retinanet_bbox(
         ```
     """
 
+    # if no pyramid levels are passed, use the levels that are present in the model
+    if pyramid_levels is None:
+        if model is None:
+            pyramid_levels = DEFAULT_PYRAMID_LEVELS
+        else:
+            layer_names    = set(layer.name for layer in model.layers)
+            pyramid_levels = [level for level in DEFAULT_PYRAMID_LEVELS if 'P{}'.format(level) in layer_names]
+
     # if no anchor parameters are passed, use default values
-    if anchor_params is None:
-        anchor_params = AnchorParameters.default
+    anchor_params = anchor_parameters_for_levels(pyramid_levels, anchor_params)
 
     # create RetinaNet model
     if model is None:
-        model = retinanet(num_anchors=anchor_params.num_anchors(), **kwargs)
+        model = retinanet(num_anchors=anchor_params.num_anchors(), pyramid_levels=pyramid_levels, **kwargs)
     else:
         assert_training_model(model)
 
     # compute the anchors
-    features = [model.get_layer(p_name).output for p_name in ['P3', 'P4', 'P5', 'P6', 'P7']]
-    anchors  = __build_anchors(anchor_params, features)
+    features = [model.get_layer('P{}'.format(level)).output for level in pyramid_levels]
+    outputs  = model.outputs
+    inputs   = model.inputs
+
+    # rebuild the graph on an input with a static shape, the layers of the model (and so the weights) are shared
+    if image_shape is not None:
+        if keras.backend.image_data_format() == 'channels_first':
+            inputs = [keras.layers.Input(shape=(keras.backend.int_shape(inputs[0])[1],) + tuple(image_shape[:2]))]
+        else:
+            inputs = [keras.layers.Input(shape=tuple(image_shape[:2]) + (keras.backend.int_shape(inputs[0])[-1],))]
+        static   = keras.models.Model(inputs=model.inputs, outputs=outputs + features, name=model.name)(inputs)
+        outputs  = static[:len(outputs)]
+        features = static[len(outputs):]
 
     # we expect the anchors, regression and classification values as first output
-    regression     = model.outputs[0]
-    classification = model.outputs[1]
+    regression     = outputs[0]
+    classification = outputs[1]
 
     # "other" can be any additional output from custom submodels, by default this will be []
-    other = model.outputs[2:]
+    other = outputs[2:]
+
+    if pre_nms_top_k:
+        # only keep the highest scoring anchors of every level
+        level_anchors = __build_anchors(anchor_params, features, concatenate=False)
+        selected      = layers.TopKPerLevel(k=pre_nms_top_k, num_levels=len(level_anchors), dtype='float32', name='top_k_per_level')(
+            level_anchors + [regression, classification] + other
+        )
+        anchors, regression, classification, other = selected[0], selected[1], selected[2], selected[3:]
+    else:
+        anchors = __build_anchors(anchor_params, features)
 
-    # apply predicted regression to anchors
-    boxes = layers.RegressBoxes(name='boxes')([anchors, regression])
-    boxes = layers.ClipBoxes(name='clipped_boxes')([model.inputs[0], boxes])
+    # apply predicted regression to anchors, the layers computing the boxes and detections always use float32
+    boxes = layers.RegressBoxes(dtype='float32', name='boxes')([anchors, regression])
+    boxes = layers.ClipBoxes(dtype='float32', name='clipped_boxes')([inputs[0], boxes])
 
     # filter detections (apply NMS / score threshold / select top-k)
     detections = layers.FilterDetections(
         nms                   = nms,
         class_specific_filter = class_specific_filter,
+        nms_method            = nms_method,
+        soft_nms_sigma        = soft_nms_sigma,
+        dtype                 = 'float32',
         name                  = 'filtered_detections'
     )([boxes, classification] + other)
 
     # construct the model
-    return keras.models.Model(inputs=model.inputs, outputs=detections, name=name)
+    return keras.models.Model(inputs=inputs, outputs=detections, name=name)
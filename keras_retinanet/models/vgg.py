@@ -16,6 +16,7 @@ limitations under the License.
 
 
 import keras
+import keras.applications
 from keras.utils import get_file
 
 from . import retinanet
@@ -43,6 +43,9 @@ class CocoGenerator(Generator):
 
         self.load_classes()
 
+        # parse the annotations once, instead of on every access
+        self.image_annotations = [self.parse_annotations(image_index) for image_index in range(len(self.image_ids))]
+
         super(CocoGenerator, self).__init__(**kwargs)
 
     def load_classes(self):
@@ -130,30 +133,34 @@ class CocoGenerator(Generator):
         path  = self.image_path(image_index)
         return read_image_bgr(path)
 
-    def load_annotations(self, image_index):
-        """ Load annotations for an image_index.
+    def parse_annotations(self, image_index):
+        """ Parse the COCO annotations for an image_index into numpy arrays.
         """
         # get ground truth annotations
         annotations_ids = self.coco.getAnnIds(imgIds=self.image_ids[image_index], iscrowd=False)
-        annotations     = {'labels': np.empty((0,)), 'bboxes': np.empty((0, 4))}
 
         # some images appear to miss annotations (like image with id 257034)
         if len(annotations_ids) == 0:
-            return annotations
+            return {'labels': np.empty((0,)), 'bboxes': np.empty((0, 4))}
 
-        # parse annotations
-        coco_annotations = self.coco.loadAnns(annotations_ids)
-        for idx, a in enumerate(coco_annotations):
-            # some annotations have basically no width / height, skip them
-            if a['bbox'][2] < 1 or a['bbox'][3] < 1:
-                continue
+        # some annotations have basically no width / height, skip them
+        coco_annotations = [a for a in self.coco.loadAnns(annotations_ids) if a['bbox'][2] >= 1 and a['bbox'][3] >= 1]
 
-            annotations['labels'] = np.concatenate([annotations['labels'], [self.coco_label_to_label(a['category_id'])]], axis=0)
-            annotations['bboxes'] = np.concatenate([annotations['bboxes'], [[
+        annotations = {'labels': np.empty((len(coco_annotations),)), 'bboxes': np.empty((len(coco_annotations), 4))}
+        for idx, a in enumerate(coco_annotations):
+            annotations['labels'][idx] = self.coco_label_to_label(a['category_id'])
+            annotations['bboxes'][idx] = [
                 a['bbox'][0],
                 a['bbox'][1],
                 a['bbox'][0] + a['bbox'][2],
                 a['bbox'][1] + a['bbox'][3],
-            ]]], axis=0)
+            ]
 
         return annotations
+
+    def load_annotations(self, image_index):
+        """ Load annotations for an image_index.
+        """
+        # return copies, since the annotations are modified in-place during preprocessing
+        annotations = self.image_annotations[image_index]
+        return {key: value.copy() for key, value in annotations.items()}
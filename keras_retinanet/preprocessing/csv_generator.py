@@ -17,9 +17,9 @@ limitations under the License.
 
 from .generator import Generator
 from ..utils.image import read_image_bgr
+from ..utils.image_metadata import ImageMetadataIndex, metadata_path_for
 
 import numpy as np
-from PIL import Image
 from six import raise_from
 
 import csv
@@ -99,6 +99,21 @@ def _read_annotations(csv_reader, classes):
     return result
 
 
+def _annotations_to_arrays(annotations, classes):
+    """ Convert the parsed annotations of a single image to numpy arrays.
+
+    Returns a dictionary with 'labels' (shape (N,)) and 'bboxes' (shape (N, 4)).
+    """
+    labels = np.empty((len(annotations),))
+    bboxes = np.empty((len(annotations), 4))
+
+    for idx, annot in enumerate(annotations):
+        labels[idx] = classes[annot['class']]
+        bboxes[idx] = [annot['x1'], annot['y1'], annot['x2'], annot['y2']]
+
+    return {'labels': labels, 'bboxes': bboxes}
+
+
 def _open_for_csv(path):
     """ Open a file with flags suitable for csv.reader.
 
@@ -158,6 +173,12 @@ class CSVGenerator(Generator):
             raise_from(ValueError('invalid CSV annotations file: {}: {}'.format(csv_data_file, e)), None)
         self.image_names = list(self.image_data.keys())
 
+        # convert the annotations to numpy arrays once, instead of on every access
+        self.image_annotations = [_annotations_to_arrays(self.image_data[name], self.classes) for name in self.image_names]
+
+        # read image sizes once, when they are first needed, and persist them next to the annotations file
+        self.image_metadata = ImageMetadataIndex(metadata_path_for(csv_data_file), paths=[self.image_path(i) for i in range(self.size())])
+
         super(CSVGenerator, self).__init__(**kwargs)
 
     def size(self):
@@ -198,9 +219,7 @@ class CSVGenerator(Generator):
     def image_aspect_ratio(self, image_index):
         """ Compute the aspect ratio for an image with image_index.
         """
-        # PIL is fast for metadata
-        image = Image.open(self.image_path(image_index))
-        return float(image.width) / float(image.height)
+        return self.image_metadata.aspect_ratio(self.image_path(image_index))
 
     def load_image(self, image_index):
         """ Load an image at the image_index.
@@ -210,16 +229,6 @@ class CSVGenerator(Generator):
     def load_annotations(self, image_index):
         """ Load annotations for an image_index.
         """
-        path        = self.image_names[image_index]
-        annotations = {'labels': np.empty((0,)), 'bboxes': np.empty((0, 4))}
-
-        for idx, annot in enumerate(self.image_data[path]):
-            annotations['labels'] = np.concatenate((annotations['labels'], [self.name_to_label(annot['class'])]))
-            annotations['bboxes'] = np.concatenate((annotations['bboxes'], [[
-                float(annot['x1']),
-                float(annot['y1']),
-                float(annot['x2']),
-                float(annot['y2']),
-            ]]))
-
-        return annotations
+        # return copies, since the annotations are modified in-place during preprocessing
+        annotations = self.image_annotations[image_index]
+        return {key: value.copy() for key, value in annotations.items()}
@@ -16,25 +16,39 @@ limitations under the License.
 
 import numpy as np
 import random
+import threading
+import time
 import warnings
 
 import keras
 
 from ..utils.anchors import (
+    AnchorIndex,
     anchor_targets_bbox,
     anchors_for_shape,
     guess_shapes
 )
-from ..utils.config import parse_anchor_parameters
+from ..utils.config import parse_anchor_parameters, parse_pyramid_levels
 from ..utils.image import (
     TransformParameters,
     adjust_transform_for_image,
     apply_transform,
     preprocess_image,
+    read_image_bgr_reduced,
     resize_image,
 )
 from ..utils.transform import transform_aabb
 
+# the random transform and visual effect generators are Python generators, which can't be advanced by several
+# threads at once (ie. threaded enqueuer workers or parallel tf.data calls computing batches of the same Generator)
+# the lock is module level instead of per Generator, because a lock attribute can't be pickled and Generators are
+# pickled when they are sent to multiprocessing workers (ie. with the spawn start method), next() is cheap so sharing
+# the lock between Generators costs nothing noticeable
+_random_generators_lock = threading.Lock()
+
+# The stages of Generator.compute_input_output, in order.
+STAGES = ('load', 'filter', 'visual_effect', 'transform', 'preprocess', 'inputs', 'targets')
+
 
 class Generator(keras.utils.Sequence):
     """ Abstract generator class.
@@ -50,11 +64,15 @@ class Generator(keras.utils.Sequence):
         image_min_side=800,
         image_max_side=1333,
         no_resize=False,
+        reduced_decoding=False,
+        prune_overlaps=False,
         transform_parameters=None,
         compute_anchor_targets=anchor_targets_bbox,
         compute_shapes=guess_shapes,
         preprocess_image=preprocess_image,
-        config=None
+        config=None,
+        num_shards=1,
+        shard_index=0
     ):
         """ Initialize Generator object.
 
@@ -66,11 +84,18 @@ class Generator(keras.utils.Sequence):
             image_min_side         : After resizing the minimum side of an image is equal to image_min_side.
             image_max_side         : If after resizing the maximum side is larger than image_max_side, scales down further so that the max side is equal to image_max_side.
             no_resize              : If True, no image/annotation resizing is performed.
+            reduced_decoding       : If True, images are decoded at a reduced resolution when they will be downscaled anyway (see load_image_reduced).
+            prune_overlaps         : If True, an AnchorIndex is passed to compute_anchor_targets (as anchor_index) so that only the overlaps of anchors near each annotation are computed.
             transform_parameters   : The transform parameters used for data augmentation.
             compute_anchor_targets : Function handler for computing the targets of anchors for an image and its annotations.
             compute_shapes         : Function handler for computing the shapes of the pyramid for a given input.
             preprocess_image       : Function handler for preprocessing an image (scaling / normalizing) for passing through a network.
+            num_shards             : Split the images into this many disjoint shards, for example one per training worker.
+            shard_index            : Index of the shard of images this generator groups into batches.
         """
+        if not 0 <= shard_index < num_shards:
+            raise ValueError('Invalid shard index {} for {} shards.'.format(shard_index, num_shards))
+
         self.transform_generator    = transform_generator
         self.visual_effect_generator = visual_effect_generator
         self.batch_size             = int(batch_size)
@@ -79,11 +104,22 @@ class Generator(keras.utils.Sequence):
         self.image_min_side         = image_min_side
         self.image_max_side         = image_max_side
         self.no_resize              = no_resize
+        self.reduced_decoding       = reduced_decoding
+        self.prune_overlaps         = prune_overlaps
         self.transform_parameters   = transform_parameters or TransformParameters()
         self.compute_anchor_targets = compute_anchor_targets
         self.compute_shapes         = compute_shapes
         self.preprocess_image       = preprocess_image
         self.config                 = config
+        self.num_shards             = int(num_shards)
+        self.shard_index            = int(shard_index)
+
+        # anchors (and their index) per image shape, these are the same for every batch with that shape
+        self._anchors_cache         = {}
+
+        # if not None, compute_input_output appends the time in seconds spent in every stage (see STAGES) to this
+        # container (for example a collections.deque), only batches computed in this process are recorded
+        self.stage_timings          = None
 
         # Define groups
         self.group_images()
@@ -141,6 +177,14 @@ class Generator(keras.utils.Sequence):
         """
         raise NotImplementedError('load_image method not implemented')
 
+    def load_image_reduced(self, image_index):
+        """ Load an image at the image_index, decoded at a reduced resolution if it will be downscaled anyway.
+
+        Returns
+            The image and a tuple (scale_x, scale_y) with the ratio between the loaded and the original image size.
+        """
+        return read_image_bgr_reduced(self.image_path(image_index), min_side=self.image_min_side, max_side=self.image_max_side)
+
     def load_annotations(self, image_index):
         """ Load annotations for an image_index.
         """
@@ -189,10 +233,23 @@ class Generator(keras.utils.Sequence):
         """
         return [self.load_image(image_index) for image_index in group]
 
+    def load_reduced_image_group(self, group, annotations_group):
+        """ Load images for all images in a group at a reduced resolution and scale their annotations accordingly.
+        """
+        image_group = []
+        for image_index, annotations in zip(group, annotations_group):
+            image, (scale_x, scale_y) = self.load_image_reduced(image_index)
+            if scale_x != 1 or scale_y != 1:
+                annotations['bboxes'] = annotations['bboxes'] * [scale_x, scale_y, scale_x, scale_y]
+            image_group.append(image)
+
+        return image_group, annotations_group
+
     def random_visual_effect_group_entry(self, image, annotations):
         """ Randomly transforms image and annotation.
         """
-        visual_effect = next(self.visual_effect_generator)
+        with _random_generators_lock:
+            visual_effect = next(self.visual_effect_generator)
         # apply visual effect
         image = visual_effect(image)
         return image, annotations
@@ -220,7 +277,9 @@ class Generator(keras.utils.Sequence):
         # randomly transform both image and annotations
         if transform is not None or self.transform_generator:
             if transform is None:
-                transform = adjust_transform_for_image(next(self.transform_generator), image, self.transform_parameters.relative_translation)
+                with _random_generators_lock:
+                    transform = next(self.transform_generator)
+                transform = adjust_transform_for_image(transform, image, self.transform_parameters.relative_translation)
 
             # apply transformation to image
             image = apply_transform(transform, image, self.transform_parameters)
@@ -285,6 +344,13 @@ class Generator(keras.utils.Sequence):
         """
         # determine the order of the images
         order = list(range(self.size()))
+
+        # only keep the images of this shard, every shard gets the same number of images (wrapping around if needed)
+        # so that all workers train for the same number of batches per epoch
+        if self.num_shards > 1:
+            shard_size = -(-len(order) // self.num_shards)
+            order      = [order[(self.shard_index + i * self.num_shards) % len(order)] for i in range(shard_size)]
+
         if self.group_method == 'random':
             random.shuffle(order)
         elif self.group_method == 'ratio':
@@ -312,10 +378,29 @@ class Generator(keras.utils.Sequence):
         return image_batch
 
     def generate_anchors(self, image_shape):
-        anchor_params = None
-        if self.config and 'anchor_parameters' in self.config:
-            anchor_params = parse_anchor_parameters(self.config)
-        return anchors_for_shape(image_shape, anchor_params=anchor_params, shapes_callback=self.compute_shapes)
+        if image_shape not in self._anchors_cache:
+            # keep the cache small, datasets with many different image shapes would otherwise keep all their anchors in memory
+            if len(self._anchors_cache) >= 32:
+                self._anchors_cache.clear()
+
+            anchor_params = None
+            if self.config and 'anchor_parameters' in self.config:
+                anchor_params = parse_anchor_parameters(self.config)
+            self._anchors_cache[image_shape] = anchors_for_shape(
+                image_shape,
+                pyramid_levels=parse_pyramid_levels(self.config),
+                anchor_params=anchor_params,
+                shapes_callback=self.compute_shapes
+            )
+        return self._anchors_cache[image_shape]
+
+    def generate_anchor_index(self, image_shape):
+        """ Returns the AnchorIndex for the anchors of an image shape.
+        """
+        key = ('index', image_shape)
+        if key not in self._anchors_cache:
+            self._anchors_cache[key] = AnchorIndex(self.generate_anchors(image_shape))
+        return self._anchors_cache[key]
 
     def compute_targets(self, image_group, annotations_group):
         """ Compute target outputs for the network using images and their annotations.
@@ -324,11 +409,16 @@ class Generator(keras.utils.Sequence):
         max_shape = tuple(max(image.shape[x] for image in image_group) for x in range(3))
         anchors   = self.generate_anchors(max_shape)
 
+        kwargs = {}
+        if self.prune_overlaps:
+            kwargs['anchor_index'] = self.generate_anchor_index(max_shape)
+
         batches = self.compute_anchor_targets(
             anchors,
             image_group,
             annotations_group,
-            self.num_classes()
+            self.num_classes(),
+            **kwargs
         )
 
         return list(batches)
@@ -336,27 +426,42 @@ class Generator(keras.utils.Sequence):
     def compute_input_output(self, group):
         """ Compute inputs and target outputs for the network.
         """
+        times = [time.perf_counter()]
+
         # load images and annotations
-        image_group       = self.load_image_group(group)
         annotations_group = self.load_annotations_group(group)
+        if self.reduced_decoding and not self.no_resize:
+            image_group, annotations_group = self.load_reduced_image_group(group, annotations_group)
+        else:
+            image_group = self.load_image_group(group)
+        times.append(time.perf_counter())
 
         # check validity of annotations
         image_group, annotations_group = self.filter_annotations(image_group, annotations_group, group)
+        times.append(time.perf_counter())
 
         # randomly apply visual effect
         image_group, annotations_group = self.random_visual_effect_group(image_group, annotations_group)
+        times.append(time.perf_counter())
 
         # randomly transform data
         image_group, annotations_group = self.random_transform_group(image_group, annotations_group)
+        times.append(time.perf_counter())
 
         # perform preprocessing steps
         image_group, annotations_group = self.preprocess_group(image_group, annotations_group)
+        times.append(time.perf_counter())
 
         # compute network inputs
         inputs = self.compute_inputs(image_group)
+        times.append(time.perf_counter())
 
         # compute network targets
         targets = self.compute_targets(image_group, annotations_group)
+        times.append(time.perf_counter())
+
+        if self.stage_timings is not None:
+            self.stage_timings.append({stage: end - start for stage, start, end in zip(STAGES, times, times[1:])})
 
         return inputs, targets
 
@@ -18,10 +18,10 @@ import csv
 import os.path
 
 import numpy as np
-from PIL import Image
 
 from .generator import Generator
 from ..utils.image import read_image_bgr
+from ..utils.image_metadata import ImageMetadataIndex
 
 kitti_classes = {
     'Car': 0,
@@ -103,6 +103,9 @@ class KittiGenerator(Generator):
 
                 self.image_data[i] = boxes
 
+        # read image sizes once, when they are first needed, and persist them next to the subset directories
+        self.image_metadata = ImageMetadataIndex(os.path.join(self.base_dir, subset, 'images.metadata.json'), paths=self.images)
+
         super(KittiGenerator, self).__init__(**kwargs)
 
     def size(self):
@@ -138,9 +141,7 @@ class KittiGenerator(Generator):
     def image_aspect_ratio(self, image_index):
         """ Compute the aspect ratio for an image with image_index.
         """
-        # PIL is fast for metadata
-        image = Image.open(self.images[image_index])
-        return float(image.width) / float(image.height)
+        return self.image_metadata.aspect_ratio(self.images[image_index])
 
     def image_path(self, image_index):
         """ Get the path to an image.
@@ -16,11 +16,11 @@ limitations under the License.
 
 from ..preprocessing.generator import Generator
 from ..utils.image import read_image_bgr
+from ..utils.image_metadata import ImageMetadataIndex, metadata_path_for
 
 import os
 import numpy as np
 from six import raise_from
-from PIL import Image
 
 try:
     import xml.etree.cElementTree as ET
@@ -91,7 +91,8 @@ class PascalVocGenerator(Generator):
         self.data_dir             = data_dir
         self.set_name             = set_name
         self.classes              = classes
-        self.image_names          = [l.strip().split(None, 1)[0] for l in open(os.path.join(data_dir, 'ImageSets', 'Main', set_name + '.txt')).readlines()]
+        self.set_file             = os.path.join(data_dir, 'ImageSets', 'Main', set_name + '.txt')
+        self.image_names          = [l.strip().split(None, 1)[0] for l in open(self.set_file).readlines()]
         self.image_extension      = image_extension
         self.skip_truncated       = skip_truncated
         self.skip_difficult       = skip_difficult
@@ -100,6 +101,9 @@ class PascalVocGenerator(Generator):
         for key, value in self.classes.items():
             self.labels[value] = key
 
+        # read image sizes once, when they are first needed, and persist them next to the image set file
+        self.image_metadata = ImageMetadataIndex(metadata_path_for(self.set_file), paths=[self.image_path(i) for i in range(self.size())])
+
         super(PascalVocGenerator, self).__init__(**kwargs)
 
     def size(self):
@@ -135,9 +139,7 @@ class PascalVocGenerator(Generator):
     def image_aspect_ratio(self, image_index):
         """ Compute the aspect ratio for an image with image_index.
         """
-        path  = os.path.join(self.data_dir, 'JPEGImages', self.image_names[image_index] + self.image_extension)
-        image = Image.open(path)
-        return float(image.width) / float(image.height)
+        return self.image_metadata.aspect_ratio(self.image_path(image_index))
 
     def image_path(self, image_index):
         """ Get the path to an image.
@@ -0,0 +1,234 @@
+"""
+Copyright 2017-2018 Fizyr (https://fizyr.com)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import collections
+import multiprocessing
+import queue
+import random
+import time
+import traceback
+
+import numpy as np
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+# alignment (in bytes) of the arrays written to a slot
+_ALIGNMENT = 64
+
+
+def _align(offset):
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def _batch_nbytes(arrays):
+    """ Number of bytes needed to store arrays in a slot.
+    """
+    return sum(_align(a.nbytes) for a in arrays)
+
+
+def write_arrays(buffer, arrays):
+    """ Write arrays consecutively into a buffer.
+
+    Args
+        buffer : The (shared memory) buffer to write to.
+        arrays : List of np.array to write.
+
+    Returns
+        A list of (dtype, shape, offset) tuples describing where each array was written,
+        or None if the arrays don't fit in the buffer.
+    """
+    if _batch_nbytes(arrays) > len(buffer):
+        return None
+
+    layout = []
+    offset = 0
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        view  = np.ndarray(array.shape, dtype=array.dtype, buffer=buffer, offset=offset)
+        view[...] = array
+        layout.append((array.dtype.str, array.shape, offset))
+        offset = _align(offset + array.nbytes)
+
+    return layout
+
+
+def read_arrays(buffer, layout):
+    """ Create zero-copy views on arrays that were written to a buffer with write_arrays.
+    """
+    return [np.ndarray(shape, dtype=np.dtype(dtype), buffer=buffer, offset=offset) for dtype, shape, offset in layout]
+
+
+def _worker(generator, memory, tasks, results, seed):
+    """ Worker loop computing batches for groups and writing them into shared memory slots.
+    """
+    if seed is not None:
+        np.random.seed(seed)
+        random.seed(seed)
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+
+        sequence_id, slot, group = task
+        try:
+            inputs, targets = generator.compute_input_output(group)
+            arrays = [inputs] + list(targets)
+            layout = write_arrays(memory[slot].buf, arrays)
+
+            # batches that don't fit in a slot fall back to being pickled through the queue
+            if layout is None:
+                results.put((sequence_id, slot, 'pickled', arrays))
+            else:
+                results.put((sequence_id, slot, 'shared', layout))
+        except Exception:
+            results.put((sequence_id, slot, 'error', traceback.format_exc()))
+
+
+class SharedMemoryEnqueuer(object):
+    """ Computes Generator batches in worker processes and transfers them through a ring of shared memory slots.
+
+    Instead of pickling every batch through a multiprocessing queue, workers write the image batch and the anchor targets
+    into preallocated shared memory slots and only send the layout of the arrays back. get() copies every batch out of its
+    slot with a single memcpy per array and frees the slot immediately, so batches stay valid when they are buffered
+    (ie. by the prefetching tf.data pipeline of fit_generator).
+    """
+
+    def __init__(self, generator, workers=1, slots=None, slot_size=None, seed=None):
+        """ Initialize the enqueuer.
+
+        Args
+            generator : The Generator to compute batches with.
+            workers   : Number of worker processes.
+            slots     : Number of shared memory slots (defaults to 2 * workers + 1, at least 2).
+            slot_size : Size of a slot in bytes. If None, twice the size of the first batch is used.
+            seed      : Base random seed for the workers, worker i is seeded with seed + i. If None, a random seed is used.
+        """
+        if shared_memory is None:
+            raise ImportError('SharedMemoryEnqueuer requires multiprocessing.shared_memory (Python 3.8 or higher).')
+
+        self.generator = generator
+        self.workers   = max(1, workers)
+        self.slots     = max(2, slots or 2 * self.workers + 1)
+        self.slot_size = slot_size
+        self.seed      = seed if seed is not None else np.random.randint(0, 2 ** 31 - self.workers)
+
+        self.memory    = []
+        self.processes = []
+        self.tasks     = None
+        self.results   = None
+
+    def is_running(self):
+        return len(self.processes) > 0
+
+    def start(self):
+        """ Allocate the shared memory slots and start the worker processes.
+        """
+        if self.slot_size is None:
+            inputs, targets = self.generator.compute_input_output(self.generator.groups[0])
+            self.slot_size  = 2 * _batch_nbytes([inputs] + list(targets))
+
+        self.memory  = [shared_memory.SharedMemory(create=True, size=self.slot_size) for _ in range(self.slots)]
+        self.tasks   = multiprocessing.Queue()
+        self.results = multiprocessing.Queue()
+
+        for i in range(self.workers):
+            process = multiprocessing.Process(target=_worker, args=(self.generator, self.memory, self.tasks, self.results, self.seed + i))
+            process.daemon = True
+            process.start()
+            self.processes.append(process)
+
+    def stop(self, timeout=10):
+        """ Stop the worker processes and release the shared memory.
+
+        Args
+            timeout : Seconds to wait for the workers to finish their current batches before terminating them.
+        """
+        for _ in self.processes:
+            self.tasks.put(None)
+
+        # workers can't exit before their results are read from the queue, so keep draining it
+        deadline = time.time() + timeout
+        while any(process.is_alive() for process in self.processes) and time.time() < deadline:
+            try:
+                self.results.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        self.processes = []
+
+        for memory in self.memory:
+            try:
+                memory.close()
+            except BufferError:
+                # views on this slot are still alive, the memory is released when they are
+                pass
+            memory.unlink()
+        self.memory = []
+
+    def _groups(self):
+        """ Yields the groups of the generator indefinitely, shuffling them after every epoch.
+        """
+        while True:
+            for group in list(self.generator.groups):
+                yield group
+            self.generator.on_epoch_end()
+
+    def get(self):
+        """ Yields batches (inputs, [regression, classification]) in the order of the generator groups.
+        """
+        groups      = self._groups()
+        free_slots  = collections.deque(range(self.slots))
+        pending     = {}
+        next_submit = 0
+        next_yield  = 0
+
+        while self.is_running():
+            # keep every free slot busy
+            while free_slots:
+                self.tasks.put((next_submit, free_slots.popleft(), next(groups)))
+                next_submit += 1
+
+            # wait for the next batch in order, a consumer that prefetches may still be waiting when the enqueuer is stopped
+            while next_yield not in pending and self.is_running():
+                try:
+                    sequence_id, slot, kind, payload = self.results.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                pending[sequence_id] = (slot, kind, payload)
+            if next_yield not in pending:
+                return
+            slot, kind, payload = pending.pop(next_yield)
+            next_yield += 1
+
+            if kind == 'error':
+                raise RuntimeError('Exception in SharedMemoryEnqueuer worker:\n{}'.format(payload))
+            elif kind == 'shared':
+                arrays = [np.copy(array) for array in read_arrays(self.memory[slot].buf, payload)]
+            else:
+                arrays = payload
+
+            # the batch no longer refers to its slot, so the slot can be reused
+            free_slots.append(slot)
+
+            yield arrays[0], arrays[1:]
@@ -0,0 +1,100 @@
+"""
+Copyright 2017-2018 Fizyr (https://fizyr.com)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import warnings
+
+import keras
+import tensorflow as tf
+
+AUTOTUNE = tf.data.experimental.AUTOTUNE
+
+
+def generator_to_dataset(
+    generator,
+    num_parallel_calls = AUTOTUNE,
+    prefetch           = AUTOTUNE,
+    interleave         = 0,
+    cache              = None,
+    repeat             = True,
+):
+    """ Expose a Generator as a tf.data.Dataset.
+
+    Every element of the dataset is a batch (inputs, (regression, classification)) as returned by generator[index].
+    Batches are computed in parallel by tf.data instead of by Keras worker threads or processes.
+
+    Args
+        generator          : The Generator (or any keras.utils.Sequence returning (inputs, [regression, classification])) to wrap.
+        num_parallel_calls : Number of batches to compute in parallel (defaults to tf.data.experimental.AUTOTUNE).
+        prefetch           : Number of batches to prefetch (defaults to tf.data.experimental.AUTOTUNE, 0 disables prefetching).
+        interleave         : If > 1, split the groups into this many shards which are computed concurrently and interleaved.
+        cache              : If not None, cache the computed batches in memory ('') or in a file with this prefix.
+                             Only useful without random augmentation, since cached batches are replayed as-is.
+        repeat             : If True, repeat the dataset indefinitely (as required by fit_generator with steps_per_epoch).
+
+    Returns
+        A tf.data.Dataset.
+    """
+    floatx  = keras.backend.floatx()
+    shuffle = getattr(generator, 'shuffle_groups', False)
+
+    if cache is not None and (getattr(generator, 'transform_generator', None) or getattr(generator, 'visual_effect_generator', None)):
+        warnings.warn('Caching a dataset with random augmentation replays the same augmented batches every epoch.')
+
+    def _load_batch(index):
+        inputs, targets = generator[int(index)]
+        regression, classification = targets
+        return inputs.astype(floatx), regression.astype(floatx), classification.astype(floatx)
+
+    def _map_batch(index):
+        inputs, regression, classification = tf.numpy_function(_load_batch, [index], [floatx, floatx, floatx])
+
+        # numpy_function loses the static shape information, restore the rank at least
+        inputs.set_shape([None, None, None, None])
+        regression.set_shape([None, None, 4 + 1])
+        classification.set_shape([None, None, None])
+
+        return inputs, (regression, classification)
+
+    def _indices(num_shards=1, shard=0, shuffle=shuffle):
+        indices = tf.data.Dataset.range(len(generator))
+        if num_shards > 1:
+            indices = indices.shard(num_shards, shard)
+        if shuffle:
+            indices = indices.shuffle(len(generator), reshuffle_each_iteration=True)
+        return indices
+
+    if cache is not None:
+        # compute all batches once in a fixed order, then replay them from the cache
+        dataset = _indices(shuffle=False).map(_map_batch, num_parallel_calls=num_parallel_calls).cache(cache)
+        if shuffle:
+            dataset = dataset.shuffle(max(1, min(len(generator), 16)), reshuffle_each_iteration=True)
+    elif interleave > 1:
+        dataset = tf.data.Dataset.range(interleave).interleave(
+            lambda shard: _indices(interleave, shard).map(_map_batch, num_parallel_calls=num_parallel_calls),
+            cycle_length=interleave,
+            block_length=1,
+            num_parallel_calls=interleave,
+        )
+    else:
+        dataset = _indices().map(_map_batch, num_parallel_calls=num_parallel_calls)
+
+    if repeat:
+        dataset = dataset.repeat()
+
+    if prefetch:
+        dataset = dataset.prefetch(prefetch)
+
+    return dataset
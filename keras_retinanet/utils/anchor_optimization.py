@@ -0,0 +1,251 @@
+"""
+Copyright 2017-2018 Fizyr (https://fizyr.com)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import collections
+import configparser
+
+import numpy as np
+import keras
+
+from .anchors import AnchorIndex, AnchorParameters, anchors_for_shape, compute_gt_annotations
+from .image import compute_resize_scale
+from .image_metadata import read_image_metadata
+
+# candidates searched by optimize_anchor_parameters (ratios are height / width)
+DEFAULT_RATIOS       = [0.25, 1.0 / 3.0, 0.5, 0.75, 1, 4.0 / 3.0, 2, 3, 4]
+DEFAULT_SCALES       = [2 ** (i / 6.0) for i in range(-3, 10)]
+DEFAULT_SIZE_FACTORS = [0.5, 2 ** -0.5, 1, 2 ** 0.5, 2]
+
+# shapes with at least this many images use an AnchorIndex, for fewer images building the index costs more than it saves
+_MIN_IMAGES_FOR_INDEX = 16
+
+
+def _image_shape(generator, image_index):
+    """ Returns the (height, width) of an image, preferably without decoding it.
+    """
+    try:
+        path = generator.image_path(image_index)
+    except NotImplementedError:
+        path = None
+
+    if path is not None:
+        if hasattr(generator, 'image_metadata'):
+            metadata = generator.image_metadata.get(path)
+        else:
+            metadata = read_image_metadata(path)
+        return metadata['height'], metadata['width']
+
+    return generator.load_image(image_index).shape[:2]
+
+
+def collect_image_boxes(generator, max_images=None, seed=None):
+    """ Collect the annotated boxes of a generator, as they are after resizing.
+
+    Args
+        generator  : The Generator to read the annotations from.
+        max_images : If not None, use a random subset of at most this many images.
+        seed       : Random seed used to select the subset.
+
+    Returns
+        A list of (image_shape, boxes) tuples, where image_shape is (height, width, 3) and boxes is a np.array of shape (K, 4).
+        Images without (valid) annotations are skipped.
+    """
+    indices = np.arange(generator.size())
+    if max_images is not None and max_images < len(indices):
+        indices = np.sort(np.random.RandomState(seed).choice(indices, max_images, replace=False))
+
+    image_boxes = []
+    for image_index in indices:
+        height, width = _image_shape(generator, image_index)
+        boxes         = generator.load_annotations(image_index)['bboxes']
+
+        # same criteria as Generator.filter_annotations
+        boxes = boxes[
+            (boxes[:, 2] > boxes[:, 0]) &
+            (boxes[:, 3] > boxes[:, 1]) &
+            (boxes[:, 0] >= 0) &
+            (boxes[:, 1] >= 0) &
+            (boxes[:, 2] <= width) &
+            (boxes[:, 3] <= height)
+        ]
+        if not boxes.shape[0]:
+            continue
+
+        scale = 1
+        if not getattr(generator, 'no_resize', False):
+            scale = compute_resize_scale((height, width, 3), min_side=generator.image_min_side, max_side=generator.image_max_side)
+
+        image_shape = (int(round(height * scale)), int(round(width * scale)), 3)
+        image_boxes.append((image_shape, boxes * scale))
+
+    return image_boxes
+
+
+def anchor_coverage(image_boxes, anchor_params, negative_overlap=0.4, positive_overlap=0.5, pyramid_levels=None):
+    """ Compute how well anchors cover the annotated boxes.
+
+    A box is covered if at least one anchor is a positive for that box, as determined by compute_gt_annotations.
+
+    Args
+        image_boxes      : List of (image_shape, boxes) tuples as returned by collect_image_boxes.
+        anchor_params    : The AnchorParameters to evaluate.
+        negative_overlap : IoU overlap for negative anchors.
+        positive_overlap : IoU overlap for positive anchors.
+        pyramid_levels   : List of pyramid levels to generate anchors for (defaults to [3, 4, 5, 6, 7]).
+
+    Returns
+        coverage  : Fraction of boxes that is covered.
+        positives : Average number of positive anchors per box.
+    """
+    by_shape = collections.defaultdict(list)
+    for image_shape, boxes in image_boxes:
+        by_shape[image_shape].append(boxes)
+
+    num_boxes     = 0
+    num_covered   = 0
+    num_positives = 0
+    for image_shape, boxes_group in by_shape.items():
+        anchors      = anchors_for_shape(image_shape, pyramid_levels=pyramid_levels, anchor_params=anchor_params)
+        anchor_index = AnchorIndex(anchors) if len(boxes_group) >= _MIN_IMAGES_FOR_INDEX else None
+
+        for boxes in boxes_group:
+            positive_indices, _, argmax_overlaps_inds = compute_gt_annotations(
+                anchors, boxes, negative_overlap, positive_overlap, anchor_index=anchor_index
+            )
+            num_boxes     += boxes.shape[0]
+            num_covered   += len(np.unique(argmax_overlaps_inds[positive_indices]))
+            num_positives += np.count_nonzero(positive_indices)
+
+    if num_boxes == 0:
+        return 0.0, 0.0
+    return num_covered / float(num_boxes), num_positives / float(num_boxes)
+
+
+def _anchor_parameters(base_sizes, strides, size_factor, ratios, scales):
+    return AnchorParameters(
+        sizes   = [int(round(size * size_factor)) for size in base_sizes],
+        strides = list(strides),
+        ratios  = np.array(sorted(ratios), keras.backend.floatx()),
+        scales  = np.array(sorted(scales), keras.backend.floatx()),
+    )
+
+
+def optimize_anchor_parameters(
+    image_boxes,
+    max_anchors      = 9,
+    ratios           = DEFAULT_RATIOS,
+    scales           = DEFAULT_SCALES,
+    size_factors     = DEFAULT_SIZE_FACTORS,
+    base_sizes       = AnchorParameters.default.sizes,
+    strides          = AnchorParameters.default.strides,
+    negative_overlap = 0.4,
+    positive_overlap = 0.5,
+    pyramid_levels   = None,
+    min_gain         = 0.001,
+    verbose          = False,
+):
+    """ Search anchor ratios, scales and sizes that cover the annotated boxes with as few anchors per location as possible.
+
+    For every size factor (which multiplies base_sizes), a greedy search starts with the ratio closest to the median
+    box ratio and the best scale for that ratio. It then keeps adding the ratio or scale that increases the coverage most,
+    as long as the number of anchors per location stays within max_anchors and the coverage increases by at least min_gain.
+
+    Args
+        image_boxes      : List of (image_shape, boxes) tuples as returned by collect_image_boxes.
+        max_anchors      : Maximum number of anchors per location (len(ratios) * len(scales)).
+        ratios           : Candidate ratios (height / width).
+        scales           : Candidate scales.
+        size_factors     : Candidate factors for base_sizes.
+        base_sizes       : Anchor size per pyramid level, before applying a size factor.
+        strides          : Anchor stride per pyramid level.
+        negative_overlap : IoU overlap for negative anchors.
+        positive_overlap : IoU overlap for positive anchors.
+        pyramid_levels   : List of pyramid levels, base_sizes and strides should have an entry for every level (defaults to [3, 4, 5, 6, 7]).
+        min_gain         : Minimum increase in coverage to add a ratio or scale.
+        verbose          : If True, print the progress of the search.
+
+    Returns
+        The best AnchorParameters and a tuple (coverage, positives) as returned by anchor_coverage.
+    """
+    all_boxes    = np.concatenate([boxes for _, boxes in image_boxes])
+    median_ratio = np.median((all_boxes[:, 3] - all_boxes[:, 1]) / (all_boxes[:, 2] - all_boxes[:, 0]))
+    first_ratio  = min(ratios, key=lambda ratio: abs(np.log(ratio / median_ratio)))
+
+    def evaluate(size_factor, selected_ratios, selected_scales):
+        params = _anchor_parameters(base_sizes, strides, size_factor, selected_ratios, selected_scales)
+        return params, anchor_coverage(image_boxes, params, negative_overlap, positive_overlap, pyramid_levels)
+
+    best = None
+    for size_factor in size_factors:
+        # start with a single anchor per location
+        candidates = [evaluate(size_factor, [first_ratio], [scale]) + ([first_ratio], [scale]) for scale in scales]
+        params, score, selected_ratios, selected_scales = max(candidates, key=lambda c: c[1])
+
+        # greedily add the ratio or scale that improves the coverage most
+        while True:
+            candidates = []
+            if (len(selected_ratios) + 1) * len(selected_scales) <= max_anchors:
+                candidates += [
+                    evaluate(size_factor, selected_ratios + [ratio], selected_scales) + (selected_ratios + [ratio], selected_scales)
+                    for ratio in ratios if ratio not in selected_ratios
+                ]
+            if len(selected_ratios) * (len(selected_scales) + 1) <= max_anchors:
+                candidates += [
+                    evaluate(size_factor, selected_ratios, selected_scales + [scale]) + (selected_ratios, selected_scales + [scale])
+                    for scale in scales if scale not in selected_scales
+                ]
+            if not candidates:
+                break
+
+            candidate = max(candidates, key=lambda c: c[1])
+            if candidate[1][0] - score[0] < min_gain:
+                break
+            params, score, selected_ratios, selected_scales = candidate
+
+        if verbose:
+            print('size factor {:.3f}: coverage {:.4f} with {} anchors per location (ratios {}, scales {})'.format(
+                size_factor, score[0], params.num_anchors(), format_values(params.ratios), format_values(params.scales)
+            ))
+
+        # prefer a higher coverage, then fewer anchors, then more positive anchors per box
+        key = (score[0], -params.num_anchors(), score[1])
+        if best is None or key > best[0]:
+            best = (key, params, score)
+
+    return best[1], best[2]
+
+
+def format_values(values):
+    """ Format a list of numbers the way they are stored in a config file.
+    """
+    return ' '.join('{:.6g}'.format(value) for value in values)
+
+
+def write_anchor_config(path, anchor_params, pyramid_levels=None):
+    """ Write anchor parameters (and optionally pyramid levels) to a config file that can be read with read_config_file.
+    """
+    config = configparser.ConfigParser()
+    config['anchor_parameters'] = {
+        'sizes'   : format_values(anchor_params.sizes),
+        'strides' : format_values(anchor_params.strides),
+        'ratios'  : format_values(anchor_params.ratios),
+        'scales'  : format_values(anchor_params.scales),
+    }
+    if pyramid_levels is not None:
+        config['pyramid_levels'] = {'levels': format_values(pyramid_levels)}
+
+    with open(path, 'w') as f:
+        config.write(f)
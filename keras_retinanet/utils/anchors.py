@@ -17,7 +17,7 @@ limitations under the License.
 import numpy as np
 import keras
 
-from ..utils.compute_overlap import compute_overlap
+from ..utils.compute_overlap import compute_max_overlap
 
 
 class AnchorParameters:
@@ -50,13 +50,47 @@ AnchorParameters.default = AnchorParameters(
 )
 
 
+"""
+The default pyramid levels, the sizes and strides of AnchorParameters.default correspond to these levels.
+"""
+DEFAULT_PYRAMID_LEVELS = [3, 4, 5, 6, 7]
+
+
+def anchor_parameters_for_levels(pyramid_levels, anchor_params=None):
+    """ Returns the anchor parameters to use for a set of pyramid levels.
+
+    Args
+        pyramid_levels : List of ints representing which pyramid levels are used.
+        anchor_params  : Struct containing anchor parameters, with a size and stride for every pyramid level.
+                         If None (or AnchorParameters.default), the default sizes and strides of the pyramid levels are used.
+
+    Returns
+        An AnchorParameters object with a size and stride for every pyramid level.
+    """
+    if anchor_params is None or anchor_params is AnchorParameters.default:
+        return AnchorParameters(
+            sizes   = [2 ** (level + 2) for level in pyramid_levels],
+            strides = [2 ** level for level in pyramid_levels],
+            ratios  = AnchorParameters.default.ratios,
+            scales  = AnchorParameters.default.scales,
+        )
+
+    if len(anchor_params.sizes) != len(pyramid_levels) or len(anchor_params.strides) != len(pyramid_levels):
+        raise ValueError('Anchor parameters define {} sizes and {} strides, but {} pyramid levels ({}) are used.'.format(
+            len(anchor_params.sizes), len(anchor_params.strides), len(pyramid_levels), pyramid_levels
+        ))
+
+    return anchor_params
+
+
 def anchor_targets_bbox(
     anchors,
     image_group,
     annotations_group,
     num_classes,
     negative_overlap=0.4,
-    positive_overlap=0.5
+    positive_overlap=0.5,
+    anchor_index=None
 ):
     """ Generate anchor targets for bbox detection.
 
@@ -68,6 +102,7 @@ def anchor_targets_bbox(
         mask_shape: If the image is padded with zeros, mask_shape can be used to mark the relevant part of the image.
         negative_overlap: IoU overlap for negative anchors (all anchors with overlap < negative_overlap are negative).
         positive_overlap: IoU overlap or positive anchors (all anchors with overlap > positive_overlap are positive).
+        anchor_index: Optional AnchorIndex for anchors, used to only compute the overlaps of anchors near each annotation.
 
     Returns
         labels_batch: batch that contains labels & anchor states (np.array of shape (batch_size, N, num_classes + 1),
@@ -92,7 +127,7 @@ def anchor_targets_bbox(
     for index, (image, annotations) in enumerate(zip(image_group, annotations_group)):
         if annotations['bboxes'].shape[0]:
             # obtain indices of gt annotations with the greatest overlap
-            positive_indices, ignore_indices, argmax_overlaps_inds = compute_gt_annotations(anchors, annotations['bboxes'], negative_overlap, positive_overlap)
+            positive_indices, ignore_indices, argmax_overlaps_inds = compute_gt_annotations(anchors, annotations['bboxes'], negative_overlap, positive_overlap, anchor_index=anchor_index)
 
             labels_batch[index, ignore_indices, -1]       = -1
             labels_batch[index, positive_indices, -1]     = 1
@@ -116,11 +151,87 @@ def anchor_targets_bbox(
     return regression_batch, labels_batch
 
 
+def anchor_targets_bbox_batched(
+    anchors,
+    image_group,
+    annotations_group,
+    num_classes,
+    negative_overlap=0.4,
+    positive_overlap=0.5,
+    anchor_index=None
+):
+    """ Generate anchor targets for bbox detection, processing all images of the group at once.
+
+    The output is identical to anchor_targets_bbox. Only the overlaps are computed per image, the regression targets,
+    labels and anchor states of all images are computed with a single vectorized operation each.
+
+    Args
+        See anchor_targets_bbox.
+
+    Returns
+        See anchor_targets_bbox.
+    """
+    assert(len(image_group) == len(annotations_group)), "The length of the images and annotations need to be equal."
+    assert(len(annotations_group) > 0), "No data received to compute anchor targets for."
+    for annotations in annotations_group:
+        assert('bboxes' in annotations), "Annotations should contain bboxes."
+        assert('labels' in annotations), "Annotations should contain labels."
+
+    batch_size  = len(image_group)
+    num_anchors = anchors.shape[0]
+
+    regression_batch = np.zeros((batch_size, num_anchors, 4 + 1), dtype=keras.backend.floatx())
+    labels_batch     = np.zeros((batch_size, num_anchors, num_classes + 1), dtype=keras.backend.floatx())
+    states           = np.zeros((batch_size, num_anchors), dtype=keras.backend.floatx())
+
+    # the overlaps are computed per image, since every image has a different number of annotations
+    annotated      = [index for index, annotations in enumerate(annotations_group) if annotations['bboxes'].shape[0]]
+    positive_batch = np.zeros((len(annotated), num_anchors), dtype=bool)
+    argmax_batch   = np.empty((len(annotated), num_anchors), dtype=np.int64)
+    for i, index in enumerate(annotated):
+        positive_indices, ignore_indices, argmax_overlaps_inds = compute_gt_annotations(
+            anchors, annotations_group[index]['bboxes'], negative_overlap, positive_overlap, anchor_index=anchor_index
+        )
+
+        states[index, ignore_indices]   = -1
+        states[index, positive_indices] = 1
+        positive_batch[i]               = positive_indices
+        argmax_batch[i]                 = argmax_overlaps_inds
+
+    if annotated:
+        # index the annotations of all images at once, by offsetting the matched annotation of every anchor
+        bboxes  = np.concatenate([annotations_group[index]['bboxes'] for index in annotated])
+        labels  = np.concatenate([annotations_group[index]['labels'] for index in annotated]).astype(int)
+        offsets = np.cumsum([0] + [annotations_group[index]['bboxes'].shape[0] for index in annotated[:-1]])
+        matched = argmax_batch + offsets[:, None]
+
+        regression_batch[annotated, :, :-1] = bbox_transform(anchors, bboxes[matched, :])
+
+        # compute target class labels
+        image_indices, anchor_indices = np.nonzero(positive_batch)
+        labels_batch[np.asarray(annotated)[image_indices], anchor_indices, labels[matched[image_indices, anchor_indices]]] = 1
+
+    # ignore annotations outside of image
+    centers_x    = (anchors[:, 0] + anchors[:, 2]) / 2
+    centers_y    = (anchors[:, 1] + anchors[:, 3]) / 2
+    image_shapes = np.array([image.shape[:2] if image.shape else (np.inf, np.inf) for image in image_group], dtype=np.float64)
+    outside      = (centers_x[None, :] >= image_shapes[:, 1:2]) | (centers_y[None, :] >= image_shapes[:, 0:1])
+    states[outside] = -1
+
+    # only a fraction of the anchors has a non zero state, so scatter those instead of writing the whole column
+    image_indices, anchor_indices = np.nonzero(states)
+    labels_batch[image_indices, anchor_indices, -1]     = states[image_indices, anchor_indices]
+    regression_batch[image_indices, anchor_indices, -1] = states[image_indices, anchor_indices]
+
+    return regression_batch, labels_batch
+
+
 def compute_gt_annotations(
     anchors,
     annotations,
     negative_overlap=0.4,
-    positive_overlap=0.5
+    positive_overlap=0.5,
+    anchor_index=None
 ):
     """ Obtain indices of gt annotations with the greatest overlap.
 
@@ -129,6 +240,7 @@ def compute_gt_annotations(
         annotations: np.array of shape (N, 5) for (x1, y1, x2, y2, label).
         negative_overlap: IoU overlap for negative anchors (all anchors with overlap < negative_overlap are negative).
         positive_overlap: IoU overlap or positive anchors (all anchors with overlap > positive_overlap are positive).
+        anchor_index: Optional AnchorIndex for anchors. If given, only the overlaps of anchors near each annotation are computed.
 
     Returns
         positive_indices: indices of positive anchors
@@ -136,9 +248,14 @@ def compute_gt_annotations(
         argmax_overlaps_inds: ordered overlaps indices
     """
 
-    overlaps = compute_overlap(anchors.astype(np.float64), annotations.astype(np.float64))
-    argmax_overlaps_inds = np.argmax(overlaps, axis=1)
-    max_overlaps = overlaps[np.arange(overlaps.shape[0]), argmax_overlaps_inds]
+    if anchor_index is not None:
+        argmax_overlaps_inds, max_overlaps = anchor_index.max_overlaps(annotations[:, :4])
+    else:
+        # compute_max_overlap accepts float32 and float64 arrays of the same dtype, use the wider dtype of both inputs
+        dtype = np.result_type(anchors, annotations)
+        if dtype not in (np.float32, np.float64):
+            dtype = np.float64
+        argmax_overlaps_inds, max_overlaps = compute_max_overlap(anchors.astype(dtype, copy=False), annotations[:, :4].astype(dtype, copy=False))
 
     # assign "dont care" labels
     positive_indices = max_overlaps >= positive_overlap
@@ -147,6 +264,162 @@ def compute_gt_annotations(
     return positive_indices, ignore_indices, argmax_overlaps_inds
 
 
+class AnchorIndex(object):
+    """ Spatial index over a set of anchors to compute overlaps with boxes without materializing the dense overlap matrix.
+
+    Anchors are bucketed by their shape (one bucket per pyramid level and base anchor) and, within a bucket,
+    by the column of the grid their center lies on. For each box only the anchors in the columns and rows that
+    can overlap with it are considered, so most anchor / box pairs are never evaluated.
+
+    Args
+        anchors: np.array of shape (N, 4) for (x1, y1, x2, y2).
+    """
+    def __init__(self, anchors):
+        anchors = np.asarray(anchors, dtype=np.float64)
+        self.anchors = anchors
+
+        centers_x = (anchors[:, 0] + anchors[:, 2]) / 2
+        centers_y = (anchors[:, 1] + anchors[:, 3]) / 2
+        widths    = anchors[:, 2] - anchors[:, 0]
+        heights   = anchors[:, 3] - anchors[:, 1]
+
+        # one bucket for every anchor shape, the (rounded) shapes only differ by floating point errors within a bucket
+        shapes     = np.round(widths, 3) + 1j * np.round(heights, 3)
+        _, buckets = np.unique(shapes, return_inverse=True)
+        buckets    = buckets.ravel()
+
+        # a column is a unique center x within a bucket
+        _, columns = np.unique(buckets + 1j * np.round(centers_x, 3), return_inverse=True)
+        columns    = columns.ravel()
+
+        # order the anchors by column, and by center y within a column
+        self.order = np.lexsort((centers_y, columns))
+
+        # offset the coordinates so that all (clipped) query values lie in [0, span) and don't spill into neighbouring keys
+        self.offset = -min(anchors.min(), 0) + 1
+        self.span   = 2 * (max(anchors.max(), 0) + self.offset) + 1
+
+        # column keys are sorted per bucket, row keys are sorted per column
+        column_order          = np.lexsort((centers_x, columns))
+        first_in_column       = np.unique(columns[column_order], return_index=True)[1]
+        column_anchors        = column_order[first_in_column]
+        self.column_buckets   = buckets[column_anchors]
+        self.column_keys      = self.column_buckets * self.span + centers_x[column_anchors] + self.offset
+        self.row_keys         = columns[self.order] * self.span + centers_y[self.order] + self.offset
+
+        # maximum half size of the anchors in every bucket, plus a margin for the +1 in the overlap computation
+        num_buckets              = buckets.max() + 1 if len(buckets) else 0
+        self.bucket_half_widths  = np.zeros((num_buckets,))
+        self.bucket_half_heights = np.zeros((num_buckets,))
+        np.maximum.at(self.bucket_half_widths, buckets, widths / 2)
+        np.maximum.at(self.bucket_half_heights, buckets, heights / 2)
+        self.bucket_half_widths  += 2
+        self.bucket_half_heights += 2
+
+    def _range_keys(self, bucket_or_column, low, high):
+        """ Convert a coordinate range to a key range within a bucket or column.
+        """
+        low  = np.clip(low + self.offset, 0, self.span - 1)
+        high = np.clip(high + self.offset, 0, self.span - 1)
+        return bucket_or_column * self.span + low, bucket_or_column * self.span + high
+
+    def candidates(self, boxes):
+        """ Compute candidate anchor / box pairs that might overlap.
+
+        Args
+            boxes: np.array of shape (K, 4) for (x1, y1, x2, y2).
+
+        Returns
+            anchor_indices, box_indices: np.arrays containing the anchor index and box index of every candidate pair.
+        """
+        num_buckets = len(self.bucket_half_widths)
+        num_boxes   = boxes.shape[0]
+
+        # for every (bucket, box) pair, find the range of columns that can overlap with the box
+        buckets   = np.repeat(np.arange(num_buckets), num_boxes)
+        box_index = np.tile(np.arange(num_boxes), num_buckets)
+        low, high = self._range_keys(
+            buckets,
+            boxes[box_index, 0] - self.bucket_half_widths[buckets],
+            boxes[box_index, 2] + self.bucket_half_widths[buckets],
+        )
+        column_start = np.searchsorted(self.column_keys, low, side='left')
+        column_end   = np.searchsorted(self.column_keys, high, side='right')
+
+        # expand to (column, box) pairs
+        box_index, columns = _expand_ranges(box_index, column_start, column_end)
+        buckets            = self.column_buckets[columns]
+
+        # for every (column, box) pair, find the range of anchors in the column that can overlap with the box
+        low, high = self._range_keys(
+            columns,
+            boxes[box_index, 1] - self.bucket_half_heights[buckets],
+            boxes[box_index, 3] + self.bucket_half_heights[buckets],
+        )
+        anchor_start = np.searchsorted(self.row_keys, low, side='left')
+        anchor_end   = np.searchsorted(self.row_keys, high, side='right')
+
+        # expand to (anchor, box) pairs
+        box_index, positions = _expand_ranges(box_index, anchor_start, anchor_end)
+
+        return self.order[positions], box_index
+
+    def max_overlaps(self, boxes):
+        """ Compute for every anchor the box with the highest overlap and that overlap.
+
+        The result is identical to taking the argmax and max over the rows of compute_overlap(anchors, boxes).
+
+        Args
+            boxes: np.array of shape (K, 4) for (x1, y1, x2, y2).
+
+        Returns
+            argmax_overlaps: np.array of shape (N,) with the index of the box with the highest overlap (0 if there is no overlap).
+            max_overlaps: np.array of shape (N,) with the highest overlap.
+        """
+        boxes           = np.asarray(boxes, dtype=np.float64)
+        num_anchors     = self.anchors.shape[0]
+        argmax_overlaps = np.zeros((num_anchors,), dtype=np.int64)
+        max_overlaps    = np.zeros((num_anchors,), dtype=np.float64)
+
+        if boxes.shape[0] == 0 or num_anchors == 0:
+            return argmax_overlaps, max_overlaps
+
+        anchor_index, box_index = self.candidates(boxes)
+        a = self.anchors[anchor_index]
+        b = boxes[box_index]
+
+        # same computation (and order of operations) as compute_overlap
+        iw = np.minimum(a[:, 2], b[:, 2]) - np.maximum(a[:, 0], b[:, 0]) + 1
+        ih = np.minimum(a[:, 3], b[:, 3]) - np.maximum(a[:, 1], b[:, 1]) + 1
+        valid = (iw > 0) & (ih > 0)
+        anchor_index, box_index, a, b, iw, ih = anchor_index[valid], box_index[valid], a[valid], b[valid], iw[valid], ih[valid]
+
+        box_area = (b[:, 2] - b[:, 0] + 1) * (b[:, 3] - b[:, 1] + 1)
+        ua       = (a[:, 2] - a[:, 0] + 1) * (a[:, 3] - a[:, 1] + 1) + box_area - iw * ih
+        overlaps = iw * ih / ua
+
+        # select the highest overlap per anchor, ties are broken by the lowest box index like np.argmax
+        order = np.lexsort((box_index, -overlaps, anchor_index))
+        first = np.unique(anchor_index[order], return_index=True)[1]
+        best  = order[first]
+
+        argmax_overlaps[anchor_index[best]] = box_index[best]
+        max_overlaps[anchor_index[best]]    = overlaps[best]
+
+        return argmax_overlaps, max_overlaps
+
+
+def _expand_ranges(ids, starts, ends):
+    """ Expand ranges [starts[i], ends[i]) to pairs (ids[i], position) for every position in the range.
+    """
+    counts    = np.maximum(ends - starts, 0)
+    total     = counts.sum()
+    ids       = np.repeat(ids, counts)
+    offsets   = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+    positions = np.arange(total) + offsets
+    return ids, positions
+
+
 def layer_shapes(image_shape, model):
     """Compute layer shapes given input image shape and the model.
 
@@ -164,7 +437,9 @@ def layer_shapes(image_shape, model):
     for layer in model.layers[1:]:
         nodes = layer._inbound_nodes
         for node in nodes:
-            inputs = [shape[lr.name] for lr in node.inbound_layers]
+            # newer keras versions return a single layer instead of a list for nodes with one input
+            inbound_layers = node.inbound_layers if isinstance(node.inbound_layers, (list, tuple)) else [node.inbound_layers]
+            inputs         = [shape[lr.name] for lr in inbound_layers]
             if not inputs:
                 continue
             shape[layer.name] = layer.compute_output_shape(inputs[0] if len(inputs) == 1 else inputs)
@@ -209,7 +484,7 @@ def anchors_for_shape(
     Args
         image_shape: The shape of the image.
         pyramid_levels: List of ints representing which pyramids to use (defaults to [3, 4, 5, 6, 7]).
-        anchor_params: Struct containing anchor parameters. If None, default values are used.
+        anchor_params: Struct containing anchor parameters with a size and stride for every pyramid level. If None, default values are used.
         shapes_callback: Function to call for getting the shape of the image at different pyramid levels.
 
     Returns
@@ -217,10 +492,9 @@ def anchors_for_shape(
     """
 
     if pyramid_levels is None:
-        pyramid_levels = [3, 4, 5, 6, 7]
+        pyramid_levels = DEFAULT_PYRAMID_LEVELS
 
-    if anchor_params is None:
-        anchor_params = AnchorParameters.default
+    anchor_params = anchor_parameters_for_levels(pyramid_levels, anchor_params)
 
     if shapes_callback is None:
         shapes_callback = guess_shapes
@@ -307,7 +581,7 @@ def generate_anchors(base_size=16, ratios=None, scales=None):
 
 
 def bbox_transform(anchors, gt_boxes, mean=None, std=None):
-    """Compute bounding-box regression targets for an image."""
+    """Compute bounding-box regression targets for an image, or for a batch of images if gt_boxes has shape (B, N, 4)."""
 
     if mean is None:
         mean = np.array([0, 0, 0, 0])
@@ -327,13 +601,12 @@ def bbox_transform(anchors, gt_boxes, mean=None, std=None):
     anchor_widths  = anchors[:, 2] - anchors[:, 0]
     anchor_heights = anchors[:, 3] - anchors[:, 1]
 
-    targets_dx1 = (gt_boxes[:, 0] - anchors[:, 0]) / anchor_widths
-    targets_dy1 = (gt_boxes[:, 1] - anchors[:, 1]) / anchor_heights
-    targets_dx2 = (gt_boxes[:, 2] - anchors[:, 2]) / anchor_widths
-    targets_dy2 = (gt_boxes[:, 3] - anchors[:, 3]) / anchor_heights
+    targets_dx1 = (gt_boxes[..., 0] - anchors[:, 0]) / anchor_widths
+    targets_dy1 = (gt_boxes[..., 1] - anchors[:, 1]) / anchor_heights
+    targets_dx2 = (gt_boxes[..., 2] - anchors[:, 2]) / anchor_widths
+    targets_dy2 = (gt_boxes[..., 3] - anchors[:, 3]) / anchor_heights
 
-    targets = np.stack((targets_dx1, targets_dy1, targets_dx2, targets_dy2))
-    targets = targets.T
+    targets = np.stack((targets_dx1, targets_dy1, targets_dx2, targets_dy2), axis=-1)
 
     targets = (targets - mean) / std
 
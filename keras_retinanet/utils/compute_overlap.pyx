@@ -6,48 +6,131 @@
 # --------------------------------------------------------
 
 cimport cython
+from cython.parallel cimport prange
 import numpy as np
 cimport numpy as np
 
+ctypedef fused boxes_t:
+    float
+    double
 
+ctypedef fused query_boxes_t:
+    float
+    double
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef inline double _overlap(
+    const boxes_t[:, :] boxes,
+    const query_boxes_t[:, :] query_boxes,
+    Py_ssize_t n,
+    Py_ssize_t k,
+    double box_area
+) nogil:
+    """ Overlap between boxes[n] and query_boxes[k], where box_area is the area of query_boxes[k].
+    """
+    cdef double iw, ih, ua
+    iw = (
+        min(<double> boxes[n, 2], <double> query_boxes[k, 2]) -
+        max(<double> boxes[n, 0], <double> query_boxes[k, 0]) + 1
+    )
+    if iw <= 0:
+        return 0
+    ih = (
+        min(<double> boxes[n, 3], <double> query_boxes[k, 3]) -
+        max(<double> boxes[n, 1], <double> query_boxes[k, 1]) + 1
+    )
+    if ih <= 0:
+        return 0
+    ua = (
+        (<double> boxes[n, 2] - <double> boxes[n, 0] + 1) *
+        (<double> boxes[n, 3] - <double> boxes[n, 1] + 1) +
+        box_area - iw * ih
+    )
+    return iw * ih / ua
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef double[::1] _query_box_areas(const query_boxes_t[:, :] query_boxes):
+    cdef Py_ssize_t K = query_boxes.shape[0]
+    cdef double[::1] areas = np.empty((K,), dtype=np.float64)
+    cdef Py_ssize_t k
+    for k in range(K):
+        areas[k] = (
+            (<double> query_boxes[k, 2] - <double> query_boxes[k, 0] + 1) *
+            (<double> query_boxes[k, 3] - <double> query_boxes[k, 1] + 1)
+        )
+    return areas
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
 def compute_overlap(
-    np.ndarray[double, ndim=2] boxes,
-    np.ndarray[double, ndim=2] query_boxes
+    const boxes_t[:, :] boxes,
+    const query_boxes_t[:, :] query_boxes
 ):
     """
     Args
-        a: (N, 4) ndarray of float
-        b: (K, 4) ndarray of float
+        a: (N, 4) ndarray of float32 or float64
+        b: (K, 4) ndarray of float32 or float64
 
     Returns
-        overlaps: (N, K) ndarray of overlap between boxes and query_boxes
+        overlaps: (N, K) ndarray (float64) of overlap between boxes and query_boxes
     """
-    cdef unsigned int N = boxes.shape[0]
-    cdef unsigned int K = query_boxes.shape[0]
-    cdef np.ndarray[double, ndim=2] overlaps = np.zeros((N, K), dtype=np.float64)
-    cdef double iw, ih, box_area
-    cdef double ua
-    cdef unsigned int k, n
-    for k in range(K):
-        box_area = (
-            (query_boxes[k, 2] - query_boxes[k, 0] + 1) *
-            (query_boxes[k, 3] - query_boxes[k, 1] + 1)
-        )
-        for n in range(N):
-            iw = (
-                min(boxes[n, 2], query_boxes[k, 2]) -
-                max(boxes[n, 0], query_boxes[k, 0]) + 1
-            )
-            if iw > 0:
-                ih = (
-                    min(boxes[n, 3], query_boxes[k, 3]) -
-                    max(boxes[n, 1], query_boxes[k, 1]) + 1
-                )
-                if ih > 0:
-                    ua = np.float64(
-                        (boxes[n, 2] - boxes[n, 0] + 1) *
-                        (boxes[n, 3] - boxes[n, 1] + 1) +
-                        box_area - iw * ih
-                    )
-                    overlaps[n, k] = iw * ih / ua
-    return overlaps
+    cdef Py_ssize_t N = boxes.shape[0]
+    cdef Py_ssize_t K = query_boxes.shape[0]
+    overlaps_array = np.zeros((N, K), dtype=np.float64)
+    cdef double[:, ::1] overlaps = overlaps_array
+    cdef double[::1] box_areas = _query_box_areas(query_boxes)
+    cdef Py_ssize_t k, n
+
+    for n in prange(N, nogil=True, schedule='static'):
+        for k in range(K):
+            overlaps[n, k] = _overlap(boxes, query_boxes, n, k, box_areas[k])
+
+    return overlaps_array
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def compute_max_overlap(
+    const boxes_t[:, :] boxes,
+    const query_boxes_t[:, :] query_boxes
+):
+    """ Computes for every box the query box with the highest overlap, without storing all overlaps.
+
+    Equal to taking the argmax and max over the rows of compute_overlap(boxes, query_boxes).
+
+    Args
+        a: (N, 4) ndarray of float32 or float64
+        b: (K, 4) ndarray of float32 or float64
+
+    Returns
+        argmax_overlaps: (N,) ndarray (int64) with the index of the query box with the highest overlap (0 if K is 0).
+        max_overlaps: (N,) ndarray (float64) with the highest overlap.
+    """
+    cdef Py_ssize_t N = boxes.shape[0]
+    cdef Py_ssize_t K = query_boxes.shape[0]
+    argmax_overlaps_array = np.zeros((N,), dtype=np.int64)
+    max_overlaps_array    = np.zeros((N,), dtype=np.float64)
+    cdef np.int64_t[::1] argmax_overlaps = argmax_overlaps_array
+    cdef double[::1] max_overlaps        = max_overlaps_array
+    cdef double[::1] box_areas           = _query_box_areas(query_boxes)
+    cdef Py_ssize_t k, n, best
+    cdef double overlap, best_overlap
+
+    for n in prange(N, nogil=True, schedule='static'):
+        best         = 0
+        best_overlap = 0
+        for k in range(K):
+            overlap = _overlap(boxes, query_boxes, n, k, box_areas[k])
+            # strictly greater, so ties resolve to the lowest index like np.argmax
+            if overlap > best_overlap:
+                best         = k
+                best_overlap = overlap
+        argmax_overlaps[n] = best
+        max_overlaps[n]    = best_overlap
+
+    return argmax_overlaps_array, max_overlaps_array
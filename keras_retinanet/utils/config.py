@@ -26,14 +26,19 @@ def read_config_file(config_path):
     with open(config_path, 'r') as file:
         config.read_file(file)
 
-    assert 'anchor_parameters' in config, \
-        "Malformed config file. Verify that it contains the anchor_parameters section."
+    assert 'anchor_parameters' in config or 'pyramid_levels' in config, \
+        "Malformed config file. Verify that it contains the anchor_parameters or pyramid_levels section."
 
-    config_keys = set(config['anchor_parameters'])
-    default_keys = set(AnchorParameters.default.__dict__.keys())
+    if 'anchor_parameters' in config:
+        config_keys = set(config['anchor_parameters'])
+        default_keys = set(AnchorParameters.default.__dict__.keys())
 
-    assert config_keys <= default_keys, \
-        "Malformed config file. These keys are not valid: {}".format(config_keys - default_keys)
+        assert config_keys <= default_keys, \
+            "Malformed config file. These keys are not valid: {}".format(config_keys - default_keys)
+
+    if 'pyramid_levels' in config:
+        assert set(config['pyramid_levels']) == {'levels'}, \
+            "Malformed config file. The pyramid_levels section should only contain levels."
 
     return config
 
@@ -45,3 +50,12 @@ def parse_anchor_parameters(config):
     strides = list(map(int, config['anchor_parameters']['strides'].split(' ')))
 
     return AnchorParameters(sizes, strides, ratios, scales)
+
+
+def parse_pyramid_levels(config):
+    """ Returns the pyramid levels in a config, or None if the config doesn't define them.
+    """
+    if not config or 'pyramid_levels' not in config:
+        return None
+
+    return list(map(int, config['pyramid_levels']['levels'].split(' ')))
@@ -0,0 +1,162 @@
+"""
+Copyright 2017-2019 Fizyr (https://fizyr.com)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import contextlib
+import json
+import os
+import socket
+import subprocess
+
+import tensorflow as tf
+
+
+def free_ports(num_ports, host='localhost'):
+    """ Find ports that are free on a host.
+
+    Args
+        num_ports : The number of ports to find.
+        host      : The host to bind to.
+
+    Returns
+        A list of port numbers.
+    """
+    with contextlib.ExitStack() as stack:
+        sockets = [stack.enter_context(socket.socket(socket.AF_INET, socket.SOCK_STREAM)) for _ in range(num_ports)]
+        for s in sockets:
+            s.bind((host, 0))
+        return [s.getsockname()[1] for s in sockets]
+
+
+def local_worker_hosts(num_workers, host='localhost'):
+    """ Addresses for a cluster of workers running on this machine.
+
+    Args
+        num_workers : The number of workers in the cluster.
+        host        : The host the workers listen on.
+
+    Returns
+        A list of 'host:port' strings, one per worker.
+    """
+    return ['{}:{}'.format(host, port) for port in free_ports(num_workers, host)]
+
+
+def tf_config(worker_hosts, worker_index):
+    """ The TF_CONFIG describing a cluster of workers, as read by tf.distribute.
+
+    Args
+        worker_hosts : A list of 'host:port' strings, one per worker.
+        worker_index : The index of this worker in worker_hosts, worker 0 is the chief.
+
+    Returns
+        A dictionary that should be serialized to json in the TF_CONFIG environment variable.
+    """
+    if not 0 <= worker_index < len(worker_hosts):
+        raise ValueError('Invalid worker index {} for {} workers.'.format(worker_index, len(worker_hosts)))
+
+    return {
+        'cluster' : {'worker': list(worker_hosts)},
+        'task'    : {'type': 'worker', 'index': worker_index},
+    }
+
+
+def multi_worker_strategy(worker_hosts=None, worker_index=0):
+    """ Create a strategy for synchronous data-parallel training across worker processes.
+
+    Every worker trains a replica of the model on its own batches, the gradients are averaged across workers
+    every step. This has to be called before any other TensorFlow operation is executed.
+
+    Args
+        worker_hosts : A list of 'host:port' strings, one per worker. If None, the cluster is read from the TF_CONFIG environment variable.
+        worker_index : The index of this worker in worker_hosts, worker 0 is the chief.
+
+    Returns
+        A tf.distribute.MultiWorkerMirroredStrategy.
+    """
+    if worker_hosts is not None:
+        os.environ['TF_CONFIG'] = json.dumps(tf_config(worker_hosts, worker_index))
+
+    # ring all-reduce works on CPUs, NCCL requires GPUs
+    options = tf.distribute.experimental.CommunicationOptions(implementation=tf.distribute.experimental.CommunicationImplementation.RING)
+    return tf.distribute.MultiWorkerMirroredStrategy(communication_options=options)
+
+
+def worker_index(strategy):
+    """ The index of this worker in the cluster of a strategy.
+    """
+    resolver = getattr(strategy, 'cluster_resolver', None)
+    if resolver is None or resolver.task_id is None:
+        return 0
+    return resolver.task_id
+
+
+def num_workers(strategy):
+    """ The number of workers in the cluster of a strategy.
+    """
+    resolver = getattr(strategy, 'cluster_resolver', None)
+    if resolver is None:
+        return 1
+    return max(1, len(resolver.cluster_spec().as_dict().get('worker', [])))
+
+
+def is_chief(strategy):
+    """ True if this worker should write snapshots, logs and evaluate the model.
+    """
+    return worker_index(strategy) == 0
+
+
+def distribute_dataset(strategy, dataset):
+    """ Distribute a dataset that is already sharded per worker and batched per replica.
+
+    By default tf.distribute shards a dataset between workers and splits every batch between replicas,
+    this feeds the batches of the dataset to the replica of this worker as they are.
+
+    Args
+        strategy : The tf.distribute strategy to distribute the dataset for.
+        dataset  : The tf.data.Dataset with the batches of this worker.
+
+    Returns
+        A tf.distribute.DistributedDataset that can be passed to Model.fit.
+    """
+    if strategy.num_replicas_in_sync != num_workers(strategy):
+        raise ValueError('Expected one replica per worker, got {} replicas for {} workers.'.format(strategy.num_replicas_in_sync, num_workers(strategy)))
+
+    return strategy.distribute_datasets_from_function(lambda input_context: dataset)
+
+
+def launch_local_workers(command, num_workers, host='localhost'):
+    """ Launch a cluster of worker processes on this machine and wait for them to finish.
+
+    Args
+        command     : A function that returns the command line of a worker, given the list of worker hosts and its index.
+        num_workers : The number of worker processes to launch.
+        host        : The host the workers listen on.
+
+    Returns
+        The exit codes of the workers.
+    """
+    worker_hosts = local_worker_hosts(num_workers, host)
+
+    # the workers describe the cluster on their command line, don't let them pick up another cluster
+    env = dict(os.environ)
+    env.pop('TF_CONFIG', None)
+
+    processes = [subprocess.Popen(command(worker_hosts, index), env=env) for index in range(num_workers)]
+    try:
+        return [process.wait() for process in processes]
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
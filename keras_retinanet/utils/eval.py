@@ -14,7 +14,7 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
-from .anchors import compute_overlap
+from .anchors import compute_max_overlap
 from .visualization import draw_detections, draw_annotations
 
 import keras
@@ -198,9 +198,8 @@ def evaluate(
                     true_positives  = np.append(true_positives, 0)
                     continue
 
-                overlaps            = compute_overlap(np.expand_dims(d, axis=0), annotations)
-                assigned_annotation = np.argmax(overlaps, axis=1)
-                max_overlap         = overlaps[0, assigned_annotation]
+                assigned_annotation, max_overlap = compute_max_overlap(np.expand_dims(d, axis=0), annotations)
+                assigned_annotation, max_overlap = assigned_annotation[0], max_overlap[0]
 
                 if max_overlap >= iou_threshold and assigned_annotation not in detected_annotations:
                     false_positives = np.append(false_positives, 0)
@@ -0,0 +1,430 @@
+"""
+Copyright 2017-2018 Fizyr (https://fizyr.com)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+
+import cv2
+import keras
+import numpy as np
+import tensorflow
+
+from .compute_overlap import compute_overlap
+from .image import compute_resize_scale, preprocess_image
+
+"""
+Preprocessing modes of the serving signatures, see utils.image.preprocess_image ('none' expects preprocessed images).
+"""
+PREPROCESS_MODES = ['caffe', 'tf', 'none']
+
+"""
+Supported post-training quantization modes for TFLite export.
+"""
+TFLITE_QUANTIZATIONS = ['none', 'dynamic', 'int8']
+
+# mean values subtracted in 'caffe' mode, in BGR order
+_CAFFE_MEAN = [103.939, 116.779, 123.68]
+
+
+def backbone_preprocess_mode(backbone_name):
+    """ Returns the preprocessing mode used by a backbone.
+
+    Raises
+        ValueError: if the backbone uses a preprocessing that can't be expressed as a mode.
+    """
+    if any(name in backbone_name for name in ('seresnet', 'seresnext', 'senet', 'EfficientNet')):
+        raise ValueError('The preprocessing of backbone {} is not supported, pass the preprocess mode explicitly.'.format(backbone_name))
+    if 'resnet' in backbone_name or 'vgg' in backbone_name:
+        return 'caffe'
+    if 'mobilenet' in backbone_name or 'densenet' in backbone_name:
+        return 'tf'
+    raise ValueError('Unknown backbone {}, pass the preprocess mode explicitly.'.format(backbone_name))
+
+
+def _static_image_shape(model):
+    """ Returns the (height, width) the model was built for, or None if it accepts any image size.
+    """
+    if keras.backend.image_data_format() == 'channels_first':
+        raise ValueError('Exporting models with channels_first data format is not supported.')
+
+    shape = tuple(keras.backend.int_shape(model.inputs[0])[1:3])
+    return None if None in shape else shape
+
+
+def _filter_layer(model):
+    try:
+        return model.get_layer('filtered_detections')
+    except ValueError:
+        return None
+
+
+def _check_graph_only(model):
+    """ Raise a ValueError if the model uses NumPy post-processing, which can't be exported to a graph.
+    """
+    layer = _filter_layer(model)
+    if layer is not None and layer.nms and layer.nms_method in ('soft_linear', 'wbf'):
+        raise ValueError('nms_method {} runs in NumPy and can\'t be exported, use standard, combined or soft_gaussian.'.format(layer.nms_method))
+
+
+def serving_function(model, preprocess_mode='caffe', image_min_side=800, image_max_side=1333, input_shape=(None, None, None, 3)):
+    """ Wrap an inference model in a tf.function that takes raw images.
+
+    The function takes a batch of uint8 BGR images of the same size, preprocesses and resizes them like the generators do
+    (or resizes them to the input size of a static shape model) and scales the detected boxes back to the original image size.
+
+    Args
+        model           : A RetinaNet inference model (see models.convert_model).
+        preprocess_mode : One of 'caffe', 'tf' or 'none' (see utils.image.preprocess_image).
+        image_min_side  : The image's min side after resizing, for models without a static shape.
+        image_max_side  : The image's max side after resizing, for models without a static shape.
+        input_shape     : Shape of the 'images' input of the function.
+
+    Returns
+        A tf.function returning a dictionary with 'boxes', 'scores', 'labels' and 'other_<i>' for additional model outputs.
+    """
+    if preprocess_mode not in PREPROCESS_MODES:
+        raise ValueError('Invalid preprocess_mode {}, expected one of {}.'.format(preprocess_mode, PREPROCESS_MODES))
+
+    static_shape = _static_image_shape(model)
+    floatx       = keras.backend.floatx()
+
+    @tensorflow.function(input_signature=[tensorflow.TensorSpec(input_shape, tensorflow.uint8, name='images')])
+    def serve(images):
+        x = tensorflow.cast(images, floatx)
+        if preprocess_mode == 'caffe':
+            x = x - tensorflow.constant(_CAFFE_MEAN, dtype=floatx)
+        elif preprocess_mode == 'tf':
+            x = x / 127.5 - 1.
+
+        size = tensorflow.cast(tensorflow.shape(images)[1:3], floatx)
+        if static_shape is not None:
+            scale = tensorflow.constant(static_shape, dtype=floatx) / size
+            x     = tensorflow.image.resize(x, static_shape)
+        else:
+            scale = tensorflow.minimum(image_min_side / tensorflow.reduce_min(size), image_max_side / tensorflow.reduce_max(size))
+            scale = tensorflow.stack([scale, scale])
+
+            # unlike tf.image.resize, this samples with the exact scale like cv2.resize(fx=scale, fy=scale) in resize_image
+            x = tensorflow.raw_ops.ScaleAndTranslate(
+                images      = x,
+                size        = tensorflow.cast(tensorflow.round(size * scale), tensorflow.int32),
+                scale       = tensorflow.cast(scale, tensorflow.float32),
+                translation = tensorflow.zeros([2], tensorflow.float32),
+                kernel_type = 'triangle',
+                antialias   = False,
+            )
+
+        outputs = model(x, training=False)
+        boxes, scores, labels = outputs[:3]
+
+        # scale the boxes back to the original image, keeping the padding at -1
+        boxes = tensorflow.where(
+            labels[..., None] < 0,
+            boxes,
+            boxes / tensorflow.concat([scale[::-1], scale[::-1]], axis=0)
+        )
+
+        result = {'boxes': boxes, 'scores': scores, 'labels': labels}
+        for i, other in enumerate(outputs[3:]):
+            result['other_{}'.format(i)] = other
+        return result
+
+    return serve
+
+
+def export_saved_model(model, path, **kwargs):
+    """ Export an inference model as a SavedModel.
+
+    The 'serving_default' signature takes raw uint8 BGR images, see serving_function.
+
+    Args
+        model    : A RetinaNet inference model.
+        path     : Directory to write the SavedModel to.
+        **kwargs : Passed to serving_function.
+    """
+    _check_graph_only(model)
+
+    module       = tensorflow.Module()
+    module.model = model
+    module.serve = serving_function(model, **kwargs)
+    tensorflow.saved_model.save(module, path, signatures={'serving_default': module.serve.get_concrete_function()})
+
+
+def load_saved_model(path):
+    """ Load a SavedModel written by export_saved_model.
+
+    Returns
+        A function taking a np.array of uint8 BGR images and returning a dictionary of np.array.
+    """
+    serve = tensorflow.saved_model.load(path).signatures['serving_default']
+
+    def predict(images):
+        return {name: value.numpy() for name, value in serve(images=tensorflow.constant(images, dtype=tensorflow.uint8)).items()}
+
+    return predict
+
+
+def _optimize_graph_def(graph_def, graph, outputs):
+    """ Optimize a frozen GraphDef with grappler (constant folding, arithmetic and layout optimizations, ...).
+    """
+    from tensorflow.core.protobuf import config_pb2, meta_graph_pb2
+    from tensorflow.python.grappler import tf_optimizer
+
+    meta_graph = tensorflow.compat.v1.train.export_meta_graph(graph_def=graph_def, graph=graph)
+
+    # grappler keeps the nodes in the 'train_op' collection
+    fetch_collection = meta_graph_pb2.CollectionDef()
+    fetch_collection.node_list.value.extend(outputs)
+    meta_graph.collection_def['train_op'].CopyFrom(fetch_collection)
+
+    config   = config_pb2.ConfigProto()
+    rewriter = config.graph_options.rewrite_options
+    rewriter.optimizers.extend(['function', 'constfold', 'shape', 'arithmetic', 'dependency', 'loop', 'remap', 'constfold'])
+    rewriter.meta_optimizer_iterations = 2
+
+    return tf_optimizer.OptimizeGraph(config, meta_graph)
+
+
+def export_frozen_graph(model, path, optimize=True, **kwargs):
+    """ Export an inference model as a frozen (and optionally optimized) GraphDef.
+
+    Variables are converted to constants, so the graph can be loaded without Keras or custom objects.
+    The input node is called 'images' and the output nodes are named after the keys returned by serving_function.
+
+    Args
+        model    : A RetinaNet inference model.
+        path     : Path of the .pb file to write.
+        optimize : Whether to optimize the frozen graph with grappler.
+        **kwargs : Passed to serving_function.
+    """
+    from tensorflow.python.framework.convert_to_constants import convert_variables_to_constants_v2
+
+    _check_graph_only(model)
+
+    concrete_function = serving_function(model, **kwargs).get_concrete_function()
+    frozen_function   = convert_variables_to_constants_v2(concrete_function)
+    graph_def         = frozen_function.graph.as_graph_def()
+
+    # rename the output nodes after the outputs of the serving function, which are flattened in order of their keys
+    output_names = sorted(concrete_function.structured_outputs)
+    names        = {tensor.name.split(':')[0]: name for tensor, name in zip(frozen_function.outputs, output_names)}
+    for node in graph_def.node:
+        if node.name in names:
+            node.name = names[node.name]
+
+    if optimize:
+        graph_def = _optimize_graph_def(graph_def, frozen_function.graph, sorted(names.values()))
+
+    tensorflow.io.write_graph(graph_def, os.path.dirname(os.path.abspath(path)), os.path.basename(path), as_text=False)
+
+
+def load_frozen_graph(path):
+    """ Load a frozen graph written by export_frozen_graph.
+
+    Returns
+        A function taking a np.array of uint8 BGR images and returning a dictionary of np.array.
+    """
+    graph_def = tensorflow.compat.v1.GraphDef()
+    with open(path, 'rb') as f:
+        graph_def.ParseFromString(f.read())
+
+    names   = [node.name for node in graph_def.node if node.name in ('boxes', 'scores', 'labels') or node.name.startswith('other_')]
+    wrapped = tensorflow.compat.v1.wrap_function(lambda: tensorflow.compat.v1.import_graph_def(graph_def, name=''), [])
+    graph   = wrapped.graph
+    pruned  = wrapped.prune(graph.get_tensor_by_name('images:0'), [graph.get_tensor_by_name(name + ':0') for name in names])
+
+    def predict(images):
+        return {name: value.numpy() for name, value in zip(names, pruned(tensorflow.constant(images, dtype=tensorflow.uint8)))}
+
+    return predict
+
+
+def export_tflite(model, path, quantization='none', representative_images=None, **kwargs):
+    """ Export an inference model to TFLite, optionally with post-training quantization.
+
+    TFLite can't run the per image while loop of FilterDetections when there are no detections, so the model should
+    have a static image shape (see models.convert_model) and use nms_method='combined'. The NMS ops are exported as
+    select TensorFlow ops, so the interpreter needs the Flex delegate (included in the tensorflow pip package).
+
+    Args
+        model                 : A RetinaNet inference model with a static image shape.
+        path                  : Path of the .tflite file to write.
+        quantization          : One of 'none', 'dynamic' (weights are quantized to int8) or
+                                'int8' (weights and activations are quantized to int8, calibrated on representative_images).
+        representative_images : Iterable of uint8 BGR images used to calibrate 'int8' quantization.
+        **kwargs              : Passed to serving_function.
+    """
+    if quantization not in TFLITE_QUANTIZATIONS:
+        raise ValueError('Invalid quantization {}, expected one of {}.'.format(quantization, TFLITE_QUANTIZATIONS))
+    if quantization == 'int8' and representative_images is None:
+        raise ValueError('int8 quantization requires representative images.')
+
+    _check_graph_only(model)
+    static_shape = _static_image_shape(model)
+    if static_shape is None:
+        raise ValueError('TFLite export requires a model with a static image shape.')
+    layer = _filter_layer(model)
+    if layer is not None and not (layer.nms and layer.class_specific_filter and layer.nms_method == 'combined'):
+        raise ValueError('TFLite export requires a model with nms_method=\'combined\' and class specific filtering.')
+
+    concrete_function = serving_function(model, input_shape=(1, None, None, 3), **kwargs).get_concrete_function()
+
+    representative_dataset = None
+    if quantization == 'int8':
+        def representative_dataset():
+            for image in representative_images:
+                yield [cv2.resize(image, static_shape[::-1])[None].astype(np.uint8)]
+
+    write_tflite(concrete_function, model, path, quantization=quantization, representative_dataset=representative_dataset)
+
+
+def write_tflite(concrete_function, model, path, quantization='none', representative_dataset=None):
+    """ Convert a concrete function of a model to TFLite and write it to a file.
+
+    Ops without a TFLite builtin (ie. the NMS ops) are converted as select TensorFlow ops and tensor lists are kept,
+    because lowering them fails for the while loops of the filtering.
+
+    Args
+        concrete_function      : The concrete function to convert.
+        model                  : The model that the variables of the concrete function belong to.
+        path                   : Path of the .tflite file to write.
+        quantization           : One of 'none', 'dynamic' (weights are quantized to int8) or
+                                 'int8' (weights and activations are quantized to int8, calibrated on representative_dataset).
+        representative_dataset : Function returning an iterable of lists of inputs of the concrete function, used to calibrate 'int8' quantization.
+    """
+    converter = tensorflow.lite.TFLiteConverter.from_concrete_functions([concrete_function], model)
+    converter.target_spec.supported_ops = [tensorflow.lite.OpsSet.TFLITE_BUILTINS, tensorflow.lite.OpsSet.SELECT_TF_OPS]
+    converter._experimental_lower_tensor_list_ops = False
+
+    if quantization != 'none':
+        converter.optimizations = [tensorflow.lite.Optimize.DEFAULT]
+    if quantization == 'int8':
+        converter.representative_dataset = representative_dataset
+
+    with open(path, 'wb') as f:
+        f.write(converter.convert())
+
+
+def load_tflite(path, num_threads=None):
+    """ Load a TFLite model written by export_tflite.
+
+    Returns
+        A function taking a np.array of a single uint8 BGR image (shape (1, height, width, 3)) and returning a dictionary of np.array.
+    """
+    interpreter = tensorflow.lite.Interpreter(model_path=path, num_threads=num_threads)
+    runner      = interpreter.get_signature_runner()
+
+    def predict(images):
+        return runner(images=np.asarray(images, dtype=np.uint8))
+
+    return predict
+
+
+def predict_keras(model, image, preprocess_mode='caffe', image_min_side=800, image_max_side=1333):
+    """ Run a Keras inference model on a uint8 BGR image, preprocessing it the way the generators do.
+
+    Returns
+        A dictionary like the serving functions return, for a batch of one image.
+    """
+    static_shape = _static_image_shape(model)
+
+    x = image if preprocess_mode == 'none' else preprocess_image(image, mode=preprocess_mode)
+    x = x.astype(keras.backend.floatx())
+    if static_shape is not None:
+        scale = np.array([static_shape[1] / image.shape[1], static_shape[0] / image.shape[0]])
+        x     = cv2.resize(x, static_shape[::-1])
+    else:
+        scale = compute_resize_scale(image.shape, min_side=image_min_side, max_side=image_max_side)
+        x     = cv2.resize(x, None, fx=scale, fy=scale)
+        scale = np.array([scale, scale])
+
+    outputs = model.predict_on_batch(x[None])
+    boxes, scores, labels = outputs[:3]
+    boxes = np.where(labels[..., None] < 0, boxes, boxes / np.tile(scale, 2))
+
+    result = {'boxes': boxes, 'scores': scores, 'labels': labels}
+    for i, other in enumerate(outputs[3:]):
+        result['other_{}'.format(i)] = other
+    return result
+
+
+def compare_detections(expected, actual, score_threshold=0.05, iou_threshold=0.5):
+    """ Compare the detections of an exported model with those of the Keras model for a single image.
+
+    Every expected detection with a score of at least score_threshold is matched with the actual detection
+    of the same label that overlaps most with it (if the overlap is at least iou_threshold).
+
+    Args
+        expected        : Dictionary with 'boxes', 'scores' and 'labels' of the reference model, for a batch of one image.
+        actual          : Dictionary with 'boxes', 'scores' and 'labels' of the exported model, for a batch of one image.
+        score_threshold : Minimum score of the detections to compare.
+        iou_threshold   : Minimum IoU to match two detections.
+
+    Returns
+        A dictionary with the number of expected 'detections', the number of 'matched' detections and the
+        'max_score_difference' and 'max_box_difference' (in pixels) of the matched detections.
+    """
+    def _valid(detections):
+        keep = (detections['scores'][0] >= score_threshold) & (detections['labels'][0] >= 0)
+        return detections['boxes'][0][keep].astype(np.float64), detections['scores'][0][keep], detections['labels'][0][keep]
+
+    expected_boxes, expected_scores, expected_labels = _valid(expected)
+    actual_boxes, actual_scores, actual_labels       = _valid(actual)
+
+    result = {'detections': len(expected_scores), 'matched': 0, 'max_score_difference': 0.0, 'max_box_difference': 0.0}
+    if not len(expected_scores) or not len(actual_scores):
+        return result
+
+    overlaps = compute_overlap(expected_boxes, actual_boxes)
+    overlaps[expected_labels[:, None] != actual_labels[None, :]] = 0
+    for i in range(len(expected_scores)):
+        j = np.argmax(overlaps[i])
+        if overlaps[i, j] < iou_threshold:
+            continue
+        result['matched'] += 1
+        result['max_score_difference'] = max(result['max_score_difference'], float(abs(expected_scores[i] - actual_scores[j])))
+        result['max_box_difference']   = max(result['max_box_difference'], float(np.max(np.abs(expected_boxes[i] - actual_boxes[j]))))
+
+    return result
+
+
+def check_parity(model, predict, images, preprocess_mode='caffe', image_min_side=800, image_max_side=1333, **kwargs):
+    """ Compare an exported model with the Keras model on sample images.
+
+    Args
+        model           : The Keras inference model that was exported.
+        predict         : Prediction function of the exported model (see load_saved_model, load_frozen_graph and load_tflite).
+        images          : Iterable of uint8 BGR images.
+        preprocess_mode : Preprocessing mode the model was exported with.
+        image_min_side  : The image's min side after resizing, as used for the export.
+        image_max_side  : The image's max side after resizing, as used for the export.
+        **kwargs        : Passed to compare_detections.
+
+    Returns
+        The results of compare_detections, summed (or maximized) over all images.
+    """
+    total = {'images': 0, 'detections': 0, 'matched': 0, 'max_score_difference': 0.0, 'max_box_difference': 0.0}
+    for image in images:
+        expected = predict_keras(model, image, preprocess_mode=preprocess_mode, image_min_side=image_min_side, image_max_side=image_max_side)
+        actual   = predict(image[None])
+        result   = compare_detections(expected, actual, **kwargs)
+
+        total['images']               += 1
+        total['detections']           += result['detections']
+        total['matched']              += result['matched']
+        total['max_score_difference']  = max(total['max_score_difference'], result['max_score_difference'])
+        total['max_box_difference']    = max(total['max_box_difference'], result['max_box_difference'])
+
+    return total
@@ -15,6 +15,7 @@ limitations under the License.
 """
 
 from __future__ import division
+import math
 import numpy as np
 import cv2
 from PIL import Image
@@ -33,6 +34,33 @@ def read_image_bgr(path):
     return image[:, :, ::-1].copy()
 
 
+def read_image_bgr_reduced(path, min_side=800, max_side=1333):
+    """ Read an image in BGR format, decoding it at a reduced resolution if it will be downscaled anyway.
+
+    JPEG images can be decoded at 1/2, 1/4 or 1/8 of their size (DCT scaling), which is a lot faster and uses less memory
+    than decoding them at full resolution. The reduction is chosen such that the decoded image is still at least as large
+    as it will be after resizing with min_side and max_side. Other formats are decoded at full resolution.
+
+    Args
+        path     : Path to the image.
+        min_side : The image's min side after resizing (see resize_image).
+        max_side : The image's max side after resizing (see resize_image).
+
+    Returns
+        The image and a tuple (scale_x, scale_y) with the ratio between the decoded and the original image size.
+    """
+    image = Image.open(path)
+    width, height = image.size
+
+    scale = compute_resize_scale((height, width, 3), min_side=min_side, max_side=max_side)
+    if scale < 1:
+        # draft only has an effect for JPEG images and never decodes below the requested size
+        image.draft('RGB', (int(math.ceil(width * scale)), int(math.ceil(height * scale))))
+
+    image = np.asarray(image.convert('RGB'))[:, :, ::-1].copy()
+    return image, (image.shape[1] / width, image.shape[0] / height)
+
+
 def preprocess_image(x, mode='caffe'):
     """ Preprocess an image by subtracting the ImageNet mean.
 
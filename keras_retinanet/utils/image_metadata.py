@@ -0,0 +1,157 @@
+"""
+Copyright 2017-2018 Fizyr (https://fizyr.com)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+import os
+import warnings
+from multiprocessing.pool import ThreadPool
+
+from PIL import Image
+
+
+def metadata_path_for(path):
+    """ Returns the path of the metadata index that belongs to an annotations file.
+
+    For example, 'data/train.csv' maps to 'data/train.metadata.json'.
+    """
+    return os.path.splitext(path)[0] + '.metadata.json'
+
+
+def read_image_metadata(path):
+    """ Read the width, height, file size and modification time of an image.
+
+    Only the image header is read, the image itself is not decoded.
+
+    Args
+        path: Path to the image.
+
+    Returns
+        A dictionary with the keys 'width', 'height', 'size' and 'mtime'.
+    """
+    stat  = os.stat(path)
+    image = Image.open(path)
+    try:
+        width, height = image.size
+    finally:
+        image.close()
+
+    return {
+        'width'  : width,
+        'height' : height,
+        'size'   : stat.st_size,
+        'mtime'  : stat.st_mtime,
+    }
+
+
+class ImageMetadataIndex(object):
+    """ Index of image metadata (width, height, file size and modification time).
+
+    The index is built in parallel and persisted as JSON, so that subsequent runs only need to stat each image.
+    An entry is read again when the modification time or the size of its image changed. If the paths of the images
+    are given when creating the index, it is updated for them when it is first used.
+    """
+
+    def __init__(self, index_path=None, workers=16, paths=None):
+        """ Initialize an image metadata index.
+
+        Args
+            index_path : Path where the index is persisted. If None, the index is kept in memory only.
+            workers    : Number of threads used to read the metadata of images.
+            paths      : Paths of the images to update the index for on first use (see update). If None, the index is not updated.
+        """
+        self.index_path = index_path
+        self.workers    = workers
+        self.paths      = paths
+        self.entries    = {}
+
+        if self.index_path is not None and os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r') as f:
+                    self.entries = json.load(f)
+            except (IOError, ValueError) as e:
+                warnings.warn('Ignoring invalid image metadata index {}: {}'.format(self.index_path, e))
+
+    def _key(self, path):
+        """ Key used to store an image path, relative to the location of the index.
+        """
+        if self.index_path is None:
+            return path
+        return os.path.relpath(path, os.path.dirname(os.path.abspath(self.index_path)))
+
+    def _update_entry(self, path):
+        """ Returns (key, entry, changed) for an image, reusing the cached entry if it is still valid.
+        """
+        key = self._key(path)
+        try:
+            stat  = os.stat(path)
+            entry = self.entries.get(key)
+            if entry is not None and entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size:
+                return key, entry, False
+
+            return key, read_image_metadata(path), True
+        except (IOError, OSError):
+            # missing or unreadable images fail when they are actually used
+            return key, None, False
+
+    def update(self, paths):
+        """ Make sure the index contains valid entries for all paths and persist it if anything changed.
+
+        Entries for images that are not in paths are removed from the index.
+        """
+        self.paths = None
+
+        pool = ThreadPool(max(1, self.workers))
+        try:
+            results = pool.map(self._update_entry, paths)
+        finally:
+            pool.close()
+            pool.join()
+
+        entries = dict((key, entry) for key, entry, _ in results if entry is not None)
+        changed = set(entries.keys()) != set(self.entries.keys()) or any(c for _, _, c in results)
+
+        self.entries = entries
+        if changed and self.index_path is not None:
+            self.save()
+
+    def save(self):
+        """ Persist the index to index_path.
+        """
+        temp_path = self.index_path + '.tmp'
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(self.entries, f)
+            os.rename(temp_path, self.index_path)
+        except (IOError, OSError) as e:
+            warnings.warn('Could not save image metadata index {}: {}'.format(self.index_path, e))
+
+    def get(self, path):
+        """ Returns the metadata for an image, reading it from disk if it is not in the index.
+        """
+        if self.paths is not None:
+            self.update(self.paths)
+
+        entry = self.entries.get(self._key(path))
+        if entry is None:
+            entry = read_image_metadata(path)
+            self.entries[self._key(path)] = entry
+        return entry
+
+    def aspect_ratio(self, path):
+        """ Returns the aspect ratio (width / height) of an image.
+        """
+        entry = self.get(path)
+        return float(entry['width']) / float(entry['height'])
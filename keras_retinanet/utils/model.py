@@ -14,6 +14,13 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import hashlib
+import json
+
+import keras
+import numpy as np
+import tensorflow
+
 
 def freeze(model):
     """ Set all layers in a model to non-trainable.
@@ -26,3 +33,233 @@ def freeze(model):
     for layer in model.layers:
         layer.trainable = False
     return model
+
+
+class GradientAccumulationModel(keras.models.Model):
+    """ Training model that sums the gradients of accumulation_steps batches and applies their mean with the optimizer.
+
+    This trains with the effective batch size of accumulation_steps batches, while only one batch is in memory.
+    The optimizer is used as usual, only less often, so gradient clipping (clipnorm) applies to the mean gradient
+    and callbacks like ReduceLROnPlateau can change its learning rate. Epochs and steps still count single batches.
+
+    The layers are shared with the wrapped model, so that model can be saved and used for prediction as usual.
+
+    Training in the scope of a tf.distribute strategy isn't supported: the optimizer step is applied conditionally and
+    the strategies can't aggregate the gradients of the replicas inside a conditional.
+
+    Args
+        model              : The model to train.
+        accumulation_steps : Number of batches to accumulate the gradients of before every optimizer step.
+    """
+    def __init__(self, model, accumulation_steps):
+        if accumulation_steps < 1:
+            raise ValueError('accumulation_steps should be at least 1, received {}.'.format(accumulation_steps))
+        if tensorflow.distribute.has_strategy():
+            raise ValueError('Gradient accumulation can\'t be used in the scope of a tf.distribute strategy ({}).'.format(
+                type(tensorflow.distribute.get_strategy()).__name__
+            ))
+
+        super(GradientAccumulationModel, self).__init__(inputs=model.inputs, outputs=model.outputs, name=model.name)
+        self.accumulation_steps = accumulation_steps
+
+        self.accumulated_step      = tensorflow.Variable(tensorflow.constant(0, dtype=tensorflow.int64), trainable=False)
+        self.accumulated_gradients = [tensorflow.Variable(tensorflow.zeros_like(variable), trainable=False) for variable in self.trainable_variables]
+
+    def train_step(self, data):
+        x, y, sample_weight = tensorflow.keras.utils.unpack_x_y_sample_weight(data)
+        loss_scale          = isinstance(self.optimizer, keras.mixed_precision.LossScaleOptimizer)
+
+        with tensorflow.GradientTape() as tape:
+            y_pred = self(x, training=True)
+            loss   = self.compute_loss(x, y, y_pred, sample_weight)
+            if loss_scale:
+                loss = self.optimizer.get_scaled_loss(loss)
+
+        gradients = tape.gradient(loss, self.trainable_variables)
+        if loss_scale:
+            gradients = self.optimizer.get_unscaled_gradients(gradients)
+
+        for accumulated, gradient in zip(self.accumulated_gradients, gradients):
+            if gradient is not None:
+                accumulated.assign_add(tensorflow.convert_to_tensor(gradient))
+        self.accumulated_step.assign_add(1)
+
+        def apply_gradients():
+            self.optimizer.apply_gradients(
+                (accumulated / self.accumulation_steps, variable) for accumulated, variable in zip(self.accumulated_gradients, self.trainable_variables)
+            )
+            for accumulated in self.accumulated_gradients:
+                accumulated.assign(tensorflow.zeros_like(accumulated))
+            return tensorflow.constant(True)
+
+        tensorflow.cond(
+            tensorflow.equal(self.accumulated_step % self.accumulation_steps, 0),
+            apply_gradients,
+            lambda: tensorflow.constant(False),
+        )
+
+        return self.compute_metrics(x, y, y_pred, sample_weight)
+
+
+def file_hash(path, block_size=1 << 20):
+    """ Returns the SHA-1 hex digest of the contents of a file.
+    """
+    hasher = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def _decode(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+def saved_model_config(filepath):
+    """ Read the architecture of a model saved as .h5, without deserializing the model.
+
+    Returns
+        The model config as returned by model.get_config(), wrapped in {'class_name': ..., 'config': ...}.
+
+    Raises
+        ValueError: if the file contains no model config (for example because it only contains weights).
+    """
+    import h5py
+
+    with h5py.File(filepath, 'r') as f:
+        config = f.attrs.get('model_config')
+    if config is None:
+        raise ValueError('No model config found in {}.'.format(filepath))
+    return json.loads(_decode(config))
+
+
+def _iter_layer_configs(config):
+    """ Yield the configs of all layers of a model config, including the layers of nested models.
+    """
+    for layer in config['config']['layers']:
+        yield layer
+        if 'layers' in layer['config']:
+            yield from _iter_layer_configs(layer)
+
+
+def rebuild_model(filepath, backbone_name='resnet50', mmap=False):
+    """ Load a RetinaNet model saved as .h5 by rebuilding its architecture and loading only the weights.
+
+    The number of classes, pyramid levels and anchors and the settings of the inference layers are read from the
+    saved model config, the architecture is then created with Backbone.retinanet (and retinanet_bbox for inference models).
+    This avoids deserializing the full Keras graph, which is slow for large backbones.
+
+    Args
+        filepath      : Path to a model saved with model.save.
+        backbone_name : Backbone with which the model was trained.
+        mmap          : Read the weights through a memory map of the file (see load_weights).
+
+    Returns
+        A keras.models.Model object.
+
+    Raises
+        ValueError: if the saved model isn't a RetinaNet model with the default submodels of the given backbone.
+    """
+    from .. import layers
+    from ..models import backbone
+    from ..models.retinanet import retinanet_bbox
+    from .anchors import AnchorParameters, DEFAULT_PYRAMID_LEVELS
+
+    config        = saved_model_config(filepath)
+    layer_configs = {}
+    for layer in _iter_layer_configs(config):
+        layer_configs.setdefault(layer['config']['name'], layer['config'])
+
+    if 'pyramid_regression' not in layer_configs or 'pyramid_classification_reshape' not in layer_configs:
+        raise ValueError('Model {} doesn\'t use the default regression and classification submodels.'.format(filepath))
+
+    num_anchors    = layer_configs['pyramid_regression']['filters'] // 4
+    num_classes    = layer_configs['pyramid_classification_reshape']['target_shape'][-1]
+    pyramid_levels = [level for level in DEFAULT_PYRAMID_LEVELS if 'P{}'.format(level) in layer_configs]
+
+    model = backbone(backbone_name).retinanet(num_classes, num_anchors=num_anchors, pyramid_levels=pyramid_levels)
+
+    if 'filtered_detections' in layer_configs:
+        anchors       = [layer_configs['anchors_{}'.format(i)] for i in range(len(pyramid_levels))]
+        anchor_params = AnchorParameters(
+            sizes   = [anchor['size'] for anchor in anchors],
+            strides = [anchor['stride'] for anchor in anchors],
+            ratios  = np.array(anchors[0]['ratios'], keras.backend.floatx()),
+            scales  = np.array(anchors[0]['scales'], keras.backend.floatx()),
+        )
+
+        # the input of a static shape model is the first layer of the outer model
+        input_config = config['config']['layers'][0]['config']
+        image_shape  = input_config['batch_input_shape'][1:3] if keras.backend.image_data_format() == 'channels_last' else input_config['batch_input_shape'][2:4]
+        if None in image_shape:
+            image_shape = None
+
+        filter_config = layer_configs['filtered_detections']
+        model = retinanet_bbox(
+            model          = model,
+            anchor_params  = anchor_params,
+            pyramid_levels = pyramid_levels,
+            pre_nms_top_k  = layer_configs['top_k_per_level']['k'] if 'top_k_per_level' in layer_configs else None,
+            image_shape    = image_shape,
+        )
+
+        # recreate the filter layer with all of its saved settings
+        outputs = layers.FilterDetections.from_config(filter_config)(model.get_layer('filtered_detections').input)
+        model   = keras.models.Model(inputs=model.inputs, outputs=outputs, name=config['config']['name'])
+
+    load_weights(model, filepath, mmap=mmap)
+    return model
+
+
+def _read_dataset(filepath, dataset, mmap):
+    """ Read a h5py dataset, through a memory map of the file if it is stored contiguously and uncompressed.
+    """
+    offset = dataset.id.get_offset()
+    if not mmap or offset is None or dataset.chunks is not None or dataset.shape == ():
+        return dataset[()]
+    return np.memmap(filepath, dtype=dataset.dtype, mode='r', offset=offset, shape=dataset.shape)
+
+
+def load_weights(model, filepath, mmap=False):
+    """ Load the weights of a model saved as .h5 into a model with the same architecture.
+
+    Like model.load_weights, the layers with weights are matched in topological order.
+
+    Args
+        model    : The model to load the weights into.
+        filepath : Path to a model or weights saved as .h5.
+        mmap     : Read the weights through a memory map of the file instead of copying them through h5py,
+                   so only the pages that are used are read from disk.
+
+    Raises
+        ValueError: if the saved weights don't match the layers of the model.
+    """
+    import h5py
+
+    with h5py.File(filepath, 'r') as f:
+        if 'layer_names' not in f.attrs and 'model_weights' in f:
+            f = f['model_weights']
+
+        groups = [f[_decode(name)] for name in f.attrs['layer_names']]
+        groups = [group for group in groups if len(group.attrs['weight_names'])]
+        model_layers = [layer for layer in model.layers if layer.weights]
+        if len(groups) != len(model_layers):
+            raise ValueError('Saved model contains {} layers with weights, but the model has {} layers with weights.'.format(len(groups), len(model_layers)))
+
+        weight_values = []
+        for layer, group in zip(model_layers, groups):
+            # same order as keras uses when saving
+            weights = layer.trainable_weights + layer.non_trainable_weights
+            names   = [_decode(name) for name in group.attrs['weight_names']]
+            if len(weights) != len(names):
+                raise ValueError('Layer {} has {} weights, but {} weights were saved.'.format(layer.name, len(weights), len(names)))
+
+            for weight, name in zip(weights, names):
+                value = _read_dataset(filepath, group[name], mmap)
+                if tuple(weight.shape) != value.shape:
+                    raise ValueError('Weight {} of layer {} has shape {}, but the saved weight has shape {}.'.format(
+                        weight.name, layer.name, tuple(weight.shape), value.shape
+                    ))
+                weight_values.append((weight, value))
+
+        keras.backend.batch_set_value(weight_values)
@@ -0,0 +1,234 @@
+"""
+Copyright 2017-2018 Fizyr (https://fizyr.com)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+cimport cython
+from libc.math cimport exp
+import numpy as np
+cimport numpy as np
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef inline double _iou(const double[:, ::1] a, Py_ssize_t i, double area_a, const double[:, ::1] b, Py_ssize_t j, double area_b) nogil:
+    """ IoU of a[i] and b[j] without the + 1 of compute_overlap, the same way tf.image.non_max_suppression computes it.
+    """
+    cdef double iw, ih, inter, union
+    iw = min(a[i, 2], b[j, 2]) - max(a[i, 0], b[j, 0])
+    if iw <= 0:
+        return 0
+    ih = min(a[i, 3], b[j, 3]) - max(a[i, 1], b[j, 1])
+    if ih <= 0:
+        return 0
+    inter = iw * ih
+    union = area_a + area_b - inter
+    if union <= 0:
+        return 0
+    return inter / union
+
+
+cdef double[::1] _areas(const double[:, ::1] boxes):
+    return (np.asarray(boxes[:, 2]) - np.asarray(boxes[:, 0])) * (np.asarray(boxes[:, 3]) - np.asarray(boxes[:, 1]))
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef inline bint _higher(const double[::1] keys, const Py_ssize_t[::1] heap, Py_ssize_t a, Py_ssize_t b) nogil:
+    """ Heap order, higher scores first and the lowest index first for equal scores.
+    """
+    return keys[heap[a]] > keys[heap[b]] or (keys[heap[a]] == keys[heap[b]] and heap[a] < heap[b])
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef void _sift_down(const double[::1] keys, Py_ssize_t[::1] heap, Py_ssize_t size, Py_ssize_t i) nogil:
+    cdef Py_ssize_t child, tmp
+    while True:
+        child = 2 * i + 1
+        if child >= size:
+            return
+        if child + 1 < size and _higher(keys, heap, child + 1, child):
+            child += 1
+        if not _higher(keys, heap, child, i):
+            return
+        tmp = heap[i]; heap[i] = heap[child]; heap[child] = tmp
+        i = child
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def soft_nms(boxes, scores, method='linear', double iou_threshold=0.5, double sigma=0.5, double score_threshold=0.05, Py_ssize_t max_detections=300):
+    """ Soft non maximum suppression (Bodla et al., 2017).
+
+    Instead of removing the boxes that overlap with a selected box, their scores are decayed. Like
+    tf.image.non_max_suppression_with_scores, candidates are kept in a max-heap and only decayed by the boxes that
+    were selected since they were last looked at, which gives the same result as decaying all candidates after every
+    selection at a fraction of the cost.
+
+    Args
+        boxes           : (N, 4) ndarray with boxes in (x1, y1, x2, y2) format.
+        scores          : (N,) ndarray with the score of every box.
+        method          : One of 'linear' (scores of boxes with an IoU above iou_threshold are multiplied by 1 - IoU)
+                          or 'gaussian' (scores are multiplied by exp(-0.5 * IoU ** 2 / sigma), like tf.image.non_max_suppression_with_scores).
+        iou_threshold   : IoU threshold for the linear method.
+        sigma           : Sigma of the gaussian method.
+        score_threshold : Boxes whose (decayed) score drops below this threshold are removed.
+        max_detections  : Maximum number of boxes to select.
+
+    Returns
+        indices: (K,) ndarray (int32) with the indices of the selected boxes, in order of selection.
+        scores: (K,) ndarray with the decayed scores of the selected boxes.
+    """
+    if method not in ('linear', 'gaussian'):
+        raise ValueError('Invalid soft NMS method {}, expected linear or gaussian.'.format(method))
+
+    cdef bint linear                 = method == 'linear'
+    cdef const double[:, ::1] boxes_ = np.ascontiguousarray(boxes, dtype=np.float64).reshape(-1, 4)
+    cdef double[::1] areas           = _areas(boxes_)
+    cdef double[::1] current         = np.asarray(scores, dtype=np.float64).copy()
+    cdef Py_ssize_t[::1] decayed_by  = np.zeros((current.shape[0],), dtype=np.intp)
+
+    heap_array = np.flatnonzero(np.asarray(scores) >= score_threshold).astype(np.intp)
+    cdef Py_ssize_t[::1] heap = heap_array
+    cdef Py_ssize_t size      = heap.shape[0]
+
+    selected_indices_array = np.zeros((min(size, max(max_detections, 0)),), dtype=np.int32)
+    selected_scores_array  = np.zeros((selected_indices_array.shape[0],), dtype=np.float64)
+    cdef int[::1] selected_indices   = selected_indices_array
+    cdef double[::1] selected_scores = selected_scores_array
+    cdef Py_ssize_t num_selected     = 0
+    cdef Py_ssize_t i, j, candidate
+    cdef double iou, score
+
+    with nogil:
+        for i in range(size // 2 - 1, -1, -1):
+            _sift_down(current, heap, size, i)
+
+        while size > 0 and num_selected < selected_indices.shape[0]:
+            candidate = heap[0]
+
+            # decay the score of the top candidate by the boxes selected since it was last decayed
+            score = current[candidate]
+            for j in range(decayed_by[candidate], num_selected):
+                iou = _iou(boxes_, candidate, areas[candidate], boxes_, selected_indices[j], areas[selected_indices[j]])
+                if linear:
+                    if iou > iou_threshold:
+                        score = score * (1 - iou)
+                else:
+                    score = score * exp(-0.5 * iou * iou / sigma)
+                if score < score_threshold:
+                    break
+            decayed_by[candidate] = num_selected
+
+            if score < score_threshold:
+                # drop the candidate
+                size -= 1
+                heap[0] = heap[size]
+                _sift_down(current, heap, size, 0)
+            elif score == current[candidate]:
+                # the score didn't change, so it is still the highest score
+                selected_indices[num_selected] = <int> candidate
+                selected_scores[num_selected]  = score
+                num_selected += 1
+                size -= 1
+                heap[0] = heap[size]
+                _sift_down(current, heap, size, 0)
+            else:
+                # the score decreased, so put it back and look at the (new) top candidate
+                current[candidate] = score
+                _sift_down(current, heap, size, 0)
+
+    return selected_indices_array[:num_selected], selected_scores_array[:num_selected].astype(np.asarray(scores).dtype)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def weighted_boxes_fusion(boxes, scores, double iou_threshold=0.55, double score_threshold=0.05, Py_ssize_t max_detections=300):
+    """ Weighted boxes fusion (Solovyev et al., 2019) for the detections of a single model.
+
+    Boxes are processed in order of decreasing score and added to the first cluster whose fused box overlaps with
+    them by more than iou_threshold, or start a new cluster. A fused box is the score weighted average of the boxes
+    in its cluster and its score is the average score of the cluster.
+
+    Args
+        boxes           : (N, 4) ndarray with boxes in (x1, y1, x2, y2) format.
+        scores          : (N,) ndarray with the score of every box.
+        iou_threshold   : IoU threshold to add a box to a cluster.
+        score_threshold : Boxes with a lower score are ignored.
+        max_detections  : Maximum number of fused boxes to return.
+
+    Returns
+        indices: (K,) ndarray (int32) with the index of the highest scoring box of every cluster.
+        scores: (K,) ndarray with the fused scores, in decreasing order.
+        boxes: (K, 4) ndarray with the fused boxes.
+    """
+    scores_array = np.asarray(scores)
+    order_array  = np.flatnonzero(scores_array >= score_threshold)
+    order_array  = order_array[np.argsort(-scores_array[order_array], kind='stable')].astype(np.intp)
+
+    cdef const double[:, ::1] boxes_ = np.ascontiguousarray(boxes, dtype=np.float64).reshape(-1, 4)
+    cdef double[::1] areas           = _areas(boxes_)
+    cdef const double[::1] scores_   = scores_array.astype(np.float64)
+    cdef Py_ssize_t[::1] order       = order_array
+    cdef Py_ssize_t n                = order.shape[0]
+
+    fused_boxes_array = np.zeros((n, 4), dtype=np.float64)
+    fused_scores_array = np.zeros((n,), dtype=np.float64)
+    representative_array = np.zeros((n,), dtype=np.int32)
+    cdef double[:, ::1] fused_boxes   = fused_boxes_array
+    cdef double[:, ::1] weighted_sums = np.zeros((n, 4), dtype=np.float64)
+    cdef double[::1] fused_areas      = np.zeros((n,), dtype=np.float64)
+    cdef double[::1] score_sums       = np.zeros((n,), dtype=np.float64)
+    cdef double[::1] counts           = np.zeros((n,), dtype=np.float64)
+    cdef double[::1] fused_scores     = fused_scores_array
+    cdef int[::1] representative      = representative_array
+    cdef Py_ssize_t num_clusters      = 0
+    cdef Py_ssize_t i, c, k, index, cluster
+    cdef double score
+
+    with nogil:
+        for i in range(n):
+            index = order[i]
+            score = scores_[index]
+
+            cluster = -1
+            for c in range(num_clusters):
+                if _iou(boxes_, index, areas[index], fused_boxes, c, fused_areas[c]) > iou_threshold:
+                    cluster = c
+                    break
+
+            if cluster < 0:
+                cluster = num_clusters
+                num_clusters += 1
+                representative[cluster] = <int> index
+
+            for k in range(4):
+                weighted_sums[cluster, k] += score * boxes_[index, k]
+            score_sums[cluster] += score
+            counts[cluster]     += 1
+            for k in range(4):
+                fused_boxes[cluster, k] = weighted_sums[cluster, k] / score_sums[cluster]
+            fused_areas[cluster] = (fused_boxes[cluster, 2] - fused_boxes[cluster, 0]) * (fused_boxes[cluster, 3] - fused_boxes[cluster, 1])
+
+        for c in range(num_clusters):
+            fused_scores[c] = score_sums[c] / counts[c]
+
+    top = np.argsort(-fused_scores_array[:num_clusters], kind='stable')[:max(max_detections, 0)]
+
+    return (
+        representative_array[top],
+        fused_scores_array[top].astype(scores_array.dtype),
+        fused_boxes_array[top].astype(np.asarray(boxes).dtype),
+    )
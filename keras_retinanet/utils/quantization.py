@@ -0,0 +1,156 @@
+"""
+Copyright 2017-2018 Fizyr (https://fizyr.com)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import time
+
+import cv2
+import keras
+import numpy as np
+import tensorflow
+
+from .. import layers
+from .export import write_tflite
+
+"""
+Supported post-training quantization modes.
+"""
+QUANTIZATIONS = ['dynamic', 'int8']
+
+
+def generator_images(generator, num_images=None, seed=0):
+    """ Yield images from a generator the way utils.eval feeds them to a model (preprocessed and resized).
+
+    Args
+        generator  : A Generator (see preprocessing.generator).
+        num_images : Number of images to yield, sampled at random without replacement (all images if None).
+        seed       : Seed for sampling the images.
+
+    Returns
+        A generator of np.array of shape (1, height, width, channels).
+    """
+    indices = np.arange(generator.size())
+    if num_images is not None and num_images < len(indices):
+        indices = np.sort(np.random.RandomState(seed).choice(indices, num_images, replace=False))
+
+    for index in indices:
+        image    = generator.preprocess_image(generator.load_image(index).copy())
+        image, _ = generator.resize_image(image)
+
+        if keras.backend.image_data_format() == 'channels_first':
+            image = image.transpose((2, 0, 1))
+
+        yield np.expand_dims(image, axis=0).astype(keras.backend.floatx())
+
+
+def with_combined_nms(model):
+    """ Returns the inference model with the FilterDetections layer switched to nms_method='combined', sharing the weights.
+
+    TFLite can't run the per image while loop of the other NMS methods when there are no detections.
+    """
+    try:
+        layer = model.get_layer('filtered_detections')
+    except ValueError:
+        return model
+
+    if not (layer.nms and layer.class_specific_filter):
+        raise ValueError('Quantization requires a model with class specific NMS.')
+    if layer.nms_method == 'combined':
+        return model
+
+    config = layer.get_config()
+    config['nms_method'] = 'combined'
+    outputs = layers.FilterDetections.from_config(config)(layer.input)
+    return keras.models.Model(inputs=model.inputs, outputs=outputs, name=model.name)
+
+
+def quantize_model(model, path, generator, quantization='int8', num_calibration_images=100, seed=0):
+    """ Quantize an inference model to a TFLite model, calibrated on images of a generator.
+
+    The NMS ops are exported as select TensorFlow ops, so the interpreter needs the Flex delegate
+    (included in the tensorflow pip package). Inputs and outputs stay float, like the Keras model.
+
+    Args
+        model                  : A RetinaNet inference model (see models.convert_model).
+        path                   : Path of the .tflite file to write.
+        generator              : Generator providing the calibration images (only used for 'int8').
+        quantization           : One of 'dynamic' (weights are quantized to int8) or
+                                 'int8' (weights and activations are quantized to int8).
+        num_calibration_images : Number of images of the generator to calibrate the activation ranges with.
+        seed                   : Seed for sampling the calibration images.
+
+    Returns
+        The model that was quantized, with nms_method='combined'.
+    """
+    if quantization not in QUANTIZATIONS:
+        raise ValueError('Invalid quantization {}, expected one of {}.'.format(quantization, QUANTIZATIONS))
+
+    model        = with_combined_nms(model)
+    input_shape  = (1,) + keras.backend.int_shape(model.inputs[0])[1:]
+    static_shape = input_shape[1:3] if keras.backend.image_data_format() == 'channels_last' and None not in input_shape[1:3] else None
+
+    @tensorflow.function(input_signature=[tensorflow.TensorSpec(input_shape, keras.backend.floatx(), name='images')])
+    def predict(images):
+        outputs = model(images, training=False)
+        return {'output_{}'.format(i): output for i, output in enumerate(outputs)}
+
+    def representative_dataset():
+        for image in generator_images(generator, num_calibration_images, seed=seed):
+            if static_shape is not None:
+                image = cv2.resize(image[0], static_shape[::-1])[None]
+            yield [image]
+
+    write_tflite(predict.get_concrete_function(), model, path, quantization=quantization, representative_dataset=representative_dataset)
+
+    return model
+
+
+class TFLiteModel(object):
+    """ Runs a TFLite model written by quantize_model with the predict_on_batch interface of a Keras model.
+
+    This allows evaluating a quantized model with utils.eval.evaluate.
+    """
+    def __init__(self, path, num_threads=None):
+        self.interpreter = tensorflow.lite.Interpreter(model_path=path, num_threads=num_threads)
+        self.runner      = self.interpreter.get_signature_runner()
+
+    def predict_on_batch(self, images):
+        """ Run the model on a batch of one image, returning the outputs in the order of the Keras model.
+        """
+        outputs = self.runner(images=np.asarray(images, dtype=np.float32))
+        return [outputs['output_{}'.format(i)] for i in range(len(outputs))]
+
+
+def measure_latency(model, images, warmup=1):
+    """ Measure the time model.predict_on_batch takes per image.
+
+    Args
+        model  : A Keras model or a TFLiteModel.
+        images : List of np.array of shape (1, height, width, channels).
+        warmup : Number of images to run before measuring.
+
+    Returns
+        np.array with the latency of every image in seconds.
+    """
+    for image in images[:warmup]:
+        model.predict_on_batch(image)
+
+    latencies = []
+    for image in images:
+        start = time.perf_counter()
+        model.predict_on_batch(image)
+        latencies.append(time.perf_counter() - start)
+
+    return np.array(latencies)
@@ -0,0 +1,411 @@
+"""
+Copyright 2017-2018 Fizyr (https://fizyr.com)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import collections
+import concurrent.futures
+import http.client
+import http.server
+import json
+import queue
+import socket
+import socketserver
+import threading
+import time
+
+import cv2
+import keras
+import numpy as np
+
+from .image import preprocess_image, resize_image
+
+
+class ServingMetrics(object):
+    """ Thread safe throughput and latency statistics of a BatchPredictor.
+
+    Args
+        window : Number of most recent requests and batches the latency percentiles are computed over.
+    """
+    def __init__(self, window=1000):
+        self.lock             = threading.Lock()
+        self.start_time       = time.time()
+        self.requests         = 0
+        self.errors           = 0
+        self.batches          = 0
+        self.latencies        = collections.deque(maxlen=window)
+        self.queue_times      = collections.deque(maxlen=window)
+        self.preprocess_times = collections.deque(maxlen=window)
+        self.inference_times  = collections.deque(maxlen=window)
+        self.batch_sizes      = collections.deque(maxlen=window)
+
+    def record_preprocess(self, duration):
+        with self.lock:
+            self.preprocess_times.append(duration)
+
+    def record_batch(self, batch_size, inference_time, queue_times, latencies):
+        with self.lock:
+            self.batches  += 1
+            self.requests += batch_size
+            self.batch_sizes.append(batch_size)
+            self.inference_times.append(inference_time)
+            self.queue_times.extend(queue_times)
+            self.latencies.extend(latencies)
+
+    def record_error(self):
+        with self.lock:
+            self.errors += 1
+
+    def summary(self):
+        """ Returns a dictionary with the metrics, times are in milliseconds.
+        """
+        def percentiles(values):
+            if not values:
+                return {'p50': None, 'p90': None, 'p99': None, 'mean': None}
+            values = np.array(values) * 1000
+            return {
+                'p50'  : float(np.percentile(values, 50)),
+                'p90'  : float(np.percentile(values, 90)),
+                'p99'  : float(np.percentile(values, 99)),
+                'mean' : float(np.mean(values)),
+            }
+
+        with self.lock:
+            uptime = time.time() - self.start_time
+            return {
+                'uptime'          : uptime,
+                'requests'        : self.requests,
+                'errors'          : self.errors,
+                'batches'         : self.batches,
+                'throughput'      : self.requests / uptime if uptime > 0 else 0.0,
+                'mean_batch_size' : float(np.mean(self.batch_sizes)) if self.batch_sizes else None,
+                'latency_ms'      : percentiles(self.latencies),
+                'queue_ms'        : percentiles(self.queue_times),
+                'preprocess_ms'   : percentiles(self.preprocess_times),
+                'inference_ms'    : percentiles(self.inference_times),
+            }
+
+
+class BatchPredictor(object):
+    """ Coalesces concurrent prediction requests into batches for a RetinaNet inference model.
+
+    Images are preprocessed in a thread pool and queued, a single worker thread collects queued images into a batch
+    until max_batch_size images are collected or the oldest image waited max_latency seconds. Images of different
+    sizes are padded to the largest image of the batch, like the generators do.
+
+    Args
+        model              : A RetinaNet inference model (see models.convert_model).
+        preprocess         : Function preprocessing a BGR image for the backbone (see Backbone.preprocess_image).
+        max_batch_size     : Maximum number of images in a batch.
+        max_latency        : Maximum time in seconds an image waits in the queue for a batch to fill up.
+        preprocess_threads : Number of threads to decode and preprocess images with.
+        image_min_side     : The image's min side after resizing, for models without a static shape.
+        image_max_side     : The image's max side after resizing, for models without a static shape.
+        score_threshold    : Detections with a lower score are not returned.
+        max_detections     : Maximum number of detections returned per image.
+    """
+    def __init__(
+        self,
+        model,
+        preprocess=preprocess_image,
+        max_batch_size=8,
+        max_latency=0.01,
+        preprocess_threads=4,
+        image_min_side=800,
+        image_max_side=1333,
+        score_threshold=0.05,
+        max_detections=100,
+    ):
+        if keras.backend.image_data_format() == 'channels_first':
+            raise ValueError('Serving models with channels_first data format is not supported.')
+        if max_batch_size < 1:
+            raise ValueError('max_batch_size should be at least 1, received {}.'.format(max_batch_size))
+
+        self.model           = model
+        self.preprocess      = preprocess
+        self.max_batch_size  = max_batch_size
+        self.max_latency     = max_latency
+        self.image_min_side  = image_min_side
+        self.image_max_side  = image_max_side
+        self.score_threshold = score_threshold
+        self.max_detections  = max_detections
+        self.metrics         = ServingMetrics()
+
+        # models with a static image shape (see models.convert_model) need images of exactly that size
+        shape             = keras.backend.int_shape(model.inputs[0])[1:3]
+        self.static_shape = None if None in shape else shape
+
+        self.queue    = queue.Queue()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=preprocess_threads, thread_name_prefix='preprocess')
+        self.worker   = threading.Thread(target=self._run, name='batch-predictor', daemon=True)
+        self.running  = False
+
+    def start(self):
+        """ Start the worker thread running the batches.
+        """
+        self.running = True
+        self.worker.start()
+        return self
+
+    def stop(self):
+        """ Stop the worker thread after the queued requests finished and shut down the preprocessing threads.
+        """
+        self.executor.shutdown(wait=True)
+        if self.running:
+            self.running = False
+            self.queue.put(None)
+            self.worker.join()
+
+    def submit(self, image):
+        """ Submit a BGR image (np.array) or an encoded image (bytes) for prediction.
+
+        Returns
+            A concurrent.futures.Future resolving to a dictionary with 'boxes', 'scores' and 'labels' (lists, in original image coordinates).
+        """
+        future = concurrent.futures.Future()
+        self.executor.submit(self._preprocess, image, future, time.time())
+        return future
+
+    def predict(self, image, timeout=None):
+        """ Submit an image and wait for its detections.
+        """
+        return self.submit(image).result(timeout)
+
+    def _preprocess(self, image, future, start_time):
+        try:
+            if isinstance(image, (bytes, bytearray)):
+                image = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_COLOR)
+                if image is None:
+                    raise ValueError('Could not decode image.')
+
+            height, width = image.shape[:2]
+            image = self.preprocess(image.astype(keras.backend.floatx()))
+            if self.static_shape is not None:
+                image = cv2.resize(image, self.static_shape[::-1])
+                scale = np.array([self.static_shape[1] / width, self.static_shape[0] / height] * 2)
+            else:
+                image, scale = resize_image(image, min_side=self.image_min_side, max_side=self.image_max_side)
+                scale = np.full(4, scale)
+        except Exception as e:
+            self.metrics.record_error()
+            future.set_exception(e)
+            return
+
+        self.metrics.record_preprocess(time.time() - start_time)
+        self.queue.put((image, scale, future, start_time, time.time()))
+
+    def _collect_batch(self):
+        """ Wait for the first request, then collect requests until the batch is full or the deadline passes.
+        """
+        first = self.queue.get()
+        if first is None:
+            return None
+
+        batch    = [first]
+        deadline = first[4] + self.max_latency
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.time()
+            try:
+                item = self.queue.get(timeout=timeout) if timeout > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # finish this batch, then stop
+                self.queue.put(None)
+                break
+            batch.append(item)
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            if batch is None:
+                return
+
+            images, scales, futures, start_times, queue_times = zip(*batch)
+            batch_start = time.time()
+
+            try:
+                max_shape = tuple(max(image.shape[x] for image in images) for x in range(3))
+                inputs    = np.zeros((len(images),) + max_shape, dtype=keras.backend.floatx())
+                for image_index, image in enumerate(images):
+                    inputs[image_index, :image.shape[0], :image.shape[1], :image.shape[2]] = image
+
+                boxes, scores, labels = self.model.predict_on_batch(inputs)[:3]
+            except Exception as e:
+                for future in futures:
+                    self.metrics.record_error()
+                    future.set_exception(e)
+                continue
+
+            end_time = time.time()
+            self.metrics.record_batch(
+                len(batch),
+                end_time - batch_start,
+                [batch_start - queue_time for queue_time in queue_times],
+                [end_time - start_time for start_time in start_times],
+            )
+
+            for image_index, (scale, future) in enumerate(zip(scales, futures)):
+                # select the detections above the threshold, in order of decreasing score
+                indices = np.where(scores[image_index] > self.score_threshold)[0]
+                indices = indices[np.argsort(-scores[image_index, indices])][:self.max_detections]
+
+                future.set_result({
+                    'boxes'  : (boxes[image_index, indices] / scale).tolist(),
+                    'scores' : scores[image_index, indices].tolist(),
+                    'labels' : labels[image_index, indices].astype(int).tolist(),
+                })
+
+
+class RequestHandler(http.server.BaseHTTPRequestHandler):
+    """ Handles POST /predict with an encoded image as body and GET /metrics.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        if self.path != '/predict':
+            self._send_json(404, {'error': 'Unknown path {}.'.format(self.path)})
+            return
+
+        length = int(self.headers.get('Content-Length', 0))
+        if length <= 0:
+            self._send_json(400, {'error': 'Expected an encoded image as request body.'})
+            return
+
+        try:
+            detections = self.server.predictor.predict(self.rfile.read(length), timeout=self.server.timeout_seconds)
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+        else:
+            self._send_json(200, detections)
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            self._send_json(200, self.server.predictor.metrics.summary())
+        else:
+            self._send_json(404, {'error': 'Unknown path {}.'.format(self.path)})
+
+    def _send_json(self, status, content):
+        body = json.dumps(content).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # unix sockets have no client address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super(RequestHandler, self).log_message(format, *args)
+
+
+class HTTPServer(http.server.ThreadingHTTPServer):
+    """ HTTP server with one thread per connection, sharing a BatchPredictor.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, predictor, timeout=60.0, quiet=False):
+        self.predictor       = predictor
+        self.timeout_seconds = timeout
+        self.quiet           = quiet
+        super(HTTPServer, self).__init__(address, RequestHandler)
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """ HTTP server on a Unix socket with one thread per connection, sharing a BatchPredictor.
+    """
+    daemon_threads = True
+
+    def __init__(self, path, predictor, timeout=60.0, quiet=False):
+        self.predictor       = predictor
+        self.timeout_seconds = timeout
+        self.quiet           = quiet
+        super(UnixHTTPServer, self).__init__(path, RequestHandler)
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """ http.client.HTTPConnection over a Unix socket.
+    """
+    def __init__(self, path, timeout=60.0):
+        super(UnixHTTPConnection, self).__init__('localhost', timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+class Client(object):
+    """ Client for a prediction server.
+
+    Args
+        host        : Host of an HTTP server.
+        port        : Port of an HTTP server.
+        unix_socket : Path of the Unix socket of a server, used instead of host and port.
+        timeout     : Timeout of the requests in seconds.
+    """
+    def __init__(self, host='localhost', port=8080, unix_socket=None, timeout=60.0):
+        self.host        = host
+        self.port        = port
+        self.unix_socket = unix_socket
+        self.timeout     = timeout
+
+    def _request(self, method, path, body=None):
+        if self.unix_socket is not None:
+            connection = UnixHTTPConnection(self.unix_socket, timeout=self.timeout)
+        else:
+            connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+        try:
+            connection.request(method, path, body=body, headers={'Content-Type': 'application/octet-stream'} if body is not None else {})
+            response = connection.getresponse()
+            content  = json.loads(response.read().decode('utf-8'))
+        finally:
+            connection.close()
+
+        if response.status != 200:
+            raise RuntimeError('Request failed with status {}: {}'.format(response.status, content.get('error')))
+        return content
+
+    def predict(self, image):
+        """ Predict the detections of an image.
+
+        Args
+            image : BGR image (np.array) or encoded image (bytes, for example the contents of a .jpg file).
+
+        Returns
+            A dictionary with 'boxes', 'scores' and 'labels' (np.array).
+        """
+        if isinstance(image, np.ndarray):
+            image = cv2.imencode('.png', image)[1].tobytes()
+
+        detections = self._request('POST', '/predict', body=image)
+        return {
+            'boxes'  : np.array(detections['boxes'], dtype=np.float32).reshape(-1, 4),
+            'scores' : np.array(detections['scores'], dtype=np.float32),
+            'labels' : np.array(detections['labels'], dtype=np.int32),
+        }
+
+    def metrics(self):
+        """ Returns the metrics of the server (see ServingMetrics.summary).
+        """
+        return self._request('GET', '/metrics')
@@ -1,3 +1,6 @@
+import os
+import sys
+
 import setuptools
 from setuptools.extension import Extension
 from distutils.command.build_ext import build_ext as DistUtilsBuildExt
@@ -34,10 +37,33 @@ class BuildExtension(setuptools.Command):
         return self._command.run(*args, **kwargs)
 
 
+def openmp_flags():
+    """ Compiler and linker flags to enable OpenMP, set KERAS_RETINANET_OPENMP=0 to build without it.
+
+    Without OpenMP the compute_overlap kernels still release the GIL, but run on a single thread.
+    """
+    if os.environ.get('KERAS_RETINANET_OPENMP', '1') == '0':
+        return [], []
+    if sys.platform == 'win32':
+        return ['/openmp'], []
+    if sys.platform == 'darwin':
+        # Apple clang doesn't ship with OpenMP
+        return [], []
+    return ['-fopenmp'], ['-fopenmp']
+
+
+openmp_compile_args, openmp_link_args = openmp_flags()
+
 extensions = [
     Extension(
         'keras_retinanet.utils.compute_overlap',
-        ['keras_retinanet/utils/compute_overlap.pyx']
+        ['keras_retinanet/utils/compute_overlap.pyx'],
+        extra_compile_args=openmp_compile_args,
+        extra_link_args=openmp_link_args,
+    ),
+    Extension(
+        'keras_retinanet.utils.nms',
+        ['keras_retinanet/utils/nms.pyx'],
     ),
 ]
 
@@ -59,7 +85,12 @@ setuptools.setup(
             'retinanet-train=keras_retinanet.bin.train:main',
             'retinanet-evaluate=keras_retinanet.bin.evaluate:main',
             'retinanet-debug=keras_retinanet.bin.debug:main',
+            'retinanet-bench-data=keras_retinanet.bin.bench_data:main',
+            'retinanet-bench-model=keras_retinanet.bin.bench_model:main',
             'retinanet-convert-model=keras_retinanet.bin.convert_model:main',
+            'retinanet-quantize=keras_retinanet.bin.quantize:main',
+            'retinanet-serve=keras_retinanet.bin.serve:main',
+            'retinanet-optimize-anchors=keras_retinanet.bin.optimize_anchors:main',
         ],
     },
     ext_modules    = extensions,
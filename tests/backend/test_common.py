@@ -121,3 +121,13 @@ def test_shift():
     result = keras.backend.eval(result)
 
     np.testing.assert_array_equal(result, expected)
+
+
+def test_resize_nearest():
+    images = np.random.RandomState(0).uniform(size=(2, 24, 30, 3)).astype(keras.backend.floatx())
+
+    # includes sizes for which the float32 scale of the resize op rounds differently than exact integer arithmetic
+    for size in [(24, 30), (48, 60), (37, 45), (74, 58), (74, 86)]:
+        expected = keras.backend.eval(keras_retinanet.backend.resize_images(images, size, method='nearest'))
+        actual   = keras.backend.eval(keras_retinanet.backend.resize_nearest(images, size))
+        np.testing.assert_array_equal(actual, expected)
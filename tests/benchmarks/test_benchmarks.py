@@ -0,0 +1,130 @@
+"""
+Copyright 2017-2018 Fizyr (https://fizyr.com)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Microbenchmarks of the numeric hot paths. They are timed with pytest-benchmark (see tests/requirements.txt), without it
+every benchmark runs its function once, as a regular test:
+
+    pytest tests/benchmarks                                                         # print the timings
+    pytest tests/benchmarks --benchmark-autosave                                    # store them in .benchmarks/
+    pytest tests/benchmarks --benchmark-compare --benchmark-compare-fail=min:20%    # fail benchmarks that regressed
+
+Stored timings are specific to the machine they were recorded on. Use --benchmark-skip to leave out the benchmarks
+when running the rest of the tests.
+"""
+
+import numpy as np
+import pytest
+import tensorflow as tf
+
+from keras_retinanet.layers.filter_detections import filter_detections
+from keras_retinanet.utils.anchors import anchor_targets_bbox, anchors_for_shape, bbox_transform
+from keras_retinanet.utils.compute_overlap import compute_overlap
+from keras_retinanet.utils.eval import _compute_ap
+from keras_retinanet.utils.transform import random_transform, transform_aabb
+
+# the default image shape of the training script (--image-min-side 800, --image-max-side 1333)
+IMAGE_SHAPE = (800, 1333, 3)
+
+
+def random_boxes(count, seed=0, image_shape=IMAGE_SHAPE):
+    random = np.random.RandomState(seed)
+    wh     = random.uniform(10, 300, (count, 2))
+    xy     = random.uniform(0, 1, (count, 2)) * (np.array([image_shape[1], image_shape[0]]) - wh)
+    return np.concatenate([xy, xy + wh], axis=1)
+
+
+@pytest.fixture(scope='module')
+def anchors():
+    return anchors_for_shape(IMAGE_SHAPE)
+
+
+def test_compute_overlap(benchmark, anchors):
+    overlaps = benchmark(compute_overlap, anchors, random_boxes(300))
+    assert overlaps.shape == (anchors.shape[0], 300)
+
+
+def test_anchors_for_shape(benchmark):
+    anchors = benchmark(anchors_for_shape, IMAGE_SHAPE)
+    assert anchors.shape[1] == 4
+
+
+def test_anchor_targets_bbox(benchmark, anchors):
+    images      = [np.zeros(IMAGE_SHAPE, dtype=np.uint8)] * 2
+    annotations = [{
+        'bboxes' : random_boxes(100, seed=seed),
+        'labels' : np.random.RandomState(seed).randint(0, 20, 100).astype(float),
+    } for seed in range(2)]
+
+    regression, labels = benchmark(anchor_targets_bbox, anchors, images, annotations, 20)
+    assert regression.shape == (2, anchors.shape[0], 5)
+    assert labels.shape == (2, anchors.shape[0], 21)
+
+
+def test_bbox_transform(benchmark, anchors):
+    gt_boxes = random_boxes(anchors.shape[0])
+    targets  = benchmark(bbox_transform, anchors, gt_boxes)
+    assert targets.shape == anchors.shape
+
+
+def test_transform_aabb(benchmark):
+    transform = random_transform(min_rotation=-0.1, max_rotation=0.1, prng=np.random.RandomState(0))
+    boxes     = random_boxes(300)
+
+    def transform_boxes():
+        return [transform_aabb(transform, box) for box in boxes]
+
+    assert len(benchmark(transform_boxes)) == 300
+
+
+def test_compute_ap(benchmark):
+    # the precision and recall curves of ~50k detections, as evaluated on a large validation set
+    random          = np.random.RandomState(0)
+    true_positives  = (random.uniform(size=50000) < 0.3).astype(float)
+    false_positives = 1 - true_positives
+    true_positives  = np.cumsum(true_positives)
+    false_positives = np.cumsum(false_positives)
+    recall          = true_positives / true_positives[-1]
+    precision       = true_positives / (true_positives + false_positives)
+
+    average_precision = benchmark(_compute_ap, recall, precision)
+    assert 0 <= average_precision <= 1
+
+
+def test_average_points(benchmark):
+    pytest.importorskip('mysql.connector')
+    from utils.db import average_points
+
+    random = np.random.RandomState(0)
+    points = [(
+        int(random.randint(0, 4000)),
+        int(random.randint(0, 3000)),
+        int(random.randint(10, 100)),
+        int(random.randint(10, 100)),
+        t,
+    ) for t in ['a', 'b', 'c'] for _ in range(100)]
+
+    averages = benchmark(average_points, points, unpacked=True)
+    assert 0 < len(averages) <= len(points)
+
+
+def test_filter_detections(benchmark, anchors):
+    # the number of boxes of an 800x1333 image, with the score distribution of a trained model (mostly background)
+    random         = np.random.RandomState(0)
+    boxes          = tf.constant(random_boxes(anchors.shape[0]), dtype=tf.float32)
+    classification = tf.constant(random.uniform(size=(anchors.shape[0], 20)) ** 100, dtype=tf.float32)
+
+    function   = tf.function(lambda: filter_detections(boxes, classification))
+    detections = benchmark(function)
+    assert detections[0].shape == (300, 4)
@@ -0,0 +1,33 @@
+"""
+Copyright 2017-2018 Fizyr (https://fizyr.com)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+import cv2
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def csv_dataset(tmp_path):
+    random = np.random.RandomState(0)
+    with open(str(tmp_path / 'annotations.csv'), 'w') as f:
+        for i in range(4):
+            cv2.imwrite(str(tmp_path / 'image_{}.jpg'.format(i)), random.randint(0, 255, (60, 80, 3)).astype(np.uint8))
+            f.write('image_{}.jpg,10,10,40,40,object\n'.format(i))
+    with open(str(tmp_path / 'classes.csv'), 'w') as f:
+        f.write('object,0\n')
+
+    return ['csv', str(tmp_path / 'annotations.csv'), str(tmp_path / 'classes.csv')]
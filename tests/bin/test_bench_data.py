@@ -0,0 +1,49 @@
+"""
+Copyright 2017-2018 Fizyr (https://fizyr.com)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+
+import pytest
+
+import keras_retinanet.bin.bench_data
+from keras_retinanet.preprocessing.generator import STAGES
+
+
+@pytest.mark.parametrize('pipeline', [['--workers=0'], ['--workers=2'], ['--tf-data']])
+def test_bench_data(tmp_path, csv_dataset, pipeline):
+    results = keras_retinanet.bin.bench_data.main([
+        '--backbone=vgg16',
+        '--batch-size=2',
+        '--batches=4',
+        '--warmup=1',
+        '--image-min-side=64',
+        '--image-max-side=96',
+        '--random-transform',
+        '--output={}'.format(tmp_path / 'results.json'),
+    ] + pipeline + csv_dataset)
+
+    assert results['images_per_second'] > 0
+    assert results['wait_ms']['p50'] <= results['wait_ms']['p99']
+    assert list(results['stages_ms']) == list(STAGES)
+    assert results['peak_rss_mb'] > 0
+
+    with open(str(tmp_path / 'results.json')) as f:
+        assert json.load(f)['batches'] == 4
+
+
+def test_invalid_args(csv_dataset):
+    with pytest.raises(ValueError):
+        keras_retinanet.bin.bench_data.parse_args(['--shared-memory'] + csv_dataset)
@@ -0,0 +1,48 @@
+"""
+Copyright 2017-2018 Fizyr (https://fizyr.com)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+
+import keras.applications  # noqa: F401
+
+import keras_retinanet.bin.bench_model
+
+
+def test_bench_model(tmp_path):
+    output = keras_retinanet.bin.bench_model.main([
+        '--backbones=vgg16,invalid',
+        '--image-shapes=64x64,64x96',
+        '--batch-sizes=1,2',
+        '--num-classes=2',
+        '--runs=2',
+        '--output={}'.format(tmp_path / 'results.json'),
+    ])
+
+    with open(str(tmp_path / 'results.json')) as f:
+        assert json.load(f) == output
+
+    results = output['results']
+    assert [(result['backbone'], result['image_shape'], result['batch_size']) for result in results[:4]] == [
+        ('vgg16', [64, 64], 1), ('vgg16', [64, 64], 2), ('vgg16', [64, 96], 1), ('vgg16', [64, 96], 2)
+    ]
+    for result in results[:4]:
+        assert result['cold_ms'] > 0
+        assert result['warm_ms']['min'] <= result['warm_ms']['p50'] <= result['warm_ms']['p90']
+        assert result['images_per_second'] > 0
+
+    # backbones that can't be built are recorded, not fatal
+    assert len(results) == 8
+    assert all('error' in result for result in results[4:])
@@ -91,3 +91,62 @@ def test_vgg():
         'coco',
         'tests/test-data/coco',
     ])
+
+
+def test_mixed_precision_xla(csv_dataset):
+    # ignore warnings in this test
+    warnings.simplefilter('ignore')
+
+    # run training with a mixed precision policy and an XLA compiled training step
+    try:
+        keras_retinanet.bin.train.main([
+            '--backbone=vgg16',
+            '--epochs=1',
+            '--steps=1',
+            '--image-min-side=64',
+            '--image-max-side=96',
+            '--no-weights',
+            '--no-snapshots',
+            '--mixed-precision=mixed_bfloat16',
+            '--xla',
+            '--tensorboard-dir=',
+        ] + csv_dataset)
+    finally:
+        # the policy is global, don't let it leak into other tests
+        keras.mixed_precision.set_global_policy('float32')
+
+
+def test_gradient_accumulation(csv_dataset):
+    # ignore warnings in this test
+    warnings.simplefilter('ignore')
+
+    # run training with an optimizer step every two batches
+    keras_retinanet.bin.train.main([
+        '--backbone=vgg16',
+        '--epochs=1',
+        '--steps=2',
+        '--image-min-side=64',
+        '--image-max-side=96',
+        '--no-weights',
+        '--no-snapshots',
+        '--gradient-accumulation-steps=2',
+        '--tensorboard-dir=',
+    ] + csv_dataset)
+
+
+def test_local_workers(csv_dataset):
+    # ignore warnings in this test
+    warnings.simplefilter('ignore')
+
+    # run training in a cluster of two worker processes, raises if training fails on any of them
+    keras_retinanet.bin.train.main([
+        '--backbone=vgg16',
+        '--epochs=1',
+        '--steps=1',
+        '--image-min-side=64',
+        '--image-max-side=96',
+        '--no-weights',
+        '--no-snapshots',
+        '--tensorboard-dir=',
+        '--local-workers=2',
+    ] + csv_dataset)
@@ -0,0 +1,73 @@
+"""
+Copyright 2017-2018 Fizyr (https://fizyr.com)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import csv
+
+import keras
+import numpy as np
+
+from keras_retinanet.callbacks.throughput import MonitoredIterator, Throughput
+from keras_retinanet.preprocessing.generator import STAGES
+
+from ..preprocessing.test_generator import SimpleGenerator
+
+
+class RandomSequence(keras.utils.Sequence):
+    def __len__(self):
+        return 3
+
+    def __getitem__(self, index):
+        random = np.random.RandomState(index)
+        return random.rand(2, 4).astype(np.float32), [random.rand(2, 2).astype(np.float32)]
+
+
+def test_stage_timings():
+    generator = SimpleGenerator([np.array([[0, 0, 10, 10]], dtype=float)], [np.array([0])], num_classes=1, image=np.zeros((50, 50, 3), dtype=np.uint8))
+    generator.stage_timings = []
+    generator[0]
+
+    assert len(generator.stage_timings) == 1
+    assert list(generator.stage_timings[0]) == list(STAGES)
+    assert all(value >= 0 for value in generator.stage_timings[0].values())
+
+
+def test_throughput(tmp_path):
+    inputs = keras.layers.Input(shape=(4,))
+    model  = keras.models.Model(inputs, keras.layers.Dense(2)(inputs))
+    model.compile(loss='mse', optimizer='sgd')
+
+    enqueuer = keras.utils.OrderedEnqueuer(RandomSequence(), shuffle=True)
+    enqueuer.start(workers=1, max_queue_size=2)
+    monitor  = MonitoredIterator(enqueuer.get(), queue=enqueuer.queue)
+    callback = Throughput(2, monitor=monitor, csv_path=str(tmp_path / 'throughput.csv'), log_dir=str(tmp_path), verbose=0)
+
+    try:
+        history = model.fit(monitor.dataset(), steps_per_epoch=3, epochs=2, callbacks=[callback], verbose=0)
+    finally:
+        enqueuer.stop()
+
+    with open(str(tmp_path / 'throughput.csv')) as csv_file:
+        rows = list(csv.DictReader(csv_file))
+    assert len(rows) == 6
+    assert [int(row['epoch']) for row in rows] == [0, 0, 0, 1, 1, 1]
+    assert all(float(row['batch_time']) >= float(row['data_wait']) for row in rows)
+    assert all(row['queue_size'] != '' for row in rows)
+
+    summary = callback.summary()
+    assert summary['images_per_second'] > 0
+    assert 0 <= summary['data_wait_fraction'] <= 1
+    assert len(history.history['images_per_second']) == 2
+    assert (tmp_path / 'throughput').is_dir()
@@ -0,0 +1,32 @@
+"""
+Copyright 2017-2018 Fizyr (https://fizyr.com)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import pytest
+
+try:
+    import pytest_benchmark  # noqa: F401
+except ImportError:
+    pytest_benchmark = None
+
+
+if pytest_benchmark is None:
+    @pytest.fixture
+    def benchmark():
+        """ Stand-in for the benchmark fixture of pytest-benchmark, which runs the benchmarked function once.
+        """
+        def run(function, *args, **kwargs):
+            return function(*args, **kwargs)
+        return run
@@ -16,6 +16,7 @@ limitations under the License.
 
 import keras
 import keras_retinanet.layers
+from keras_retinanet.utils.nms import soft_nms
 
 import numpy as np
 
@@ -170,3 +171,81 @@ class TestFilterDetections(object):
         np.testing.assert_array_equal(actual_boxes, expected_boxes)
         np.testing.assert_array_equal(actual_scores, expected_scores)
         np.testing.assert_array_equal(actual_labels, expected_labels)
+
+    def test_combined_nms(self):
+        random = np.random.RandomState(0)
+
+        # create random overlapping boxes for a batch of 2 images
+        xy             = random.uniform(0, 100, (2, 200, 2))
+        wh             = random.uniform(10, 40, (2, 200, 2))
+        boxes          = np.concatenate([xy, xy + wh], axis=2).astype(keras.backend.floatx())
+        classification = random.uniform(0, 1, (2, 200, 3)).astype(keras.backend.floatx())
+        other          = [random.uniform(0, 1, (2, 200, 2)).astype(keras.backend.floatx()), np.tile(np.arange(200), (2, 1)).astype(keras.backend.floatx())]
+        inputs         = [keras.backend.constant(x) for x in [boxes, classification] + other]
+
+        standard = keras_retinanet.layers.FilterDetections(max_detections=50).call(inputs)
+        combined = keras_retinanet.layers.FilterDetections(max_detections=50, nms_method='combined').call(inputs)
+
+        for s, c in zip(standard, combined):
+            np.testing.assert_array_equal(keras.backend.eval(s), keras.backend.eval(c))
+
+    def test_combined_nms_with_other(self):
+        # identical boxes with different scores, the kept box should be matched with the right other values
+        boxes          = keras.backend.constant(np.array([[[0, 0, 10, 10], [0, 0, 10, 10]]], dtype=keras.backend.floatx()))
+        classification = keras.backend.constant(np.array([[[0, 0.9], [0, 1]]], dtype=keras.backend.floatx()))
+        other          = keras.backend.constant(np.array([[5678, 1234]], dtype=keras.backend.floatx()))
+
+        actual = keras_retinanet.layers.FilterDetections(nms_method='combined').call([boxes, classification, other])
+
+        expected_other = -1 * np.ones((1, 300), dtype=keras.backend.floatx())
+        expected_other[0, 0] = 1234
+        np.testing.assert_array_equal(keras.backend.eval(actual[1])[0, :2], [1, -1])
+        np.testing.assert_array_equal(keras.backend.eval(actual[3]), expected_other)
+
+    def test_soft_nms_linear(self):
+        # the second box overlaps with an IoU of 0.8, so its score decays to 0.8 * (1 - 0.8) instead of being suppressed
+        boxes          = keras.backend.constant(np.array([[[0, 0, 10, 10], [0, 0, 10, 8], [20, 20, 30, 30]]], dtype=keras.backend.floatx()))
+        classification = keras.backend.constant(np.array([[[1], [0.8], [0.5]]], dtype=keras.backend.floatx()))
+        other          = keras.backend.constant(np.array([[1, 2, 3]], dtype=keras.backend.floatx()))
+
+        actual_boxes, actual_scores, actual_labels, actual_other = [
+            keras.backend.eval(x) for x in keras_retinanet.layers.FilterDetections(nms_method='soft_linear').call([boxes, classification, other])
+        ]
+
+        np.testing.assert_allclose(actual_scores[0, :4], [1, 0.5, 0.16, -1], rtol=1e-5)
+        np.testing.assert_array_equal(actual_boxes[0, :3], [[0, 0, 10, 10], [20, 20, 30, 30], [0, 0, 10, 8]])
+        np.testing.assert_array_equal(actual_labels[0, :4], [0, 0, 0, -1])
+        np.testing.assert_array_equal(actual_other[0, :4], [1, 3, 2, -1])
+
+    def test_soft_nms_gaussian(self):
+        random = np.random.RandomState(0)
+
+        xy             = random.uniform(0, 100, (1, 100, 2))
+        wh             = random.uniform(10, 40, (1, 100, 2))
+        boxes          = np.concatenate([xy, xy + wh], axis=2).astype(keras.backend.floatx())
+        classification = random.uniform(0, 1, (1, 100, 1)).astype(keras.backend.floatx())
+
+        _, actual_scores, _ = keras_retinanet.layers.FilterDetections(nms_method='soft_gaussian', max_detections=50).call(
+            [keras.backend.constant(boxes), keras.backend.constant(classification)]
+        )
+
+        # compare with the NumPy implementation
+        _, expected_scores = soft_nms(boxes[0], classification[0, :, 0], method='gaussian', max_detections=50)
+        expected_scores = np.sort(expected_scores)[::-1]
+        actual_scores   = keras.backend.eval(actual_scores)[0]
+        np.testing.assert_allclose(actual_scores[:len(expected_scores)], expected_scores, rtol=1e-4)
+
+    def test_weighted_boxes_fusion(self):
+        # the first two boxes are fused, weighted by their scores
+        boxes          = keras.backend.constant(np.array([[[0, 0, 10, 10], [0, 0, 10, 8], [20, 20, 30, 30]]], dtype=keras.backend.floatx()))
+        classification = keras.backend.constant(np.array([[[0.75], [0.25], [0.6]]], dtype=keras.backend.floatx()))
+        other          = keras.backend.constant(np.array([[1, 2, 3]], dtype=keras.backend.floatx()))
+
+        actual_boxes, actual_scores, actual_labels, actual_other = [
+            keras.backend.eval(x) for x in keras_retinanet.layers.FilterDetections(nms_method='wbf').call([boxes, classification, other])
+        ]
+
+        np.testing.assert_allclose(actual_scores[0, :3], [0.6, 0.5, -1], rtol=1e-5)
+        np.testing.assert_allclose(actual_boxes[0, :2], [[20, 20, 30, 30], [0, 0, 10, 9.5]], rtol=1e-5)
+        np.testing.assert_array_equal(actual_labels[0, :3], [0, 0, -1])
+        np.testing.assert_array_equal(actual_other[0, :3], [3, 1, -1])
@@ -0,0 +1,68 @@
+"""
+Copyright 2017-2018 Fizyr (https://fizyr.com)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import keras
+import keras.applications  # noqa: F401
+import numpy as np
+import pytest
+
+from keras_retinanet import models
+from keras_retinanet.models.retinanet import retinanet_bbox
+
+
+@pytest.fixture(scope='module')
+def training_model():
+    return models.backbone('vgg16').retinanet(num_classes=2, pyramid_levels=[3, 4, 5])
+
+
+def assert_same_predictions(expected_model, model, image_shape=(96, 128)):
+    image = np.random.RandomState(0).normal(0, 50, (1,) + image_shape + (3,)).astype(keras.backend.floatx())
+    for expected, output in zip(expected_model.predict_on_batch(image), model.predict_on_batch(image)):
+        np.testing.assert_array_equal(expected, output)
+
+
+@pytest.mark.parametrize('mmap', [False, True])
+def test_rebuild_training_model(tmp_path, training_model, mmap):
+    training_model.save(str(tmp_path / 'model.h5'))
+
+    model = models.load_model(str(tmp_path / 'model.h5'), backbone_name='vgg16', rebuild=True, mmap=mmap)
+    assert model is not training_model
+    assert_same_predictions(training_model, model)
+
+
+def test_rebuild_inference_model(tmp_path, training_model):
+    inference_model = retinanet_bbox(model=training_model, nms_method='combined', pre_nms_top_k=100, image_shape=(96, 128))
+    inference_model.get_layer('filtered_detections').score_threshold = 0.0
+    inference_model.save(str(tmp_path / 'model.h5'))
+
+    model = models.load_model(str(tmp_path / 'model.h5'), backbone_name='vgg16', rebuild=True)
+    assert model.get_layer('filtered_detections').get_config() == inference_model.get_layer('filtered_detections').get_config()
+    assert model.get_layer('top_k_per_level').k == 100
+    assert keras.backend.int_shape(model.inputs[0]) == (None, 96, 128, 3)
+    assert_same_predictions(inference_model, model)
+
+
+def test_rebuild_fallback_and_cache(tmp_path):
+    inputs = keras.layers.Input(shape=(4,))
+    keras.models.Model(inputs, keras.layers.Dense(2)(inputs)).save(str(tmp_path / 'model.h5'))
+
+    # not a retinanet model, so the full model is loaded
+    with pytest.warns(UserWarning):
+        model = models.load_model(str(tmp_path / 'model.h5'), backbone_name='vgg16', rebuild=True, cache=True)
+    assert model.layers[-1].units == 2
+
+    assert models.load_model(str(tmp_path / 'model.h5'), backbone_name='vgg16', rebuild=True, cache=True) is model
+    assert models.load_model(str(tmp_path / 'model.h5'), backbone_name='vgg16') is not model
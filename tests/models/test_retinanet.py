@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+import keras
+
+from keras_retinanet.models.retinanet import retinanet, retinanet_bbox
+from keras_retinanet.utils.anchors import anchors_for_shape
+
+
+def create_model(pyramid_levels=None):
+    inputs = keras.layers.Input(shape=(None, None, 3))
+    C3     = keras.layers.Conv2D(8, kernel_size=3, strides=8, padding='same')(inputs)
+    C4     = keras.layers.Conv2D(8, kernel_size=3, strides=2, padding='same')(C3)
+    C5     = keras.layers.Conv2D(8, kernel_size=3, strides=2, padding='same')(C4)
+    return retinanet(inputs, [C3, C4, C5], num_classes=2, pyramid_levels=pyramid_levels)
+
+
+@pytest.mark.parametrize('pyramid_levels', [None, [3, 4, 5], [4, 5, 6, 7]])
+def test_pyramid_levels(pyramid_levels):
+    image_shape = (128, 96, 3)
+    model       = create_model(pyramid_levels)
+    anchors     = anchors_for_shape(image_shape, pyramid_levels=pyramid_levels)
+
+    # the training model only contains the requested levels
+    layer_names = set(layer.name for layer in model.layers)
+    for level in [3, 4, 5, 6, 7]:
+        assert ('P{}'.format(level) in layer_names) == (level in (pyramid_levels or [3, 4, 5, 6, 7]))
+
+    regression, classification = model.predict(np.zeros((1,) + image_shape))
+    assert regression.shape == (1, anchors.shape[0], 4)
+    assert classification.shape == (1, anchors.shape[0], 2)
+
+    # the pyramid levels of the prediction model are taken from the training model
+    prediction_model = retinanet_bbox(model=model)
+    assert prediction_model.get_layer('anchors').output_shape[1] in (None, anchors.shape[0])
+
+
+def test_invalid_pyramid_levels():
+    with pytest.raises(ValueError):
+        create_model([3, 4, 5, 7])
+    with pytest.raises(ValueError):
+        create_model([2, 3, 4])
+
+
+def test_pre_nms_top_k():
+    image_shape = (128, 96, 3)
+    model       = create_model([3, 4, 5])
+    random      = np.random.RandomState(0)
+    image       = random.uniform(0, 255, (1,) + image_shape)
+
+    # make sure there are detections by removing the prior probability of the classification submodel
+    layer   = model.get_layer('classification_submodel').get_layer('pyramid_classification')
+    weights = layer.get_weights()
+    layer.set_weights([random.normal(0, 0.01, weights[0].shape), np.zeros_like(weights[1])])
+
+    # with a k larger than the number of anchors of every level, the result is unchanged
+    expected = retinanet_bbox(model=model).predict(image)
+    actual   = retinanet_bbox(model=model, pre_nms_top_k=100000).predict(image)
+    assert expected[1][0, 0] > 0.05
+    for e, a in zip(expected, actual):
+        np.testing.assert_allclose(e, a, rtol=1e-5)
+
+    # otherwise only k anchors per level are decoded
+    prediction_model = retinanet_bbox(model=model, pre_nms_top_k=10)
+    top_k_model      = keras.models.Model(prediction_model.inputs, prediction_model.get_layer('top_k_per_level').output)
+    anchors, regression, classification = top_k_model.predict(image)
+    assert anchors.shape == (1, 30, 4)
+    assert regression.shape == (1, 30, 4)
+    assert classification.shape == (1, 30, 2)
+
+
+@pytest.mark.parametrize('image_shape', [(128, 96, 3), (100, 75, 3)])
+def test_static_image_shape(image_shape):
+    model  = create_model([3, 4, 5, 6, 7])
+    random = np.random.RandomState(0)
+    image  = random.uniform(0, 255, (1,) + image_shape)
+
+    # make sure there are detections by removing the prior probability of the classification submodel
+    layer   = model.get_layer('classification_submodel').get_layer('pyramid_classification')
+    weights = layer.get_weights()
+    layer.set_weights([random.normal(0, 0.01, weights[0].shape), np.zeros_like(weights[1])])
+
+    static_model = retinanet_bbox(model=model, image_shape=image_shape[:2])
+    assert static_model.inputs[0].shape[1:] == image_shape
+    assert static_model.get_layer('anchors').output_shape == (None, anchors_for_shape(image_shape).shape[0], 4)
+
+    # the static model gives the same detections as the dynamic model
+    expected = retinanet_bbox(model=model).predict(image)
+    actual   = static_model.predict(image)
+    assert expected[1][0, 0] > 0.05
+    for e, a in zip(expected, actual):
+        np.testing.assert_allclose(e, a, rtol=1e-4, atol=1e-3)
+
+
+@pytest.mark.parametrize('policy', ['mixed_float16', 'mixed_bfloat16'])
+def test_mixed_precision(policy):
+    keras.mixed_precision.set_global_policy(policy)
+    try:
+        model            = create_model([3, 4, 5])
+        prediction_model = retinanet_bbox(model=model, pre_nms_top_k=100)
+    finally:
+        keras.mixed_precision.set_global_policy('float32')
+
+    # the submodels compute in reduced precision, the outputs and the detection layers use float32
+    assert model.get_layer('regression_submodel').get_layer('pyramid_regression').compute_dtype != 'float32'
+    assert [output.dtype for output in model.outputs] == ['float32', 'float32']
+    for name in ['anchors_0', 'top_k_per_level', 'boxes', 'clipped_boxes', 'filtered_detections']:
+        assert prediction_model.get_layer(name).compute_dtype == 'float32'
+
+    boxes, scores, labels = prediction_model.predict_on_batch(np.zeros((1, 128, 96, 3)))
+    assert boxes.dtype == np.float32
+    assert scores.dtype == np.float32
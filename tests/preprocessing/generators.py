@@ -0,0 +1,40 @@
+"""
+Copyright 2017-2018 Fizyr (https://fizyr.com)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from keras_retinanet.preprocessing.generator import Generator
+
+import numpy as np
+
+
+class ImageIndexGenerator(Generator):
+    """ Generator of 64x64 images that are filled with their index, with one box each, in order by default.
+    """
+    def __init__(self, num_images, **kwargs):
+        self.num_images = num_images
+        kwargs.setdefault('shuffle_groups', False)
+        super(ImageIndexGenerator, self).__init__(group_method='none', image_min_side=64, image_max_side=64, **kwargs)
+
+    def size(self):
+        return self.num_images
+
+    def num_classes(self):
+        return 2
+
+    def load_image(self, image_index):
+        return np.full((64, 64, 3), image_index, dtype=np.uint8)
+
+    def load_annotations(self, image_index):
+        return {'labels': np.array([image_index % 2]), 'bboxes': np.array([[8.0, 8.0, 40.0, 40.0]])}
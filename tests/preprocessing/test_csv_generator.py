@@ -15,6 +15,7 @@ limitations under the License.
 """
 
 import csv
+import numpy as np
 import pytest
 try:
     from io import StringIO
@@ -213,3 +214,32 @@ def test_read_annotations_empty_image():
 
     # Check that lines without annotations don't clear earlier annotations.
     assert csv_generator._read_annotations(csv_str('a.png,0,1,2,3,a\na.png,,,,,'), {'a': 1}) == {'a.png': [annotation(0, 1,  2,  3, 'a')]}
+
+
+def test_annotations_to_arrays():
+    classes = {'a': 1, 'b': 2}
+    arrays = csv_generator._annotations_to_arrays([annotation(0, 1, 2, 3, 'a'), annotation(4, 5, 6, 7, 'b')], classes)
+    np.testing.assert_array_equal(arrays['labels'], [1, 2])
+    np.testing.assert_array_equal(arrays['bboxes'], [[0, 1, 2, 3], [4, 5, 6, 7]])
+
+    arrays = csv_generator._annotations_to_arrays([], classes)
+    assert arrays['labels'].shape == (0,)
+    assert arrays['bboxes'].shape == (0, 4)
+
+
+def test_load_annotations_returns_copies(tmpdir):
+    annotations_file = tmpdir.join('annotations.csv')
+    annotations_file.write('a.png,0,1,2,3,a\na.png,4,5,6,7,b\nb.png,,,,,\n')
+    classes_file = tmpdir.join('classes.csv')
+    classes_file.write('a,0\nb,1\n')
+
+    generator = csv_generator.CSVGenerator(str(annotations_file), str(classes_file), group_method='none', shuffle_groups=False)
+
+    annotations = generator.load_annotations(0)
+    np.testing.assert_array_equal(annotations['labels'], [0, 1])
+    np.testing.assert_array_equal(annotations['bboxes'], [[0, 1, 2, 3], [4, 5, 6, 7]])
+    assert generator.load_annotations(1)['bboxes'].shape == (0, 4)
+
+    # modifying the returned annotations should not affect the cached annotations
+    annotations['bboxes'] *= 2
+    np.testing.assert_array_equal(generator.load_annotations(0)['bboxes'], [[0, 1, 2, 3], [4, 5, 6, 7]])
@@ -21,13 +21,13 @@ import pytest
 
 
 class SimpleGenerator(Generator):
-    def __init__(self, bboxes, labels, num_classes=0, image=None):
+    def __init__(self, bboxes, labels, num_classes=0, image=None, **kwargs):
         assert(len(bboxes) == len(labels))
         self.bboxes       = bboxes
         self.labels       = labels
         self.num_classes_ = num_classes
         self.image        = image
-        super(SimpleGenerator, self).__init__(group_method='none', shuffle_groups=False)
+        super(SimpleGenerator, self).__init__(group_method='none', shuffle_groups=False, **kwargs)
 
     def num_classes(self):
         return self.num_classes_
@@ -267,3 +267,22 @@ class TestFilterAnnotations(object):
         # test that only object with class 5 is present in labels_batch
         labels = np.unique(np.argmax(labels_batch == 5, axis=2))
         assert(len(labels) == 1 and labels[0] == 0), 'Expected only class 0 to be present, but got classes {}'.format(labels)
+
+
+class TestShards(object):
+    def test_shards(self):
+        bboxes = [np.zeros((0, 4))] * 7
+        labels = [np.zeros((0,))] * 7
+
+        generators = [SimpleGenerator(bboxes, labels, batch_size=2, num_shards=3, shard_index=index) for index in range(3)]
+        shards     = [sum(generator.groups, []) for generator in generators]
+
+        # every shard has the same number of batches, together they cover all images
+        assert all(len(generator) == 2 for generator in generators)
+        assert set(sum(shards, [])) == set(range(7))
+        assert shards[0][:3] == [0, 3, 6]
+        assert shards[1][:2] == [1, 4]
+
+    def test_invalid_shard_index(self):
+        with pytest.raises(ValueError):
+            SimpleGenerator([], [], num_shards=2, shard_index=2)
@@ -0,0 +1,82 @@
+"""
+Copyright 2017-2018 Fizyr (https://fizyr.com)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from keras_retinanet.preprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from .generators import ImageIndexGenerator
+
+pytestmark = pytest.mark.skipif(shared_memory.shared_memory is None, reason='multiprocessing.shared_memory is not available')
+
+
+def test_write_read_arrays():
+    buffer = bytearray(1024)
+    arrays = [np.arange(6, dtype=np.float32).reshape(2, 3), np.arange(4, dtype=np.int64)]
+
+    layout = shared_memory.write_arrays(memoryview(buffer), arrays)
+    for expected, actual in zip(arrays, shared_memory.read_arrays(memoryview(buffer), layout)):
+        np.testing.assert_array_equal(actual, expected)
+        assert actual.dtype == expected.dtype
+
+    # arrays that don't fit are rejected
+    assert shared_memory.write_arrays(memoryview(bytearray(16)), arrays) is None
+
+
+@pytest.mark.parametrize('slot_size', [None, 16])
+def test_enqueuer(slot_size):
+    generator = ImageIndexGenerator(3)
+    enqueuer  = shared_memory.SharedMemoryEnqueuer(generator, workers=2, slots=3, slot_size=slot_size, seed=0)
+    enqueuer.start()
+    try:
+        batches = enqueuer.get()
+        # run over more than one epoch to check the order is maintained
+        for i in range(2 * len(generator)):
+            inputs, targets = next(batches)
+            expected_inputs, expected_targets = generator[i % len(generator)]
+            np.testing.assert_array_equal(inputs, expected_inputs)
+            np.testing.assert_array_equal(targets[0], expected_targets[0])
+            np.testing.assert_array_equal(targets[1], expected_targets[1])
+        del inputs, targets
+    finally:
+        enqueuer.stop()
+
+
+def test_enqueuer_prefetch():
+    tf = pytest.importorskip('tensorflow')
+
+    generator = ImageIndexGenerator(4)
+    enqueuer  = shared_memory.SharedMemoryEnqueuer(generator, workers=2, slots=2, seed=0)
+    inputs, targets = generator[0]
+    signature = (
+        tf.TensorSpec((None,) + inputs.shape[1:], tf.as_dtype(inputs.dtype)),
+        tuple(tf.TensorSpec((None,) + t.shape[1:], tf.as_dtype(t.dtype)) for t in targets),
+    )
+
+    # buffer more batches than there are slots, the buffered batches must not be overwritten by the workers
+    enqueuer.start()
+    try:
+        batches = tf.data.Dataset.from_generator(lambda: ((i, tuple(t)) for i, t in enqueuer.get()), output_signature=signature)
+        batches = iter(batches.prefetch(8))
+        for i in range(2 * len(generator)):
+            inputs, targets = next(batches)
+            expected_inputs, expected_targets = generator[i % len(generator)]
+            np.testing.assert_array_equal(inputs.numpy(), expected_inputs)
+            np.testing.assert_array_equal(targets[0].numpy(), expected_targets[0])
+            np.testing.assert_array_equal(targets[1].numpy(), expected_targets[1])
+    finally:
+        enqueuer.stop()
@@ -0,0 +1,39 @@
+"""
+Copyright 2017-2018 Fizyr (https://fizyr.com)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from keras_retinanet.preprocessing.tf_data import generator_to_dataset
+
+import numpy as np
+import pytest
+
+from .generators import ImageIndexGenerator
+
+
+@pytest.mark.parametrize('interleave,cache', [(0, None), (2, None), (0, '')])
+def test_generator_to_dataset(interleave, cache):
+    generator = ImageIndexGenerator(4)
+    dataset   = generator_to_dataset(generator, interleave=interleave, cache=cache, repeat=False)
+
+    batches = list(dataset.as_numpy_iterator())
+    assert len(batches) == len(generator)
+
+    # the order may differ when interleaving, so compare sorted by the images, which are filled with their index
+    expected = sorted([generator[i] for i in range(len(generator))], key=lambda b: tuple(b[0][:, 0, 0, 0]))
+    actual   = sorted(batches, key=lambda b: tuple(b[0][:, 0, 0, 0]))
+    for (expected_inputs, expected_targets), (inputs, targets) in zip(expected, actual):
+        np.testing.assert_array_equal(inputs, expected_inputs)
+        np.testing.assert_array_equal(targets[0], expected_targets[0])
+        np.testing.assert_array_equal(targets[1], expected_targets[1])
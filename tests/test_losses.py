@@ -31,3 +31,20 @@ def test_smooth_l1():
     loss = keras.backend.eval(loss)
 
     assert loss == pytest.approx((((1 - 0.5 / 9) * 2 + (0.5 * 9 * 0.05 ** 2)) / 3))
+
+
+@pytest.mark.parametrize('dtype', ['float16', 'bfloat16'])
+def test_losses_compute_in_float32(dtype):
+    y_true = np.array([[[1, 0, 1], [0, 1, 1], [0, 0, 0], [0, 0, -1]]], dtype='float32')
+    y_pred = np.array([[[0.9, 0.1], [0.2, 0.7], [0.1, 0.1], [0.5, 0.5]]], dtype='float32')
+
+    focal    = keras_retinanet.losses.focal()
+    expected = keras.backend.eval(focal(y_true, y_pred))
+    loss     = focal(y_true, keras.backend.cast(y_pred, dtype))
+    assert loss.dtype == 'float32'
+    assert keras.backend.eval(loss) == pytest.approx(expected, rel=1e-2)
+
+    regression_target = np.array([[[0, 0, 0, 1, 1], [0, 0, 1, 0, 1]]], dtype='float32')
+    loss = keras_retinanet.losses.smooth_l1()(regression_target, keras.backend.cast(np.zeros((1, 2, 4)), dtype))
+    assert loss.dtype == 'float32'
+    assert keras.backend.eval(loss) == pytest.approx(1 - 0.5 / 9)
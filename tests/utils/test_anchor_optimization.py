@@ -0,0 +1,46 @@
+import numpy as np
+
+from keras_retinanet.utils.anchor_optimization import anchor_coverage, optimize_anchor_parameters, write_anchor_config
+from keras_retinanet.utils.anchors import AnchorParameters
+from keras_retinanet.utils.config import read_config_file, parse_anchor_parameters
+
+
+def square_boxes(count, size, image_shape, seed=0):
+    random = np.random.RandomState(seed)
+    x1     = random.uniform(0, image_shape[1] - size, count)
+    y1     = random.uniform(0, image_shape[0] - size, count)
+    return np.stack([x1, y1, x1 + size, y1 + size], axis=1)
+
+
+def test_anchor_coverage():
+    image_shape = (256, 256, 3)
+    image_boxes = [(image_shape, square_boxes(10, 64, image_shape, seed=i)) for i in range(3)]
+
+    coverage, positives = anchor_coverage(image_boxes, AnchorParameters.default)
+    assert coverage == 1
+    assert positives >= 1
+
+    # anchors that are much larger than all boxes don't cover anything
+    large = AnchorParameters([512] * 5, AnchorParameters.default.strides, np.array([1.0]), np.array([4.0]))
+    coverage, positives = anchor_coverage(image_boxes, large)
+    assert coverage == 0
+    assert positives == 0
+
+
+def test_optimize_anchor_parameters(tmpdir):
+    image_shape = (256, 256, 3)
+    image_boxes = [(image_shape, square_boxes(10, 48, image_shape, seed=i)) for i in range(3)]
+
+    anchor_params, (coverage, _) = optimize_anchor_parameters(image_boxes, max_anchors=2, size_factors=[1, 1.5])
+    assert coverage == 1
+    assert anchor_params.num_anchors() == 1
+    np.testing.assert_equal(anchor_params.ratios, [1])
+
+    # the written config can be used as a regular config file
+    path = str(tmpdir.join('anchors.ini'))
+    write_anchor_config(path, anchor_params)
+    parsed = parse_anchor_parameters(read_config_file(path))
+    assert parsed.sizes == anchor_params.sizes
+    assert parsed.strides == anchor_params.strides
+    np.testing.assert_allclose(parsed.ratios, anchor_params.ratios, rtol=1e-5)
+    np.testing.assert_allclose(parsed.scales, anchor_params.scales, rtol=1e-5)
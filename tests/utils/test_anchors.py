@@ -1,9 +1,11 @@
 import numpy as np
 import configparser
+import pytest
 import keras
 
-from keras_retinanet.utils.anchors import anchors_for_shape, AnchorParameters
-from keras_retinanet.utils.config import read_config_file, parse_anchor_parameters
+from keras_retinanet.utils.anchors import anchors_for_shape, anchor_targets_bbox, anchor_targets_bbox_batched, bbox_transform, compute_gt_annotations, AnchorIndex, AnchorParameters
+from keras_retinanet.utils.compute_overlap import compute_overlap
+from keras_retinanet.utils.config import read_config_file, parse_anchor_parameters, parse_pyramid_levels
 
 
 def test_config_read():
@@ -167,3 +169,135 @@ def test_anchors_for_shape_values():
         strides[0] * 3 / 2 + (sizes[0] * scales[1] / np.sqrt(ratios[1])) / 2,
         strides[0] * 3 / 2 + (sizes[0] * scales[1] * np.sqrt(ratios[1])) / 2,
     ], decimal=6)
+
+
+def random_boxes(count, max_size, image_shape, seed=0):
+    random = np.random.RandomState(seed)
+    xy     = random.uniform(-max_size / 2, max(image_shape), (count, 2))
+    wh     = random.uniform(1, max_size, (count, 2))
+    return np.concatenate([xy, xy + wh], axis=1)
+
+
+def test_anchor_index_max_overlaps():
+    image_shape = (300, 500, 3)
+    anchors     = anchors_for_shape(image_shape)
+    index       = AnchorIndex(anchors)
+
+    for seed, (count, max_size) in enumerate([(1, 50), (20, 200), (50, 600)]):
+        boxes = random_boxes(count, max_size, image_shape, seed=seed)
+
+        overlaps        = compute_overlap(anchors.astype(np.float64), boxes)
+        argmax_overlaps = np.argmax(overlaps, axis=1)
+        max_overlaps    = overlaps[np.arange(overlaps.shape[0]), argmax_overlaps]
+
+        pruned_argmax, pruned_max = index.max_overlaps(boxes)
+        np.testing.assert_array_equal(pruned_max, max_overlaps)
+        np.testing.assert_array_equal(pruned_argmax, argmax_overlaps)
+
+
+def test_anchor_index_ties():
+    anchors = anchors_for_shape((128, 128, 3))
+    index   = AnchorIndex(anchors)
+
+    # identical boxes have identical overlaps, the lowest box index should be selected like np.argmax does
+    boxes = np.array([[10, 10, 60, 60], [10, 10, 60, 60], [0, 0, 20, 20]], dtype=np.float64)
+
+    overlaps                  = compute_overlap(anchors.astype(np.float64), boxes)
+    pruned_argmax, pruned_max = index.max_overlaps(boxes)
+    np.testing.assert_array_equal(pruned_argmax, np.argmax(overlaps, axis=1))
+    np.testing.assert_array_equal(pruned_max, np.max(overlaps, axis=1))
+
+
+def test_anchor_targets_bbox_anchor_index():
+    image_shape = (200, 300, 3)
+    anchors     = anchors_for_shape(image_shape)
+    index       = AnchorIndex(anchors)
+    boxes       = random_boxes(10, 150, image_shape)
+    annotations = {'bboxes': boxes, 'labels': np.arange(10) % 3}
+    image       = np.zeros(image_shape)
+
+    positive, ignore, argmax = compute_gt_annotations(anchors, boxes)
+    pruned_positive, pruned_ignore, pruned_argmax = compute_gt_annotations(anchors, boxes, anchor_index=index)
+    np.testing.assert_array_equal(positive, pruned_positive)
+    np.testing.assert_array_equal(ignore, pruned_ignore)
+    np.testing.assert_array_equal(argmax, pruned_argmax)
+
+    dense  = anchor_targets_bbox(anchors, [image], [annotations], 3)
+    pruned = anchor_targets_bbox(anchors, [image], [annotations], 3, anchor_index=index)
+    np.testing.assert_array_equal(dense[0], pruned[0])
+    np.testing.assert_array_equal(dense[1], pruned[1])
+
+
+@pytest.mark.parametrize('anchors_dtype,annotations_dtype', [
+    (np.float64, np.int64),
+    (np.int64, np.float64),
+    (np.float32, np.float64),
+    (np.float64, np.float32),
+])
+def test_compute_gt_annotations_dtypes(anchors_dtype, annotations_dtype):
+    anchors     = np.round(anchors_for_shape((200, 300, 3)))
+    annotations = np.array([[10, 10, 100, 100, 0], [50, 20, 250, 180, 1]], dtype=np.float64)
+
+    expected = compute_gt_annotations(anchors, annotations)
+    result   = compute_gt_annotations(anchors.astype(anchors_dtype), annotations.astype(annotations_dtype))
+    for expected_array, array in zip(expected, result):
+        np.testing.assert_array_equal(expected_array, array)
+
+
+def test_compute_gt_annotations_keeps_precision():
+    # the overlap of these boxes is just below 0.5, but exactly 0.5 if the annotation is rounded to float32
+    anchors     = np.array([[0, 0, 10, 10]], dtype=np.float32)
+    annotations = np.array([[0, 0, 10, 21 + 1e-9, 0]], dtype=np.float64)
+
+    positive_indices, _, _ = compute_gt_annotations(anchors, annotations, positive_overlap=0.5)
+    assert not positive_indices[0]
+
+
+def test_bbox_transform_batch():
+    anchors  = anchors_for_shape((200, 300, 3))
+    gt_boxes = np.stack([random_boxes(anchors.shape[0], 150, (200, 300, 3), seed=seed) for seed in range(3)])
+
+    result = bbox_transform(anchors, gt_boxes)
+    assert result.shape == gt_boxes.shape
+    for boxes, targets in zip(gt_boxes, result):
+        np.testing.assert_array_equal(bbox_transform(anchors, boxes), targets)
+
+
+def test_anchor_targets_bbox_batched():
+    max_shape = (200, 300, 3)
+    anchors   = anchors_for_shape(max_shape)
+
+    image_group = [np.zeros((200, 300, 3)), np.zeros((150, 300, 3)), np.zeros((200, 120, 3))]
+    annotations_group = [
+        {'bboxes': random_boxes(10, 150, max_shape, seed=0), 'labels': np.arange(10) % 3},
+        {'bboxes': np.zeros((0, 4)), 'labels': np.zeros((0,))},
+        {'bboxes': random_boxes(3, 80, max_shape, seed=1), 'labels': np.array([2, 0, 1])},
+    ]
+
+    expected = anchor_targets_bbox(anchors, image_group, annotations_group, 3)
+    for anchor_index in [None, AnchorIndex(anchors)]:
+        result = anchor_targets_bbox_batched(anchors, image_group, annotations_group, 3, anchor_index=anchor_index)
+        np.testing.assert_array_equal(expected[0], result[0])
+        np.testing.assert_array_equal(expected[1], result[1])
+
+
+def test_parse_pyramid_levels():
+    config = create_anchor_params_config()
+    assert parse_pyramid_levels(config) is None
+
+    config['pyramid_levels'] = {'levels': '3 4 5'}
+    assert parse_pyramid_levels(config) == [3, 4, 5]
+
+
+def test_anchors_for_shape_pyramid_levels():
+    image_shape = (64, 64)
+
+    # default anchor parameters use the default sizes and strides of the selected levels
+    all_anchors = anchors_for_shape(image_shape)
+    anchors     = anchors_for_shape(image_shape, pyramid_levels=[4, 5])
+    np.testing.assert_equal(anchors, all_anchors[8 * 8 * 9:8 * 8 * 9 + anchors.shape[0]])
+
+    # anchor parameters need a size and stride for every level
+    anchor_params = parse_anchor_parameters(create_anchor_params_config())
+    with pytest.raises(ValueError):
+        anchors_for_shape(image_shape, pyramid_levels=[3, 4, 5], anchor_params=anchor_params)
@@ -0,0 +1,64 @@
+import numpy as np
+
+from keras_retinanet.utils.compute_overlap import compute_overlap, compute_max_overlap
+
+
+def random_boxes(count, seed=0):
+    random = np.random.RandomState(seed)
+    xy     = random.uniform(0, 200, (count, 2))
+    wh     = random.uniform(1, 100, (count, 2))
+    return np.concatenate([xy, xy + wh], axis=1)
+
+
+def reference_overlap(boxes, query_boxes):
+    overlaps = np.zeros((boxes.shape[0], query_boxes.shape[0]))
+    for n, b in enumerate(boxes):
+        for k, q in enumerate(query_boxes):
+            iw = min(b[2], q[2]) - max(b[0], q[0]) + 1
+            ih = min(b[3], q[3]) - max(b[1], q[1]) + 1
+            if iw > 0 and ih > 0:
+                ua = (b[2] - b[0] + 1) * (b[3] - b[1] + 1) + (q[2] - q[0] + 1) * (q[3] - q[1] + 1) - iw * ih
+                overlaps[n, k] = iw * ih / ua
+    return overlaps
+
+
+def test_compute_overlap():
+    boxes       = random_boxes(50)
+    query_boxes = random_boxes(7, seed=1)
+
+    np.testing.assert_allclose(compute_overlap(boxes, query_boxes), reference_overlap(boxes, query_boxes))
+
+
+def test_compute_overlap_float32():
+    boxes       = random_boxes(50).astype(np.float32)
+    query_boxes = random_boxes(7, seed=1)
+
+    # float32 inputs are used as-is and give the same result as casting them to float64 first
+    overlaps = compute_overlap(boxes, query_boxes)
+    assert overlaps.dtype == np.float64
+    np.testing.assert_array_equal(overlaps, compute_overlap(boxes.astype(np.float64), query_boxes))
+    np.testing.assert_array_equal(compute_overlap(boxes, query_boxes.astype(np.float32)), compute_overlap(boxes, query_boxes.astype(np.float32).astype(np.float64)))
+
+
+def test_compute_max_overlap():
+    boxes       = random_boxes(500)
+    query_boxes = np.concatenate([random_boxes(10, seed=1), random_boxes(10, seed=1)])  # duplicates to test ties
+
+    for dtype in [np.float32, np.float64]:
+        overlaps = compute_overlap(boxes.astype(dtype), query_boxes)
+        argmax_overlaps, max_overlaps = compute_max_overlap(boxes.astype(dtype), query_boxes)
+
+        np.testing.assert_array_equal(argmax_overlaps, np.argmax(overlaps, axis=1))
+        np.testing.assert_array_equal(max_overlaps, np.max(overlaps, axis=1))
+        assert argmax_overlaps.max() < 10
+
+
+def test_compute_max_overlap_extra_columns():
+    # annotations and detections carry a label or score in their fifth column, which is ignored
+    boxes       = np.concatenate([random_boxes(20), np.ones((20, 1))], axis=1)
+    query_boxes = np.concatenate([random_boxes(5, seed=1), np.zeros((5, 1))], axis=1)
+
+    argmax_overlaps, max_overlaps = compute_max_overlap(boxes, query_boxes)
+    overlaps = compute_overlap(boxes[:, :4], query_boxes[:, :4])
+    np.testing.assert_array_equal(argmax_overlaps, np.argmax(overlaps, axis=1))
+    np.testing.assert_array_equal(max_overlaps, np.max(overlaps, axis=1))
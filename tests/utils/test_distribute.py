@@ -0,0 +1,91 @@
+"""
+Copyright 2017-2019 Fizyr (https://fizyr.com)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import sys
+
+import keras
+import numpy as np
+import pytest
+
+from keras_retinanet.utils import distribute
+
+# trains a small model on the shard of one worker, then saves its weights
+WORKER_SCRIPT = """
+import sys
+
+import keras
+import numpy as np
+import tensorflow as tf
+
+from keras_retinanet.utils import distribute
+
+worker_hosts, worker_index, output = sys.argv[1].split(','), int(sys.argv[2]), sys.argv[3]
+strategy = distribute.multi_worker_strategy(worker_hosts, worker_index)
+
+random = np.random.RandomState(0)
+x, y   = random.rand(4, 4).astype(np.float32), random.rand(4, 2).astype(np.float32)
+shard  = slice(distribute.worker_index(strategy), None, distribute.num_workers(strategy))
+
+dataset = tf.data.Dataset.from_tensors((x[shard], y[shard])).repeat()
+dataset = distribute.distribute_dataset(strategy, dataset)
+
+with strategy.scope():
+    keras.utils.set_random_seed(0)
+    inputs = keras.layers.Input(shape=(4,))
+    model  = keras.models.Model(inputs, keras.layers.Dense(2)(inputs))
+    model.compile(loss='mse', optimizer=keras.optimizers.SGD(learning_rate=0.1))
+
+model.fit(dataset, steps_per_epoch=2, epochs=1, verbose=0)
+np.save(output, model.get_weights()[0])
+"""
+
+
+def test_tf_config():
+    worker_hosts = distribute.local_worker_hosts(3)
+    assert len(set(worker_hosts)) == 3
+
+    config = distribute.tf_config(worker_hosts, 1)
+    assert config['cluster']['worker'] == worker_hosts
+    assert config['task'] == {'type': 'worker', 'index': 1}
+
+    with pytest.raises(ValueError):
+        distribute.tf_config(worker_hosts, 3)
+
+
+def test_multi_worker_training(tmp_path, monkeypatch):
+    script = tmp_path / 'worker.py'
+    script.write_text(WORKER_SCRIPT)
+
+    def command(worker_hosts, worker_index):
+        return [sys.executable, str(script), ','.join(worker_hosts), str(worker_index), str(tmp_path / 'worker_{}.npy'.format(worker_index))]
+
+    # the workers inherit the environment, so they can import keras_retinanet like this process
+    monkeypatch.setenv('PYTHONPATH', os.pathsep.join([os.getcwd()] + sys.path))
+    assert distribute.launch_local_workers(command, num_workers=2) == [0, 0]
+
+    # the gradients of the two shards are averaged, which is the same as training on all images at once
+    random = np.random.RandomState(0)
+    x, y   = random.rand(4, 4).astype(np.float32), random.rand(4, 2).astype(np.float32)
+
+    keras.utils.set_random_seed(0)
+    inputs = keras.layers.Input(shape=(4,))
+    model  = keras.models.Model(inputs, keras.layers.Dense(2)(inputs))
+    model.compile(loss='mse', optimizer=keras.optimizers.SGD(learning_rate=0.1))
+    model.fit(x, y, batch_size=4, epochs=2, shuffle=False, verbose=0)
+
+    for worker_index in range(2):
+        np.testing.assert_allclose(np.load(str(tmp_path / 'worker_{}.npy'.format(worker_index))), model.get_weights()[0], atol=1e-5)
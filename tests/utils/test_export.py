@@ -0,0 +1,79 @@
+"""
+Copyright 2017-2018 Fizyr (https://fizyr.com)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import numpy as np
+import pytest
+import keras
+
+from keras_retinanet.models.retinanet import retinanet, retinanet_bbox
+from keras_retinanet.utils import export
+
+
+def create_model():
+    random = np.random.RandomState(0)
+    inputs = keras.layers.Input(shape=(None, None, 3))
+    C3     = keras.layers.Conv2D(8, kernel_size=3, strides=8, padding='same')(inputs)
+    C4     = keras.layers.Conv2D(8, kernel_size=3, strides=2, padding='same')(C3)
+    C5     = keras.layers.Conv2D(8, kernel_size=3, strides=2, padding='same')(C4)
+    model  = retinanet(inputs, [C3, C4, C5], num_classes=2, pyramid_levels=[3, 4, 5])
+
+    # make sure there are detections by removing the prior probability of the classification submodel
+    layer   = model.get_layer('classification_submodel').get_layer('pyramid_classification')
+    weights = layer.get_weights()
+    layer.set_weights([random.normal(0, 0.01, weights[0].shape), np.zeros_like(weights[1])])
+
+    return model
+
+
+def sample_images():
+    random = np.random.RandomState(1)
+    return [random.randint(0, 256, (90, 120, 3)).astype(np.uint8) for _ in range(2)]
+
+
+def assert_parity(parity):
+    assert parity['detections'] > 0
+    assert parity['matched'] == parity['detections']
+    assert parity['max_score_difference'] < 1e-4
+    assert parity['max_box_difference'] < 1e-2
+
+
+def test_saved_model_and_frozen_graph(tmp_path):
+    model  = retinanet_bbox(model=create_model())
+    kwargs = {'image_min_side': 100, 'image_max_side': 200}
+
+    export.export_saved_model(model, str(tmp_path / 'saved_model'), **kwargs)
+    assert_parity(export.check_parity(model, export.load_saved_model(str(tmp_path / 'saved_model')), sample_images(), **kwargs))
+
+    export.export_frozen_graph(model, str(tmp_path / 'model.pb'), **kwargs)
+    assert_parity(export.check_parity(model, export.load_frozen_graph(str(tmp_path / 'model.pb')), sample_images(), **kwargs))
+
+
+def test_tflite(tmp_path):
+    training_model = create_model()
+
+    # tflite needs a static shape and combined NMS
+    with pytest.raises(ValueError):
+        export.export_tflite(retinanet_bbox(model=training_model), str(tmp_path / 'model.tflite'))
+
+    model = retinanet_bbox(model=training_model, image_shape=(96, 128), nms_method='combined')
+    export.export_tflite(model, str(tmp_path / 'model.tflite'))
+    assert_parity(export.check_parity(model, export.load_tflite(str(tmp_path / 'model.tflite')), sample_images()))
+
+
+def test_numpy_nms_is_not_exportable(tmp_path):
+    model = retinanet_bbox(model=create_model(), nms_method='wbf')
+    with pytest.raises(ValueError):
+        export.export_saved_model(model, str(tmp_path / 'saved_model'))
@@ -0,0 +1,49 @@
+"""
+Copyright 2017-2018 Fizyr (https://fizyr.com)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from PIL import Image
+
+from keras_retinanet.utils.image import read_image_bgr, read_image_bgr_reduced
+
+
+def test_read_image_bgr_reduced_jpeg(tmpdir):
+    path = str(tmpdir.join('image.jpg'))
+    Image.new('RGB', (1600, 1200), color=(255, 0, 0)).save(path)
+
+    # resizing to 300x400 allows decoding at a quarter of the resolution
+    image, scale = read_image_bgr_reduced(path, min_side=300, max_side=400)
+    assert image.shape == (300, 400, 3)
+    assert scale == (0.25, 0.25)
+    assert tuple(image[0, 0]) == tuple(read_image_bgr(path)[0, 0])
+
+    # never decode below the size after resizing
+    image, scale = read_image_bgr_reduced(path, min_side=350, max_side=1000)
+    assert image.shape == (600, 800, 3)
+    assert scale == (0.5, 0.5)
+
+    # no reduction when upscaling
+    image, scale = read_image_bgr_reduced(path, min_side=1500, max_side=2000)
+    assert image.shape == (1200, 1600, 3)
+    assert scale == (1, 1)
+
+
+def test_read_image_bgr_reduced_png(tmpdir):
+    path = str(tmpdir.join('image.png'))
+    Image.new('RGB', (1600, 1200)).save(path)
+
+    image, scale = read_image_bgr_reduced(path, min_side=300, max_side=400)
+    assert image.shape == (1200, 1600, 3)
+    assert scale == (1, 1)
@@ -0,0 +1,82 @@
+"""
+Copyright 2017-2018 Fizyr (https://fizyr.com)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+
+from PIL import Image
+
+from keras_retinanet.utils.image_metadata import ImageMetadataIndex, metadata_path_for
+
+
+def write_image(path, size):
+    Image.new('RGB', size).save(path)
+
+
+def test_metadata_path_for():
+    assert metadata_path_for('data/train.csv') == 'data/train.metadata.json'
+
+
+def test_index_build_and_reuse(tmpdir):
+    image_path = str(tmpdir.join('a.png'))
+    index_path = str(tmpdir.join('train.metadata.json'))
+    write_image(image_path, (40, 20))
+
+    index = ImageMetadataIndex(index_path)
+    index.update([image_path])
+    assert os.path.exists(index_path)
+    assert index.aspect_ratio(image_path) == 2.0
+
+    # a new index should load the entries from disk
+    index = ImageMetadataIndex(index_path)
+    assert index.entries['a.png']['width'] == 40
+    assert index.entries['a.png']['height'] == 20
+
+
+def test_index_invalidated_by_mtime(tmpdir):
+    image_path = str(tmpdir.join('a.png'))
+    index_path = str(tmpdir.join('train.metadata.json'))
+    write_image(image_path, (40, 20))
+
+    index = ImageMetadataIndex(index_path)
+    index.update([image_path])
+
+    # overwrite the image and make sure the modification time differs
+    write_image(image_path, (10, 20))
+    stat = os.stat(image_path)
+    os.utime(image_path, (stat.st_atime, stat.st_mtime + 10))
+
+    index = ImageMetadataIndex(index_path)
+    index.update([image_path])
+    assert index.aspect_ratio(image_path) == 0.5
+
+
+def test_index_missing_image(tmpdir):
+    index = ImageMetadataIndex(str(tmpdir.join('train.metadata.json')))
+    index.update([str(tmpdir.join('missing.png'))])
+    assert index.entries == {}
+
+
+def test_index_lazy_update(tmpdir):
+    image_path = str(tmpdir.join('a.png'))
+    index_path = str(tmpdir.join('train.metadata.json'))
+    write_image(image_path, (40, 20))
+
+    # the index is only updated for the given paths when it is first used
+    index = ImageMetadataIndex(index_path, paths=[image_path])
+    assert not os.path.exists(index_path)
+    assert index.aspect_ratio(image_path) == 2.0
+    assert os.path.exists(index_path)
+    assert index.paths is None
@@ -0,0 +1,88 @@
+"""
+Copyright 2017-2018 Fizyr (https://fizyr.com)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import keras
+import numpy as np
+import pytest
+import tensorflow
+
+from keras_retinanet.utils.model import GradientAccumulationModel
+
+
+def create_model():
+    keras.utils.set_random_seed(0)
+    inputs = keras.layers.Input(shape=(4,))
+    return keras.models.Model(inputs, keras.layers.Dense(2)(inputs))
+
+
+def create_data():
+    random = np.random.RandomState(0)
+    return random.rand(4, 4).astype(np.float32), random.rand(4, 2).astype(np.float32)
+
+
+@pytest.mark.parametrize('loss_scale', [False, True])
+def test_gradient_accumulation(loss_scale):
+    def create_optimizer():
+        optimizer = keras.optimizers.Adam(learning_rate=0.1, clipnorm=0.01)
+        return keras.mixed_precision.LossScaleOptimizer(optimizer) if loss_scale else optimizer
+
+    x, y = create_data()
+
+    # one step with a batch of 4 images
+    expected_model = create_model()
+    expected_model.compile(loss='mse', optimizer=create_optimizer())
+    expected_model.train_on_batch(x, y)
+
+    # two accumulated steps with batches of 2 images
+    model          = create_model()
+    training_model = GradientAccumulationModel(model, accumulation_steps=2)
+    training_model.compile(loss='mse', optimizer=create_optimizer())
+    initial_weights = model.get_weights()
+
+    training_model.train_on_batch(x[:2], y[:2])
+    for weights, initial in zip(model.get_weights(), initial_weights):
+        np.testing.assert_array_equal(weights, initial)
+
+    training_model.train_on_batch(x[2:], y[2:])
+    for weights, expected in zip(model.get_weights(), expected_model.get_weights()):
+        np.testing.assert_allclose(weights, expected, atol=1e-6)
+
+
+def test_gradient_accumulation_learning_rate():
+    x, y = create_data()
+
+    training_model = GradientAccumulationModel(create_model(), accumulation_steps=2)
+    training_model.compile(loss='mse', optimizer=keras.optimizers.Adam(learning_rate=0.1, clipnorm=0.01))
+
+    # reduce the learning rate after every epoch
+    callback = keras.callbacks.ReduceLROnPlateau(monitor='loss', factor=0.5, patience=0, min_delta=10)
+    training_model.fit(x, y, batch_size=1, epochs=2, callbacks=[callback], verbose=0)
+
+    assert keras.backend.get_value(training_model.optimizer.lr) == pytest.approx(0.05)
+    assert keras.backend.get_value(training_model.optimizer.iterations) == 4
+
+
+def test_invalid_accumulation_steps():
+    with pytest.raises(ValueError):
+        GradientAccumulationModel(create_model(), accumulation_steps=0)
+
+
+def test_gradient_accumulation_distribution_strategy():
+    strategy = tensorflow.distribute.MirroredStrategy(['/cpu:0'])
+    with strategy.scope():
+        model = create_model()
+        with pytest.raises(ValueError):
+            GradientAccumulationModel(model, accumulation_steps=2)
@@ -0,0 +1,83 @@
+"""
+Copyright 2017-2018 Fizyr (https://fizyr.com)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import numpy as np
+
+from keras_retinanet.models.retinanet import retinanet_bbox
+from keras_retinanet.preprocessing.generator import Generator
+from keras_retinanet.utils import quantization
+from keras_retinanet.utils.eval import evaluate
+
+from .test_export import create_model
+
+
+class SimpleGenerator(Generator):
+    def __init__(self, num_images=4):
+        random      = np.random.RandomState(0)
+        self.images = [random.randint(0, 256, (90, 120, 3)).astype(np.uint8) for _ in range(num_images)]
+        super(SimpleGenerator, self).__init__(group_method='none', shuffle_groups=False, image_min_side=96, image_max_side=128)
+
+    def size(self):
+        return len(self.images)
+
+    def num_classes(self):
+        return 2
+
+    def has_label(self, label):
+        return label < 2
+
+    def label_to_name(self, label):
+        return str(label)
+
+    def load_image(self, image_index):
+        return self.images[image_index]
+
+    def load_annotations(self, image_index):
+        return {'labels': np.array([0, 1]), 'bboxes': np.array([[10, 10, 50, 50], [30, 20, 100, 80]], dtype=float)}
+
+
+def test_generator_images():
+    generator = SimpleGenerator()
+
+    images = list(quantization.generator_images(generator, num_images=3))
+    assert len(images) == 3
+    assert all(image.shape == (1, 96, 128, 3) for image in images)
+
+    assert len(list(quantization.generator_images(generator, num_images=10))) == generator.size()
+
+
+def test_quantize_model(tmp_path):
+    generator = SimpleGenerator()
+    model     = retinanet_bbox(model=create_model())
+
+    # the standard NMS is replaced by combined NMS, sharing the weights
+    quantized = quantization.quantize_model(model, str(tmp_path / 'model.tflite'), generator, num_calibration_images=2)
+    assert quantized.get_layer('filtered_detections').nms_method == 'combined'
+    assert quantized.get_layer('regression_submodel') is model.get_layer('regression_submodel')
+
+    tflite_model = quantization.TFLiteModel(str(tmp_path / 'model.tflite'))
+    boxes, scores, labels = tflite_model.predict_on_batch(next(quantization.generator_images(generator)))
+    assert boxes.shape == (1, 300, 4)
+    assert scores.shape == (1, 300)
+    assert labels.shape == (1, 300)
+
+    # evaluate accepts the quantized model like a keras model
+    average_precisions = evaluate(generator, tflite_model)
+    assert sorted(average_precisions.keys()) == [0, 1]
+
+    latencies = quantization.measure_latency(tflite_model, list(quantization.generator_images(generator, num_images=2)))
+    assert latencies.shape == (2,)
+    assert np.all(latencies > 0)
@@ -0,0 +1,104 @@
+"""
+Copyright 2017-2018 Fizyr (https://fizyr.com)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import concurrent.futures
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from keras_retinanet.models.retinanet import retinanet_bbox
+from keras_retinanet.utils import export
+from keras_retinanet.utils.server import BatchPredictor, Client, HTTPServer, UnixHTTPServer
+
+from .test_export import create_model, sample_images
+
+PREDICTOR_ARGS = {'image_min_side': 100, 'image_max_side': 200, 'score_threshold': 0.05, 'max_detections': 300}
+
+
+def expected_detections(model, image):
+    detections = export.predict_keras(model, image, image_min_side=100, image_max_side=200)
+    indices    = np.where(detections['scores'][0] > 0.05)[0]
+    return detections['boxes'][0, indices], detections['scores'][0, indices]
+
+
+def assert_detections(detections, expected):
+    boxes, scores = expected
+    order         = np.argsort(-scores)
+    np.testing.assert_allclose(np.array(detections['scores']), scores[order], atol=1e-5)
+    np.testing.assert_allclose(np.array(detections['boxes']).reshape(-1, 4), boxes[order], atol=1e-2)
+
+
+def test_batch_predictor():
+    model  = retinanet_bbox(model=create_model())
+    images = sample_images()
+
+    # queue the requests before starting the worker, so they are predicted in one batch
+    predictor = BatchPredictor(model, max_batch_size=4, max_latency=1.0, **PREDICTOR_ARGS)
+    futures   = [predictor.submit(image) for image in images]
+    while predictor.queue.qsize() < len(images):
+        time.sleep(0.01)
+    predictor.start()
+
+    for future, image in zip(futures, images):
+        assert_detections(future.result(timeout=60), expected_detections(model, image))
+
+    metrics = predictor.metrics.summary()
+    assert metrics['requests'] == len(images)
+    assert metrics['batches'] == 1
+    assert metrics['latency_ms']['p50'] > 0
+
+    # invalid images fail the request
+    with pytest.raises(ValueError):
+        predictor.predict(b'not an image', timeout=60)
+    assert predictor.metrics.summary()['errors'] == 1
+
+    predictor.stop()
+
+
+@pytest.mark.parametrize('unix_socket', [False, True])
+def test_server(tmp_path, unix_socket):
+    model     = retinanet_bbox(model=create_model())
+    images    = sample_images()
+    predictor = BatchPredictor(model, max_batch_size=2, max_latency=0.05, **PREDICTOR_ARGS).start()
+
+    if unix_socket:
+        server = UnixHTTPServer(str(tmp_path / 'server.sock'), predictor, quiet=True)
+        client = Client(unix_socket=str(tmp_path / 'server.sock'))
+    else:
+        server = HTTPServer(('127.0.0.1', 0), predictor, quiet=True)
+        client = Client(*server.server_address[:2])
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(images)) as executor:
+            results = list(executor.map(client.predict, images))
+        for detections, image in zip(results, images):
+            assert_detections(detections, expected_detections(model, image))
+
+        with pytest.raises(RuntimeError):
+            client.predict(b'not an image')
+
+        metrics = client.metrics()
+        assert metrics['requests'] == len(images)
+        assert metrics['errors'] == 1
+        assert metrics['throughput'] > 0
+    finally:
+        server.shutdown()
+        server.server_close()
+        predictor.stop()